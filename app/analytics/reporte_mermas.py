@@ -48,7 +48,8 @@ def calcular_consumos(inspeccion, fecha_inicial, fecha_final):
     # Lista de ingredientes presentes en la Inspeccion
     items_inspeccion_2 = inspeccion.items_inspeccionados.all()
     items_inspeccion_2 = items_inspeccion_2.values('botella__producto__ingrediente__id')
-    ingredientes_inspeccion = models.Ingrediente.objects.filter(id__in=items_inspeccion_2)
+    # El reporte lista los ingredientes en el orden en que se dieron de alta
+    ingredientes_inspeccion = models.Ingrediente.objects.filter(id__in=items_inspeccion_2).order_by('id')
 
     # print('::: INGREDIENTES INSPECCION :::')
     # print(ingredientes_inspeccion)
@@ -139,20 +140,23 @@ def calcular_consumos(inspeccion, fecha_inicial, fecha_final):
     Calculamos el CONSUMO DE VENTAS y CONSUMO REAL por ingrediente
     -----------------------------------------------------------------
     """
+    # Sumamos el consumo de ventas de todos los ingredientes con un solo query al ConsumoDiario
+    consumos_diarios = models.ConsumoDiario.objects.filter(
+        ingrediente__in=ingredientes_inspeccion,
+        fecha__gte=fecha_inicial,
+        fecha__lte=fecha_final,
+        almacen=almacen
+    )
+    consumos_ventas = dict(consumos_diarios.values('ingrediente').annotate(total=Sum('volumen')).values_list('ingrediente', 'total'))
+
     consumos = []
     for ingrediente in ingredientes_inspeccion:
         # Sumamos el consumo real por ingrediente
         botellas_ingrediente = consumo_botellas.filter(producto__ingrediente__id=ingrediente.id)
         consumo_real = botellas_ingrediente.aggregate(consumo_real=Sum('consumo_ml'))
 
-        # Sumamos el consumo de ventas por ingrediente
-        consumos_recetas = models.ConsumoRecetaVendida.objects.filter(
-            ingrediente=ingrediente,
-            fecha__gte=fecha_inicial,
-            fecha__lte=fecha_final,
-            venta__caja__almacen=almacen
-        )
-        consumo_ventas = consumos_recetas.aggregate(consumo_ventas=Sum('volumen'))
+        # Tomamos el consumo de ventas del ingrediente
+        consumo_ventas = {'consumo_ventas': consumos_ventas.get(ingrediente.id)}
 
         # Consolidamos los ingredientes, su consumo de ventas y consumo real en una lista
         ingrediente_consumo = (ingrediente, consumo_ventas, consumo_real)
@@ -187,6 +191,21 @@ def get_ventas_merma(merma_id):
     else: 
         ingrediente = merma.ingrediente
 
+        # Si el ConsumoDiario no tiene consumo del ingrediente en el periodo, no hay ventas que buscar
+        hay_consumo = models.ConsumoDiario.objects.filter(
+            ingrediente=ingrediente,
+            fecha__gte=merma.fecha_inicial,
+            fecha__lte=merma.fecha_final,
+            almacen=merma.almacen
+        ).exists()
+
+        if not hay_consumo:
+            return {
+                'status': '1',
+                'ingrediente': ingrediente.nombre,
+                'detalle_ventas': []
+            }
+
         # Tomamos las ventas asociadas al ingrediente de la MermaIngrediente
         consumos = models.ConsumoRecetaVendida.objects.filter(
             ingrediente=ingrediente,
@@ -23,11 +23,19 @@ Fecha Venta         Unidades
 
 def get_productos_sin_registro(sucursal):
 
-    # Tomamos todos los ProductoSinRegistro de la sucursal
-    productos = models.ProductoSinRegistro.objects.filter(sucursal=sucursal)
+    # Tomamos el resumen de los códigos POS que siguen sin receta registrada
+    recetas = models.Receta.objects.filter(sucursal=sucursal, codigo_pos=OuterRef('codigo_pos'))
+
+    productos = models.ResumenSinRegistro.objects.filter(sucursal=sucursal)\
+        .annotate(registrado=Exists(recetas))\
+        .filter(registrado=False)\
+        .order_by('codigo_pos')\
+        .values('codigo_pos', 'nombre', 'renglones', 'unidades', 'importe', 'primera_fecha', 'ultima_fecha')
+
+    productos = list(productos)
 
     # Si no hay ProductoSinRegistro, notificamos al cliente
-    if productos.count() == 0:
+    if len(productos) == 0:
 
         response = {
             'status': 'success',
@@ -35,39 +43,16 @@ def get_productos_sin_registro(sucursal):
         }
         return response
 
-    # Tomamos solo los distintos
-    productos = productos.distinct('codigo_pos')
-    print('::: PRODUCTOS - DISTINCT :::')
-    print(productos.values())
-
-    # Convertimos el queryset en una lista de diccionarios
-    productos = productos.values('codigo_pos', 'nombre')
-
-    """
-    Guardamos los productos que continuan sin registrarse en una lista
-    """
-    lista_sin_registrar = []
-
+    # Formateamos las fechas para que sean legibles
     for item in productos:
-
-        codigo_pos = item['codigo_pos']
-
-        try:
-            receta = models.Receta.objects.get(codigo_pos=codigo_pos, sucursal=sucursal)
-
-        except ObjectDoesNotExist:
-            lista_sin_registrar.append(item)
-
-        else:
-            continue
-
-    print('::: LISTA SIN REGISTRAR :::')
-    print(lista_sin_registrar)
+        for campo in ['primera_fecha', 'ultima_fecha']:
+            if item[campo] is not None:
+                item[campo] = item[campo].strftime("%d/%m/%Y")
 
     # Construimos el response
     response = {
         'status': 'success',
-        'data': lista_sin_registrar
+        'data': productos
     }
 
     return response
@@ -16,6 +16,7 @@ from decimal import Decimal, ROUND_UP
 import json
 from freezegun import freeze_time
 from analytics import reporte_mermas
+from ventas import consumo_diario
 
 from analytics.serializers import (
     ReporteMermasDetalleSerializer,
@@ -212,6 +213,9 @@ class AnalyticsTests(TestCase):
                 volumen=60
             )
 
+        # Consumo diario de los consumos
+        consumo_diario.recalcular()
+
         # Productos
         self.producto_licor43 = models.Producto.objects.create(
             folio='Ii0000000001',
@@ -607,7 +611,7 @@ class AnalyticsTests(TestCase):
         # Lista de ingredientes presentes en la Inspeccion
         items_inspeccion_2 = self.inspeccion_2.items_inspeccionados.all()
         items_inspeccion_2 = items_inspeccion_2.values('botella__producto__ingrediente__id')
-        ingredientes_inspeccion = models.Ingrediente.objects.filter(id__in=items_inspeccion_2)
+        ingredientes_inspeccion = models.Ingrediente.objects.filter(id__in=items_inspeccion_2).order_by('id')
 
 
         #----------------------------------------------------------------------------------
@@ -1452,6 +1456,8 @@ class AnalyticsTests(TestCase):
             )
 
 
+        consumo_diario.recalcular()
+
         # Creamos una Inspeccion para la BARRA 4
         with freeze_time("2019-06-03"):
             
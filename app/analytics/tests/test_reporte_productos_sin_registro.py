@@ -16,6 +16,7 @@ from decimal import Decimal, ROUND_DOWN, ROUND_UP
 import json
 from freezegun import freeze_time
 from analytics import reporte_productos_sin_registro as r_sin_registro
+from ventas import sin_registro
 
 
 class AnalyticsTests(TestCase):
@@ -174,6 +175,9 @@ class AnalyticsTests(TestCase):
                 importe=90
             )
 
+        # Resumen de los ProductosSinRegistro
+        sin_registro.recalcular(self.magno_brasserie)
+
     #-----------------------------------------------------------------------------
     def test_script_reporte_ok(self):
 
@@ -196,6 +200,29 @@ class AnalyticsTests(TestCase):
         # Checamos que los ProductosSinRegistro del response sean los correctos
         self.assertEqual(reporte['data'][0]['codigo_pos'], self.chivas_sin_registro_02.codigo_pos)
         self.assertEqual(reporte['data'][1]['codigo_pos'], self.baileys_sin_registro_01.codigo_pos)
+        # Checamos que los contadores acumulen los dos renglones de CHIVAS
+        self.assertEqual(reporte['data'][0]['renglones'], 2)
+        self.assertEqual(reporte['data'][0]['unidades'], 3)
+        self.assertEqual(reporte['data'][0]['importe'], 540)
+        self.assertEqual(reporte['data'][0]['primera_fecha'], '01/11/2019')
+        self.assertEqual(reporte['data'][0]['ultima_fecha'], '02/11/2019')
+
+
+    #-----------------------------------------------------------------------------
+    def test_script_reporte_receta_registrada(self):
+
+        """
+        -----------------------------------------------------------------------
+        Testeamos que el reporte omita los códigos que ya tienen receta
+        -----------------------------------------------------------------------
+        """
+
+        models.Receta.objects.create(codigo_pos='0001', nombre='CHIVAS 12 DERECHO', sucursal=self.magno_brasserie)
+
+        reporte = r_sin_registro.get_productos_sin_registro(self.magno_brasserie)
+
+        self.assertEqual(len(reporte['data']), 1)
+        self.assertEqual(reporte['data'][0]['codigo_pos'], '0002')
 
 
     #-----------------------------------------------------------------------------
@@ -44,7 +44,9 @@ INSTALLED_APPS = [
 
     # CUSTOM
     'core',
-    'users'
+    'users',
+    'ventas.apps.VentasConfig',
+    'inventarios.apps.InventariosConfig',
 ]
 
 MIDDLEWARE = [
@@ -130,4 +132,29 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Reportes de ventas
+# Los reportes más pesados que VENTAS_LIMITE_STREAMING (en bytes) se procesan
+# por bloques de VENTAS_TAMANO_BLOQUE renglones para no cargarlos completos en memoria
+VENTAS_LIMITE_STREAMING = 5 * 1024 * 1024
+VENTAS_TAMANO_BLOQUE = 5000
+
+# Los reportes de ventas subidos se guardan en MEDIA_ROOT. Con VENTAS_INGESTA_ASINCRONA
+# el upload solo guarda el archivo y lo encola; el comando 'procesar_reportes_ventas'
+# lo procesa en segundo plano (el servicio 'worker' de docker-compose.yml)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+VENTAS_INGESTA_ASINCRONA = True
+
+# Qué hacer con los renglones de un reporte que ya estaban registrados (misma huella):
+# 'omitir' los ignora y 'actualizar' los reemplaza con los valores del reporte nuevo
+VENTAS_DUPLICADOS = 'omitir'
+
+# En PostgreSQL los bloques de ventas se pueden cargar con COPY (ver ventas.carga_copy).
+# Desactivado mientras no se pruebe contra PostgreSQL: 'benchmark_carga_ventas' compara
+# ambas cargas en una base de datos real antes de activarlo
+VENTAS_CARGA_COPY = False
+
+# Inicializar el parser de CSV de pandas al arrancar cada worker
+VENTAS_PRECARGAR_PARSERS = True
@@ -49,10 +49,16 @@ admin.site.register(models.Categoria)
 admin.site.register(models.Ingrediente)
 admin.site.register(models.Receta)
 admin.site.register(models.IngredienteReceta)
+admin.site.register(models.VersionIngredienteReceta)
 admin.site.register(models.Almacen)
 admin.site.register(models.Caja)
+admin.site.register(models.MapeoCaja)
 admin.site.register(models.Venta)
 admin.site.register(models.ConsumoRecetaVendida)
+admin.site.register(models.ConsumoDiario)
 admin.site.register(models.Producto)
 admin.site.register(models.Botella)
-admin.site.register(models.ProductoSinRegistro)
\ No newline at end of file
+admin.site.register(models.ProductoSinRegistro)
+admin.site.register(models.ResumenSinRegistro)
+admin.site.register(models.ReporteVentas)
+admin.site.register(models.ConectorVentas)
\ No newline at end of file
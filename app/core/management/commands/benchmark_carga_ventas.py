@@ -0,0 +1,97 @@
+import datetime
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from core import models
+from ventas import carga_copy
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+
+
+class Command(BaseCommand):
+
+    help = 'Compara los renglones por segundo de la carga de ventas con bulk_create contra la carga con COPY (PostgreSQL). No guarda nada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sucursal_id', type=int, help='Id de la sucursal cuyas recetas se usan para el reporte de prueba')
+        parser.add_argument('--renglones', type=int, default=10000, help='Renglones del reporte de prueba')
+        parser.add_argument('--bloque', type=int, default=5000, help='Renglones por bloque')
+
+
+    def reporte_prueba(self, sucursal, renglones):
+        """ Arma un reporte de ventas con las recetas de la sucursal y 10% de productos sin registro """
+
+        caja = models.Caja.objects.filter(almacen__sucursal=sucursal).order_by('id').first()
+        if caja is None:
+            raise CommandError('La sucursal {} no tiene cajas'.format(sucursal.id))
+
+        codigos = list(models.Receta.objects.filter(sucursal=sucursal).values_list('codigo_pos', flat=True))
+        if not codigos:
+            raise CommandError('La sucursal {} no tiene recetas'.format(sucursal.id))
+
+        aleatorio = np.random.RandomState(0)
+        codigos_pos = aleatorio.choice(codigos, renglones).astype(object)
+        sin_registro = aleatorio.rand(renglones) < 0.1
+        codigos_pos[sin_registro] = ['SIN-REGISTRO-{}'.format(i) for i in range(sin_registro.sum())]
+
+        return pd.DataFrame({
+            'sucursal_id': sucursal.id,
+            'caja_id': caja.id,
+            'codigo_pos': codigos_pos,
+            'nombre': 'PRODUCTO DE PRUEBA',
+            'unidades': aleatorio.randint(1, 4, renglones),
+            'importe': 100,
+        })
+
+
+    def medir(self, cargar, df_reporte, tamano_bloque):
+        """ Carga el reporte por bloques dentro de una transacción que se revierte; retorna los segundos """
+
+        inicio = time.time()
+
+        with transaction.atomic():
+            for i in range(0, len(df_reporte), tamano_bloque):
+                cargar(df_reporte.iloc[i:i + tamano_bloque])
+            transaction.set_rollback(True)
+
+        return time.time() - inicio
+
+
+    def handle(self, *args, **kwargs):
+
+        try:
+            sucursal = models.Sucursal.objects.get(id=kwargs['sucursal_id'])
+        except models.Sucursal.DoesNotExist:
+            raise CommandError('La sucursal {} no existe'.format(kwargs['sucursal_id']))
+
+        df_reporte = self.reporte_prueba(sucursal, kwargs['renglones'])
+        matriz = matriz_recetas.get_matriz(sucursal)
+        fecha = datetime.date(1990, 1, 1)
+
+        cajas = {}
+        ocurrencias_orm = Counter()
+
+        def cargar_orm(df_ventas):
+            ventas_consumos.registrar_bloque(df_ventas, sucursal, matriz, fecha, cajas, ocurrencias_orm)
+
+        segundos = self.medir(cargar_orm, df_reporte, kwargs['bloque'])
+        self.stdout.write('BULK_CREATE - RENGLONES: {} - SEGUNDOS: {:.2f} - RENGLONES/SEGUNDO: {:.0f}'.format(len(df_reporte), segundos, len(df_reporte) / segundos))
+
+        # Se mide aunque VENTAS_CARGA_COPY esté desactivado: sirve para decidir si se activa
+        if connection.vendor != 'postgresql':
+            self.stdout.write('COPY - NO DISPONIBLE (requiere PostgreSQL)')
+            return
+
+        ocurrencias_copy = Counter()
+
+        def cargar_copy(df_ventas):
+            huellas = ventas_consumos.huellas_renglones(df_ventas, fecha, ocurrencias_copy)
+            carga_copy.registrar_bloque(df_ventas, sucursal, matriz, fecha, huellas, cajas)
+
+        segundos_copy = self.medir(cargar_copy, df_reporte, kwargs['bloque'])
+        self.stdout.write('COPY - RENGLONES: {} - SEGUNDOS: {:.2f} - RENGLONES/SEGUNDO: {:.0f}'.format(len(df_reporte), segundos_copy, len(df_reporte) / segundos_copy))
+        self.stdout.write('COPY ES {:.1f}X MÁS RÁPIDO'.format(segundos / segundos_copy))
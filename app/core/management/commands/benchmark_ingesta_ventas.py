@@ -0,0 +1,64 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import benchmark
+
+
+class Command(BaseCommand):
+
+    help = 'Mide el parseo, el cálculo de consumos y el registro de reportes de ventas sintéticos de cada formato. No guarda nada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sucursal_id', type=int, help='Id de la sucursal cuyas recetas se usan para los reportes de prueba')
+        parser.add_argument('--formatos', nargs='+', choices=list(benchmark.FORMATOS), default=list(benchmark.FORMATOS), help='Formatos de reporte a medir')
+        parser.add_argument('--renglones', nargs='+', type=int, default=benchmark.TAMANOS, help='Renglones de cada reporte de prueba')
+        parser.add_argument('--bloque', type=int, default=settings.VENTAS_TAMANO_BLOQUE, help='Renglones por bloque')
+        parser.add_argument('--sin-registro', action='store_true', help='No mide el registro en la base de datos')
+        parser.add_argument('--salida', help='Archivo JSON donde se guardan los resultados')
+
+
+    def handle(self, *args, **kwargs):
+
+        try:
+            sucursal = models.Sucursal.objects.get(id=kwargs['sucursal_id'])
+        except models.Sucursal.DoesNotExist:
+            raise CommandError('La sucursal {} no existe'.format(kwargs['sucursal_id']))
+
+        if not models.Caja.objects.filter(almacen__sucursal=sucursal).exists():
+            raise CommandError('La sucursal {} no tiene cajas'.format(sucursal.id))
+
+        codigos = list(models.Receta.objects.filter(sucursal=sucursal).values_list('codigo_pos', flat=True))
+        if not codigos:
+            raise CommandError('La sucursal {} no tiene recetas'.format(sucursal.id))
+
+        def reportar(resultado):
+            self.stdout.write('{} - RENGLONES: {} - {} - MEMORIA PICO: {} MB'.format(
+                resultado['formato'],
+                resultado['renglones'],
+                ' - '.join('{}: {} RENGLONES/SEGUNDO'.format(nombre.upper(), medicion['renglones_segundo']) for nombre, medicion in resultado['etapas'].items()),
+                resultado['memoria_pico_mb']
+            ))
+
+        directorio = tempfile.mkdtemp(prefix='benchmark_ventas_')
+        try:
+            resultados = benchmark.correr(
+                sucursal,
+                codigos,
+                kwargs['formatos'],
+                kwargs['renglones'],
+                directorio,
+                kwargs['bloque'],
+                registrar=not kwargs['sin_registro'],
+                reportar=reportar
+            )
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        if kwargs['salida']:
+            with open(kwargs['salida'], 'w') as f:
+                json.dump(resultados, f, indent=2)
+            self.stdout.write('RESULTADOS: {}'.format(kwargs['salida']))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import historico
+
+
+class Command(BaseCommand):
+
+    help = 'Carga el histórico de ventas de una sucursal desde una carpeta o un .zip con un reporte por día (la fecha va en el nombre del archivo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sucursal_id', type=int, help='Id de la sucursal')
+        parser.add_argument('ruta', help='Carpeta o archivo .zip con los reportes de ventas')
+        parser.add_argument('--procesos', type=int, default=1, help='Número de días que se procesan en paralelo')
+
+
+    def handle(self, *args, **kwargs):
+
+        try:
+            sucursal = models.Sucursal.objects.get(id=kwargs['sucursal_id'])
+        except models.Sucursal.DoesNotExist:
+            raise CommandError('La sucursal {} no existe'.format(kwargs['sucursal_id']))
+
+        def al_terminar_dia(resultado):
+            if resultado['error'] is not None:
+                self.stdout.write('{} - ERROR: {}'.format(resultado['fecha'], resultado['error']))
+            else:
+                self.stdout.write('{} - RENGLONES: {} - VENTAS: {} - SIN REGISTRO: {} - DUPLICADOS: {}'.format(
+                    resultado['fecha'],
+                    resultado['renglones'],
+                    resultado['ventas'],
+                    resultado['productos_no_registrados'],
+                    resultado['duplicados']
+                ))
+
+        resumen = historico.cargar_historico(sucursal, kwargs['ruta'], kwargs['procesos'], al_terminar_dia)
+
+        for nombre in resumen['sin_fecha']:
+            self.stdout.write('SIN FECHA: {}'.format(nombre))
+
+        self.stdout.write('DIAS: {} - CON ERROR: {} - VENTAS: {} - CONSUMOS: {} - SIN REGISTRO: {} - DUPLICADOS: {} - SEGUNDOS: {}'.format(
+            resumen['dias'],
+            resumen['dias_con_error'],
+            resumen['ventas'],
+            resumen['consumos'],
+            resumen['productos_no_registrados'],
+            resumen['duplicados'],
+            resumen['segundos']
+        ))
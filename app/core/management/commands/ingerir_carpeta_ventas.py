@@ -0,0 +1,60 @@
+import datetime
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import carpeta
+
+
+class Command(BaseCommand):
+
+    help = 'Encola y procesa los reportes de ventas de una carpeta (una subcarpeta por sucursal), con varias sucursales en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('carpeta', help='Carpeta con una subcarpeta por sucursal (nombrada con su slug)')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Workers en paralelo (por default, uno por CPU)')
+        parser.add_argument('--fecha', help='Fecha de las ventas, AAAA-MM-DD (por default, la fecha de ayer)')
+
+
+    def handle(self, *args, **kwargs):
+
+        if not os.path.isdir(kwargs['carpeta']):
+            raise CommandError('La carpeta {} no existe'.format(kwargs['carpeta']))
+
+        fecha = None
+        if kwargs['fecha']:
+            try:
+                fecha = datetime.datetime.strptime(kwargs['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Fecha inválida: {} (se espera AAAA-MM-DD)'.format(kwargs['fecha']))
+
+        archivos, desconocidas = carpeta.archivos_carpeta(kwargs['carpeta'])
+
+        for nombre in desconocidas:
+            self.stdout.write('{} - NO ES UNA SUCURSAL'.format(nombre))
+
+        # Encolamos todos los archivos; los que ya se habían subido regresan su reporte original
+        reportes = []
+        tareas = []
+        for sucursal, rutas in archivos.items():
+            reportes_sucursal = [(ruta, carpeta.encolar_archivo(ruta, sucursal, fecha)) for ruta in rutas]
+            reportes.extend(reportes_sucursal)
+
+            pendientes = [reporte.id for ruta, reporte in reportes_sucursal if reporte.estado == models.ReporteVentas.PENDIENTE]
+            if pendientes:
+                tareas.append((sum(os.path.getsize(ruta) for ruta in rutas), pendientes))
+
+        # Las sucursales con los archivos más pesados van primero
+        tareas = [pendientes for tamano, pendientes in sorted(tareas, key=lambda tarea: -tarea[0])]
+        carpeta.procesar_en_paralelo(tareas, kwargs['procesos'])
+
+        for ruta, reporte in reportes:
+            reporte.refresh_from_db()
+            carpeta.archivar(ruta, reporte)
+
+            self.stdout.write('{} - RENGLONES: {} - VENTAS: {} - SIN REGISTRO: {}'.format(
+                reporte,
+                reporte.renglones_procesados,
+                reporte.ventas_registradas,
+                reporte.productos_no_registrados
+            ))
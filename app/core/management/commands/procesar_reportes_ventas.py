@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from ventas import ingesta
+
+
+class Command(BaseCommand):
+
+    help = 'Procesa en segundo plano los reportes de ventas subidos por los usuarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', dest='una_vez', help='Procesa los reportes pendientes y termina')
+        parser.add_argument('--intervalo', type=int, default=5, help='Segundos de espera cuando no hay reportes pendientes')
+        parser.add_argument('--reanudar', action='store_true', help='Reencola los reportes que se quedaron a medio procesar al arrancar y cada vez que no hay reportes pendientes')
+        parser.add_argument('--minutos', type=int, default=ingesta.MINUTOS_INTERRUMPIDO, help='Con --reanudar y sin advisory locks (no PostgreSQL), minutos que debe llevar un reporte procesándose para reencolarlo')
+
+
+    def handle(self, *args, **kwargs):
+
+        if kwargs['reanudar']:
+            reencolados = ingesta.reencolar_interrumpidos(kwargs['minutos'])
+            self.stdout.write('Reportes reencolados: {}'.format(reencolados))
+
+        while True:
+            reporte = ingesta.tomar_siguiente()
+
+            if reporte is None:
+                # Un worker que se reinició pudo dejar reportes a medio procesar
+                if kwargs['reanudar'] and ingesta.reencolar_interrumpidos(kwargs['minutos']) > 0:
+                    continue
+                if kwargs['una_vez']:
+                    break
+                time.sleep(kwargs['intervalo'])
+                continue
+
+            reporte = ingesta.procesar(reporte)
+            self.stdout.write('{} - RENGLONES: {} - VENTAS: {} - SIN REGISTRO: {}'.format(
+                reporte,
+                reporte.renglones_procesados,
+                reporte.ventas_registradas,
+                reporte.productos_no_registrados
+            ))
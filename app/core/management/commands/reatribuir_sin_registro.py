@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import sin_registro
+
+
+class Command(BaseCommand):
+
+    help = 'Convierte en Ventas los ProductosSinRegistro cuyo código POS ya tiene receta registrada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Id de la sucursal (por default, todas)')
+        parser.add_argument('--recalcular', action='store_true', help='Reconstruye también el resumen de productos sin registro')
+
+
+    def handle(self, *args, **kwargs):
+
+        sucursales = models.Sucursal.objects.order_by('id')
+
+        if kwargs['sucursal'] is not None:
+            sucursales = sucursales.filter(id=kwargs['sucursal'])
+            if not sucursales.exists():
+                raise CommandError('La sucursal {} no existe'.format(kwargs['sucursal']))
+
+        for sucursal in sucursales:
+            totales = sin_registro.reatribuir(sucursal)
+
+            if kwargs['recalcular']:
+                sin_registro.recalcular(sucursal)
+
+            self.stdout.write('{} - VENTAS: {} - CONSUMOS: {} - CODIGOS: {}'.format(sucursal.slug, totales['ventas'], totales['consumos'], totales['codigos']))
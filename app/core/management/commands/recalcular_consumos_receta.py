@@ -0,0 +1,73 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min, Max
+from core import models
+from ventas import versiones_recetas
+
+
+class Command(BaseCommand):
+
+    help = 'Recalcula los consumos de las ventas de una receta con el volumen vigente de sus ingredientes en cada fecha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('receta_id', type=int, help='Id de la receta')
+        parser.add_argument('--desde', help='Fecha inicial, AAAA-MM-DD (por default, la primera venta de la receta)')
+        parser.add_argument('--hasta', help='Fecha final, AAAA-MM-DD (por default, la última venta de la receta)')
+        parser.add_argument('--ingrediente', type=int, help='Id del ingrediente cuyo volumen se corrige a partir de --desde')
+        parser.add_argument('--volumen', type=int, help='Volumen correcto del ingrediente (0 si la receta no lo lleva)')
+
+
+    def fecha(self, texto):
+
+        if texto is None:
+            return None
+
+        try:
+            return datetime.datetime.strptime(texto, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Fecha inválida: {} (se espera AAAA-MM-DD)'.format(texto))
+
+
+    def handle(self, *args, **kwargs):
+
+        try:
+            receta = models.Receta.objects.select_related('sucursal').get(id=kwargs['receta_id'])
+        except models.Receta.DoesNotExist:
+            raise CommandError('La receta {} no existe'.format(kwargs['receta_id']))
+
+        fecha_inicial = self.fecha(kwargs['desde'])
+        fecha_final = self.fecha(kwargs['hasta'])
+
+        # Registramos la corrección del volumen antes de recalcular
+        if kwargs['ingrediente'] is not None or kwargs['volumen'] is not None:
+
+            if kwargs['ingrediente'] is None or kwargs['volumen'] is None or fecha_inicial is None:
+                raise CommandError('Para corregir un volumen se requieren --ingrediente, --volumen y --desde')
+
+            try:
+                ingrediente = models.Ingrediente.objects.get(id=kwargs['ingrediente'])
+            except models.Ingrediente.DoesNotExist:
+                raise CommandError('El ingrediente {} no existe'.format(kwargs['ingrediente']))
+
+            versiones_recetas.registrar_version(receta, ingrediente, kwargs['volumen'], fecha_inicial)
+
+        fechas_ventas = models.Venta.objects.filter(receta=receta).aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        fecha_inicial = fecha_inicial or fechas_ventas['primera']
+        fecha_final = fecha_final or fechas_ventas['ultima']
+
+        if fecha_inicial is None or fecha_final is None:
+            self.stdout.write('La receta {} no tiene ventas'.format(receta.id))
+            return
+
+        totales = versiones_recetas.recalcular_consumos(receta, fecha_inicial, fecha_final)
+
+        self.stdout.write('{} - {} A {} - ACTUALIZADOS: {} - CREADOS: {} - ELIMINADOS: {} - MERMAS: {}'.format(
+            receta.codigo_pos,
+            fecha_inicial,
+            fecha_final,
+            totales['actualizados'],
+            totales['creados'],
+            totales['eliminados'],
+            totales['mermas']
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from core import models
+from inventarios import conteos
+
+
+class Command(BaseCommand):
+
+    help = 'Recalcula desde cero los contadores de botellas contadas y no contadas de las inspecciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inspeccion', type=int, help='Id de la inspección (por default, todas)')
+        parser.add_argument('--abiertas', action='store_true', help='Solo las inspecciones abiertas')
+
+
+    def handle(self, *args, **kwargs):
+
+        inspecciones = models.Inspeccion.objects.order_by('id')
+        if kwargs['inspeccion'] is not None:
+            inspecciones = inspecciones.filter(id=kwargs['inspeccion'])
+        if kwargs['abiertas']:
+            inspecciones = inspecciones.filter(estado=models.Inspeccion.ABIERTA)
+
+        corregidas = 0
+        for inspeccion in inspecciones.only('id', 'botellas_total', 'botellas_contadas'):
+            total, contadas = conteos.recalcular(inspeccion.id)
+
+            if (total, contadas) != (inspeccion.botellas_total, inspeccion.botellas_contadas):
+                corregidas += 1
+                self.stdout.write('INSPECCION: {} - BOTELLAS: {} -> {} - CONTADAS: {} -> {}'.format(
+                    inspeccion.id,
+                    inspeccion.botellas_total,
+                    total,
+                    inspeccion.botellas_contadas,
+                    contadas
+                ))
+
+        self.stdout.write('INSPECCIONES CORREGIDAS: {}'.format(corregidas))
@@ -0,0 +1,43 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import consumo_diario
+
+
+class Command(BaseCommand):
+
+    help = 'Reconstruye el consumo diario por ingrediente y almacén a partir de los ConsumosRecetaVendida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Id de la sucursal (por default, todas)')
+        parser.add_argument('--desde', help='Fecha inicial, AAAA-MM-DD')
+        parser.add_argument('--hasta', help='Fecha final, AAAA-MM-DD')
+
+
+    def fecha(self, texto):
+
+        if texto is None:
+            return None
+
+        try:
+            return datetime.datetime.strptime(texto, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Fecha inválida: {} (se espera AAAA-MM-DD)'.format(texto))
+
+
+    def handle(self, *args, **kwargs):
+
+        fecha_inicial = self.fecha(kwargs['desde'])
+        fecha_final = self.fecha(kwargs['hasta'])
+
+        sucursal = None
+        if kwargs['sucursal'] is not None:
+            try:
+                sucursal = models.Sucursal.objects.get(id=kwargs['sucursal'])
+            except models.Sucursal.DoesNotExist:
+                raise CommandError('La sucursal {} no existe'.format(kwargs['sucursal']))
+
+        renglones = consumo_diario.recalcular(sucursal, fecha_inicial, fecha_final)
+
+        self.stdout.write('CONSUMOS DIARIOS: {}'.format(renglones))
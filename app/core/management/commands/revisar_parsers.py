@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas.parsers import registro
+
+
+class Command(BaseCommand):
+
+    help = 'Valida los parsers de ventas y lista las sucursales que no tienen parser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estricto', action='store_true', help='Termina con error si alguna sucursal no tiene parser')
+
+
+    def handle(self, *args, **kwargs):
+
+        # Volvemos a cargar el registro para validar los módulos y especificaciones actuales
+        registro.cargar_registro()
+
+        for slug in sorted(registro.REGISTRO):
+            self.stdout.write('{} - {}'.format(slug, registro.ORIGENES[slug].upper()))
+
+        sin_parser = registro.sucursales_sin_parser(models.Sucursal.objects.order_by('id'))
+
+        for sucursal in sin_parser:
+            self.stdout.write('SIN PARSER: {} ({})'.format(sucursal.slug, sucursal.id))
+
+        self.stdout.write('PARSERS: {} - SUCURSALES SIN PARSER: {}'.format(len(registro.REGISTRO), len(sin_parser)))
+
+        if kwargs['estricto'] and sin_parser:
+            raise CommandError('Hay {} sucursales sin parser de ventas'.format(len(sin_parser)))
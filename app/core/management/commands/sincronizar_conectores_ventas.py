@@ -0,0 +1,52 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import models
+from ventas import conectores
+
+
+class Command(BaseCommand):
+
+    help = 'Descarga y registra los reportes de ventas de los conectores activos a partir de su última fecha sincronizada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Id de la sucursal (por default, todas)')
+        parser.add_argument('--hasta', help='Último día a sincronizar, AAAA-MM-DD (por default, ayer)')
+        parser.add_argument('--intervalo', type=int, help='Minutos entre sincronizaciones; sin este parámetro sincroniza una vez y termina')
+
+
+    def sincronizar(self, sucursal_id, hasta):
+
+        conectores_activos = models.ConectorVentas.objects.filter(activo=True).select_related('sucursal').order_by('sucursal_id', 'id')
+        if sucursal_id is not None:
+            conectores_activos = conectores_activos.filter(sucursal_id=sucursal_id)
+
+        for conector in conectores_activos:
+            resultado = conectores.sincronizar(conector, hasta)
+
+            self.stdout.write('{} - {} - FECHAS: {} - VENTAS: {} - ULTIMA FECHA: {}{}'.format(
+                conector.sucursal.slug,
+                conector.get_tipo_display(),
+                resultado['fechas'],
+                resultado['ventas'],
+                conector.ultima_fecha,
+                ' - ERROR' if resultado['error'] else ''
+            ))
+
+
+    def handle(self, *args, **kwargs):
+
+        hasta = None
+        if kwargs['hasta']:
+            try:
+                hasta = datetime.datetime.strptime(kwargs['hasta'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Fecha inválida: {} (se espera AAAA-MM-DD)'.format(kwargs['hasta']))
+
+        while True:
+            self.sincronizar(kwargs['sucursal'], hasta)
+
+            if kwargs['intervalo'] is None:
+                break
+            time.sleep(kwargs['intervalo'] * 60)
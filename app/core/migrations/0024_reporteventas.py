@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_auto_20191113_1752'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteVentas',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo', models.FileField(upload_to='reportes_ventas/')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255)),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('0', 'PENDIENTE'), ('1', 'PROCESANDO'), ('2', 'TERMINADO'), ('3', 'ERROR')], default='0', max_length=1)),
+                ('timestamp_alta', models.DateTimeField(auto_now_add=True)),
+                ('timestamp_inicio', models.DateTimeField(blank=True, default=None, null=True)),
+                ('timestamp_fin', models.DateTimeField(blank=True, default=None, null=True)),
+                ('bloques_procesados', models.IntegerField(default=0)),
+                ('renglones_procesados', models.IntegerField(default=0)),
+                ('ventas_registradas', models.IntegerField(default=0)),
+                ('consumos_registrados', models.IntegerField(default=0)),
+                ('productos_no_registrados', models.IntegerField(default=0)),
+                ('errores', models.TextField(blank=True)),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reportes_ventas', to='core.Sucursal')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes_ventas_usuario', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ReportesVentas',
+            },
+        ),
+    ]
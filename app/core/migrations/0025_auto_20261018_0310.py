@@ -0,0 +1,33 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_reporteventas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productosinregistro',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='reporteventas',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='reporteventas',
+            name='renglones_duplicados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+    ]
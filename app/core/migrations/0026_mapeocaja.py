@@ -0,0 +1,29 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_auto_20261018_0310'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapeoCaja',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('columna', models.CharField(default='terminal', max_length=255)),
+                ('valor', models.CharField(max_length=255)),
+                ('prioridad', models.IntegerField(default=0)),
+                ('caja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mapeos', to='core.Caja')),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mapeos_caja', to='core.Sucursal')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='mapeocaja',
+            unique_together={('sucursal', 'columna', 'valor')},
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def crear_resumenes(apps, schema_editor):
+    """ Arma el resumen de cada código POS con los ProductosSinRegistro que ya existen """
+
+    ProductoSinRegistro = apps.get_model('core', 'ProductoSinRegistro')
+    ResumenSinRegistro = apps.get_model('core', 'ResumenSinRegistro')
+
+    totales = ProductoSinRegistro.objects.values('sucursal_id', 'codigo_pos').annotate(
+        ultimo_nombre=models.Max('nombre'),
+        total_renglones=models.Count('id'),
+        total_unidades=models.Sum('unidades'),
+        total_importe=models.Sum('importe'),
+        fecha_minima=models.Min('fecha'),
+        fecha_maxima=models.Max('fecha')
+    ).order_by()
+
+    ResumenSinRegistro.objects.bulk_create([
+        ResumenSinRegistro(
+            sucursal_id=total['sucursal_id'],
+            codigo_pos=total['codigo_pos'],
+            nombre=total['ultimo_nombre'],
+            renglones=total['total_renglones'],
+            unidades=total['total_unidades'] or 0,
+            importe=total['total_importe'] or 0,
+            primera_fecha=total['fecha_minima'],
+            ultima_fecha=total['fecha_maxima']
+        )
+        for total in totales
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_mapeocaja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenSinRegistro',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_pos', models.CharField(blank=True, max_length=255)),
+                ('nombre', models.CharField(blank=True, max_length=255)),
+                ('renglones', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('importe', models.IntegerField(default=0)),
+                ('primera_fecha', models.DateField(blank=True, null=True)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productosinregistro',
+            index=models.Index(fields=['sucursal', 'codigo_pos'], name='core_produc_sucursa_a79d1b_idx'),
+        ),
+        migrations.AddField(
+            model_name='resumensinregistro',
+            name='sucursal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_sin_registro', to='core.Sucursal'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumensinregistro',
+            unique_together={('sucursal', 'codigo_pos')},
+        ),
+        migrations.RunPython(crear_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def crear_consumos_diarios(apps, schema_editor):
+    """ Arma el consumo diario por ingrediente y almacén con los ConsumosRecetaVendida que ya existen """
+
+    ConsumoRecetaVendida = apps.get_model('core', 'ConsumoRecetaVendida')
+    ConsumoDiario = apps.get_model('core', 'ConsumoDiario')
+
+    totales = ConsumoRecetaVendida.objects.values('ingrediente_id', 'venta__caja__almacen_id', 'fecha').annotate(
+        total_volumen=models.Sum('volumen'),
+        total_unidades=models.Sum('venta__unidades'),
+        total_importe=models.Sum('venta__importe')
+    ).order_by()
+
+    ConsumoDiario.objects.bulk_create([
+        ConsumoDiario(
+            ingrediente_id=total['ingrediente_id'],
+            almacen_id=total['venta__caja__almacen_id'],
+            fecha=total['fecha'],
+            volumen=total['total_volumen'] or 0,
+            unidades=total['total_unidades'] or 0,
+            importe=total['total_importe'] or 0
+        )
+        for total in totales
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_resumensinregistro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumoDiario',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('volumen', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('importe', models.IntegerField(default=0)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_diarios', to='core.Almacen')),
+                ('ingrediente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_diarios', to='core.Ingrediente')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='consumodiario',
+            index=models.Index(fields=['almacen', 'fecha'], name='core_consum_almacen_64b8bf_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='consumodiario',
+            unique_together={('ingrediente', 'almacen', 'fecha')},
+        ),
+        migrations.RunPython(crear_consumos_diarios, migrations.RunPython.noop),
+    ]
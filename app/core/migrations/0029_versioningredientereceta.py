@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_consumodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionIngredienteReceta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('volumen', models.IntegerField()),
+                ('fecha_inicial', models.DateField()),
+                ('ingrediente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versiones_recetas', to='core.Ingrediente')),
+                ('receta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versiones_ingredientes', to='core.Receta')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='versioningredientereceta',
+            unique_together={('receta', 'ingrediente', 'fecha_inicial')},
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_versioningredientereceta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConectorVentas',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('0', 'CARPETA'), ('1', 'HTTP')], default='0', max_length=1)),
+                ('ubicacion', models.CharField(max_length=500)),
+                ('token', models.CharField(blank=True, max_length=255)),
+                ('fecha_inicial', models.DateField()),
+                ('ultima_fecha', models.DateField(blank=True, default=None, null=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('timestamp_ultima_ejecucion', models.DateTimeField(blank=True, default=None, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conectores_ventas', to='core.Sucursal')),
+            ],
+            options={
+                'verbose_name_plural': 'ConectoresVentas',
+            },
+        ),
+    ]
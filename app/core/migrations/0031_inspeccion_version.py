@@ -0,0 +1,23 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_conectorventas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspeccion',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='iteminspeccion',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
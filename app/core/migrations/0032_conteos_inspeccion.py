@@ -0,0 +1,75 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def crear_conteos_inspecciones(apps, schema_editor):
+    """ Calcula los contadores de las inspecciones que ya existen a partir de sus ItemInspeccion """
+
+    Inspeccion = apps.get_model('core', 'Inspeccion')
+    ItemInspeccion = apps.get_model('core', 'ItemInspeccion')
+    ConteoIngredienteInspeccion = apps.get_model('core', 'ConteoIngredienteInspeccion')
+
+    conteos = ItemInspeccion.objects.values('inspeccion_id', 'botella__producto__ingrediente_id').annotate(
+        total=models.Count('id'),
+        contadas=models.Count('id', filter=models.Q(inspeccionado=True))
+    ).order_by('inspeccion_id')
+
+    totales = {}
+    nuevos = []
+    for conteo in conteos:
+        total, contadas = totales.get(conteo['inspeccion_id'], (0, 0))
+        totales[conteo['inspeccion_id']] = (total + conteo['total'], contadas + conteo['contadas'])
+
+        if conteo['botella__producto__ingrediente_id'] is not None:
+            nuevos.append(ConteoIngredienteInspeccion(
+                inspeccion_id=conteo['inspeccion_id'],
+                ingrediente_id=conteo['botella__producto__ingrediente_id'],
+                botellas_total=conteo['total'],
+                botellas_contadas=conteo['contadas']
+            ))
+
+    ConteoIngredienteInspeccion.objects.bulk_create(nuevos, batch_size=1000)
+
+    for inspeccion_id, (total, contadas) in totales.items():
+        Inspeccion.objects.filter(id=inspeccion_id).update(botellas_total=total, botellas_contadas=contadas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_inspeccion_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoIngredienteInspeccion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('botellas_total', models.IntegerField(default=0)),
+                ('botellas_contadas', models.IntegerField(default=0)),
+                ('ingrediente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conteos_inspecciones', to='core.Ingrediente')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inspeccion',
+            name='botellas_contadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inspeccion',
+            name='botellas_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conteoingredienteinspeccion',
+            name='inspeccion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conteos_ingredientes', to='core.Inspeccion'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conteoingredienteinspeccion',
+            unique_together={('inspeccion', 'ingrediente')},
+        ),
+        migrations.RunPython(crear_conteos_inspecciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.15 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_conteos_inspeccion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredientereceta',
+            name='timestamp_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='receta',
+            name='timestamp_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
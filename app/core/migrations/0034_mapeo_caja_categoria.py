@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_sello_matriz_recetas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mapeocaja',
+            name='columna',
+            field=models.CharField(default='categoria', max_length=255),
+        ),
+    ]
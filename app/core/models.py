@@ -176,6 +176,7 @@ class Receta(models.Model):
 	nombre 			= models.CharField(max_length=255)
 	sucursal 		= models.ForeignKey(Sucursal, related_name='recetas', on_delete=models.CASCADE)
 	ingredientes 	= models.ManyToManyField(Ingrediente, through='IngredienteReceta')
+	timestamp_update = models.DateTimeField(auto_now=True) # Sello de la matriz de recetas en el cache
 
 
 	def __str__(self):
@@ -195,6 +196,7 @@ class IngredienteReceta(models.Model):
 	receta 		= models.ForeignKey(Receta, on_delete=models.CASCADE)
 	ingrediente = models.ForeignKey(Ingrediente, on_delete=models.CASCADE)
 	volumen 	= models.IntegerField()
+	timestamp_update = models.DateTimeField(auto_now=True) # Sello de la matriz de recetas en el cache
 
 	class Meta:
 		unique_together = ['receta', 'ingrediente']
@@ -206,6 +208,30 @@ class IngredienteReceta(models.Model):
 		return 'RECETA: {} - INGREDIENTE: {} - VOLUMEN: {}'.format(nombre_receta, nombre_ingrediente, self.volumen)
 
 
+"""
+--------------------------------------------------------------------------
+Una VersionIngredienteReceta registra el volumen de un Ingrediente en una
+Receta a partir de una fecha. Sirve para corregir el consumo de las
+ventas pasadas: en una fecha vale la última versión que ya había empezado
+o, si no hay ninguna, el volumen actual de IngredienteReceta. Un volumen
+de 0 indica que la receta no llevaba el ingrediente.
+--------------------------------------------------------------------------
+"""
+
+class VersionIngredienteReceta(models.Model):
+
+	receta 			= models.ForeignKey(Receta, related_name='versiones_ingredientes', on_delete=models.CASCADE)
+	ingrediente 	= models.ForeignKey(Ingrediente, related_name='versiones_recetas', on_delete=models.CASCADE)
+	volumen 		= models.IntegerField()
+	fecha_inicial 	= models.DateField()
+
+	class Meta:
+		unique_together = ['receta', 'ingrediente', 'fecha_inicial']
+
+	def __str__(self):
+		return 'RECETA: {} - INGREDIENTE: {} - VOLUMEN: {} - DESDE: {}'.format(self.receta.nombre, self.ingrediente.nombre, self.volumen, self.fecha_inicial)
+
+
 """
 --------------------------------------------------------------------------
 Un Almacen es una barra o bodega donde se guardan botellas. Puede tener
@@ -249,6 +275,34 @@ class Caja(models.Model):
 		return 'CAJA: {} - BARRA: {}'.format(self.numero, nombre_almacen)
 
 
+"""
+--------------------------------------------------------------------------
+Un MapeoCaja indica a qué Caja corresponden los renglones del reporte de
+ventas de una Sucursal. 'columna' es la columna del reporte ya procesado
+y 'valor' el texto que trae esa columna. Por default es 'categoria', que
+es la que sacan los reportes de la mayoría de las especificaciones (ver
+ventas/parsers/especificaciones.py); 'terminal' sirve para los reportes
+que traen la caja del punto de venta.
+Los renglones que no coinciden con ningún mapeo van a la caja default de
+la especificación de la sucursal.
+--------------------------------------------------------------------------
+"""
+
+class MapeoCaja(models.Model):
+
+	sucursal 	= models.ForeignKey(Sucursal, related_name='mapeos_caja', on_delete=models.CASCADE)
+	columna 	= models.CharField(max_length=255, default='categoria')
+	valor 		= models.CharField(max_length=255)
+	caja 		= models.ForeignKey(Caja, related_name='mapeos', on_delete=models.CASCADE)
+	prioridad 	= models.IntegerField(default=0) # Si un renglón coincide con varias columnas, gana la prioridad más baja
+
+	class Meta:
+		unique_together = ['sucursal', 'columna', 'valor']
+
+	def __str__(self):
+		return 'SUCURSAL: {} - {}: {} - CAJA: {}'.format(self.sucursal.nombre, self.columna, self.valor, self.caja.nombre)
+
+
 """
 --------------------------------------------------------------------------
 Una Venta registra la venta de una Receta que ocurre en una Sucursal a
@@ -264,6 +318,7 @@ class Venta(models.Model):
 	unidades 	= models.IntegerField()
 	importe 	= models.IntegerField()
 	caja     	= models.ForeignKey(Caja, related_name='ventas_caja', on_delete=models.CASCADE)
+	huella 		= models.CharField(max_length=40, blank=True, null=True, db_index=True) # Identifica el renglón del reporte de ventas
 
 	def __str__(self):
 		nombre_receta = self.receta.nombre
@@ -293,6 +348,31 @@ class ConsumoRecetaVendida(models.Model):
 		return 'INGREDIENTE: {} - RECETA: {} - VENTA: {} - FECHA: {} - VOLUMEN {}'.format(nombre_ingrediente, nombre_receta, self.venta.id, self.fecha, self.volumen)
 
 
+"""
+--------------------------------------------------------------------------
+Un ConsumoDiario acumula los ConsumosRecetaVendida de un Ingrediente en un
+Almacen en un día: ml consumidos y unidades e importe de las ventas que
+lo consumieron
+--------------------------------------------------------------------------
+"""
+
+class ConsumoDiario(models.Model):
+
+	ingrediente 	= models.ForeignKey(Ingrediente, related_name='consumos_diarios', on_delete=models.CASCADE)
+	almacen 		= models.ForeignKey(Almacen, related_name='consumos_diarios', on_delete=models.CASCADE)
+	fecha 			= models.DateField()
+	volumen 		= models.IntegerField(default=0)
+	unidades 		= models.IntegerField(default=0)
+	importe 		= models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ['ingrediente', 'almacen', 'fecha']
+		indexes = [models.Index(fields=['almacen', 'fecha'])]
+
+	def __str__(self):
+		return 'INGREDIENTE: {} - ALMACEN: {} - FECHA: {} - VOLUMEN: {}'.format(self.ingrediente.nombre, self.almacen.nombre, self.fecha, self.volumen)
+
+
 """
 --------------------------------------------------------------------------
 Un Producto es un tipo de botella con una combinación única de ingrediente,
@@ -470,6 +550,9 @@ class Inspeccion(models.Model):
 	fecha_update        = models.DateField(auto_now=True)
 	timestamp_update    = models.DateTimeField(auto_now=True)
 	estado              = models.CharField(max_length=1, choices=ESTADOS_INSPECCION, default=ABIERTA)
+	version             = models.IntegerField(default=0) # Se incrementa con cada cambio a sus ItemInspeccion
+	botellas_total      = models.IntegerField(default=0) # Contadores de ItemInspeccion (ver 'inventarios/conteos.py')
+	botellas_contadas   = models.IntegerField(default=0)
 	
 	def __str__(self):
 		numero_almacen = self.almacen.numero
@@ -491,6 +574,7 @@ class ItemInspeccion(models.Model):
 	peso_botella            = models.IntegerField(null=True, blank=True)
 	timestamp_inspeccion    = models.DateTimeField(auto_now=True)
 	inspeccionado 			= models.BooleanField(default=False)
+	version                 = models.IntegerField(default=0) # Versión de la inspección en su último cambio
 	
 	def __str__(self):
 		fecha_inspeccion = self.inspeccion.fecha_alta
@@ -498,6 +582,28 @@ class ItemInspeccion(models.Model):
 		return 'FECHA: {} - FOLIO: {} - PESO: {}'.format(fecha_inspeccion, folio_botella, self.peso_botella)
 
 
+"""
+--------------------------------------------------------------------------
+Contadores de ItemInspeccion de una inspección por ingrediente: cuántas
+botellas del ingrediente hay que inspeccionar y cuántas ya se contaron.
+Se actualizan cada vez que un ItemInspeccion se crea o se cuenta.
+--------------------------------------------------------------------------
+"""
+
+class ConteoIngredienteInspeccion(models.Model):
+
+	inspeccion          = models.ForeignKey(Inspeccion, related_name='conteos_ingredientes', on_delete=models.CASCADE)
+	ingrediente         = models.ForeignKey(Ingrediente, related_name='conteos_inspecciones', on_delete=models.CASCADE)
+	botellas_total      = models.IntegerField(default=0)
+	botellas_contadas   = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ['inspeccion', 'ingrediente']
+
+	def __str__(self):
+		return 'INSPECCION: {} - INGREDIENTE: {} - CONTADAS: {} DE {}'.format(self.inspeccion_id, self.ingrediente.nombre, self.botellas_contadas, self.botellas_total)
+
+
 """
 ------------------------------------------------------------------------------
 Un ProductoSinRegistro es un item del reporte de ventas que no está registrado
@@ -513,11 +619,42 @@ class ProductoSinRegistro(models.Model):
 	fecha       = models.DateField(blank=True, null=True, default=datetime.date.today)
 	unidades 	= models.IntegerField(null=True, blank=True)
 	importe 	= models.IntegerField(null=True, blank=True)
+	huella 		= models.CharField(max_length=40, blank=True, null=True, db_index=True) # Identifica el renglón del reporte de ventas
+
+	class Meta:
+		# Para recalcular el resumen y reatribuir los renglones de un código POS
+		indexes = [models.Index(fields=['sucursal', 'codigo_pos'])]
 	
 	def __str__(self):
 		return 'SUCURSAL: {} - CODIGO: {} - NOMBRE: {}'.format(self.sucursal.nombre, self.codigo_pos, self.nombre)
 
 
+"""
+------------------------------------------------------------------------------
+Un ResumenSinRegistro acumula los ProductosSinRegistro de un código POS en
+una Sucursal: renglones, unidades e importe vendidos y la primera y última
+fecha en que apareció en los reportes de ventas
+------------------------------------------------------------------------------
+"""
+
+class ResumenSinRegistro(models.Model):
+
+	sucursal 		= models.ForeignKey(Sucursal, related_name='resumenes_sin_registro', on_delete=models.CASCADE)
+	codigo_pos 		= models.CharField(max_length=255, blank=True)
+	nombre 			= models.CharField(max_length=255, blank=True)
+	renglones 		= models.IntegerField(default=0)
+	unidades 		= models.IntegerField(default=0)
+	importe 		= models.IntegerField(default=0)
+	primera_fecha 	= models.DateField(blank=True, null=True)
+	ultima_fecha 	= models.DateField(blank=True, null=True)
+
+	class Meta:
+		unique_together = ['sucursal', 'codigo_pos']
+
+	def __str__(self):
+		return 'SUCURSAL: {} - CODIGO: {} - NOMBRE: {} - UNIDADES: {}'.format(self.sucursal.nombre, self.codigo_pos, self.nombre, self.unidades)
+
+
 """
 --------------------------------------------------------------------------
 Un ReporteMermas es el reporte de mermas de una Inspeccion
@@ -612,3 +749,82 @@ class MermaIngrediente(models.Model):
 		# except ZeroDivisionError, Exception:
 		# 	self.porcentaje = decimal.Decimal(0)
 		# 	super(MermaIngrediente, self).save(*args, **kwargs)
+
+
+"""
+--------------------------------------------------------------------------
+Un ReporteVentas es un reporte de ventas subido por el usuario que se
+procesa en segundo plano ('manage.py procesar_reportes_ventas'). Guarda el
+archivo, el estado del procesamiento y los totales registrados.
+--------------------------------------------------------------------------
+"""
+
+class ReporteVentas(models.Model):
+
+	# Estados que puede tener un ReporteVentas:
+	PENDIENTE = '0'
+	PROCESANDO = '1'
+	TERMINADO = '2'
+	ERROR = '3'
+	ESTADOS_REPORTE = ((PENDIENTE, 'PENDIENTE'), (PROCESANDO, 'PROCESANDO'), (TERMINADO, 'TERMINADO'), (ERROR, 'ERROR'))
+
+	sucursal 					= models.ForeignKey(Sucursal, related_name='reportes_ventas', on_delete=models.CASCADE)
+	usuario 					= models.ForeignKey(settings.AUTH_USER_MODEL, related_name='reportes_ventas_usuario', blank=True, null=True, on_delete=models.SET_NULL)
+	archivo 					= models.FileField(upload_to='reportes_ventas/')
+	nombre_archivo 				= models.CharField(max_length=255, blank=True)
+	huella 						= models.CharField(max_length=64, blank=True, db_index=True) # SHA-256 del archivo
+	fecha 						= models.DateField() # Fecha de las ventas del reporte
+	estado 						= models.CharField(max_length=1, choices=ESTADOS_REPORTE, default=PENDIENTE)
+	timestamp_alta 				= models.DateTimeField(auto_now_add=True)
+	timestamp_inicio 			= models.DateTimeField(blank=True, null=True, default=None)
+	timestamp_fin 				= models.DateTimeField(blank=True, null=True, default=None)
+	bloques_procesados 			= models.IntegerField(default=0)
+	renglones_procesados 		= models.IntegerField(default=0)
+	ventas_registradas 			= models.IntegerField(default=0)
+	consumos_registrados 		= models.IntegerField(default=0)
+	productos_no_registrados 	= models.IntegerField(default=0)
+	renglones_duplicados 		= models.IntegerField(default=0)
+	errores 					= models.TextField(blank=True)
+
+	class Meta:
+		verbose_name_plural = 'ReportesVentas'
+
+	def __str__(self):
+		return 'REPORTE: {} - SUCURSAL: {} - ARCHIVO: {} - ESTADO: {}'.format(self.id, self.sucursal.nombre, self.nombre_archivo, self.get_estado_display())
+
+
+
+"""
+--------------------------------------------------------------------------
+Un ConectorVentas descarga periódicamente el reporte de ventas diario de
+una sucursal desde su origen ('manage.py sincronizar_conectores_ventas').
+
+'ubicacion' es la ruta o la URL del reporte de un día, con la fecha como
+'{fecha}' (p. ej. '/mnt/pos/magno/ventas_{fecha:%Y%m%d}.xls'). 'ultima_fecha'
+es la marca de agua: el último día que se registró completo. Cada
+sincronización solo descarga los días posteriores.
+--------------------------------------------------------------------------
+"""
+
+class ConectorVentas(models.Model):
+
+	# Tipos de origen:
+	CARPETA = '0' # Carpeta local o montada (p. ej. un SFTP montado)
+	HTTP = '1'
+	TIPOS_CONECTOR = ((CARPETA, 'CARPETA'), (HTTP, 'HTTP'))
+
+	sucursal 					= models.ForeignKey(Sucursal, related_name='conectores_ventas', on_delete=models.CASCADE)
+	tipo 						= models.CharField(max_length=1, choices=TIPOS_CONECTOR, default=CARPETA)
+	ubicacion 					= models.CharField(max_length=500)
+	token 						= models.CharField(max_length=255, blank=True) # Token de autorización para HTTP
+	fecha_inicial 				= models.DateField() # Primer día que se descarga
+	ultima_fecha 				= models.DateField(blank=True, null=True, default=None) # Marca de agua
+	activo 						= models.BooleanField(default=True)
+	timestamp_ultima_ejecucion 	= models.DateTimeField(blank=True, null=True, default=None)
+	ultimo_error 				= models.TextField(blank=True)
+
+	class Meta:
+		verbose_name_plural = 'ConectoresVentas'
+
+	def __str__(self):
+		return 'CONECTOR: {} - SUCURSAL: {} - TIPO: {} - ULTIMA FECHA: {}'.format(self.id, self.sucursal.nombre, self.get_tipo_display(), self.ultima_fecha)
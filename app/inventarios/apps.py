@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class InventariosConfig(AppConfig):
     name = 'inventarios'
+
+    def ready(self):
+        # Conectamos las señales que mantienen los contadores de las inspecciones
+        from inventarios import signals
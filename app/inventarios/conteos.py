@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q, Count, Case, When, Value, IntegerField
+
+from core import models
+
+
+"""
+-----------------------------------------------------------------------
+CONTADORES DE BOTELLAS CONTADAS / NO CONTADAS DE UNA INSPECCION
+
+La Inspeccion guarda cuántos ItemInspeccion tiene ('botellas_total') y
+cuántos ya se contaron ('botellas_contadas'), y ConteoIngredienteInspeccion
+lo mismo por ingrediente. Así la barra de progreso se lee de un solo
+renglón en lugar de contar los items en cada refresh.
+
+Los contadores se actualizan con F() en la misma transacción que el
+cambio que los mueve:
+
+- Al crear la inspección se inicializan con sus botellas ('registrar_inspeccion')
+- Un ItemInspeccion creado por fuera suma (señales)
+- Al eliminar una Botella se restan sus items (señales, 'restar_botella')
+- Un item que pasa a 'inspeccionado' suma a las contadas ('marcar_contados')
+
+Los ItemInspeccion eliminados de otra forma no restan: al eliminar una
+inspección sus items se borran con un solo DELETE. Si se eliminan items
+de una inspección que sigue viva, el comando
+'recalcular_conteos_inspecciones' repara los contadores desde cero.
+-----------------------------------------------------------------------
+"""
+
+
+"""
+-----------------------------------------------------------------------
+Suma los deltas a los contadores de una inspección. 'deltas' es un
+diccionario {ingrediente_id: (delta total, delta contadas)}; los items
+cuya botella no tiene producto usan None como ingrediente y solo mueven
+los contadores de la inspección.
+-----------------------------------------------------------------------
+"""
+def sumar(inspeccion_id, deltas):
+
+    total = sum(delta[0] for delta in deltas.values())
+    contadas = sum(delta[1] for delta in deltas.values())
+
+    if total == 0 and contadas == 0:
+        return
+
+    models.Inspeccion.objects.filter(id=inspeccion_id).update(
+        botellas_total=F('botellas_total') + total,
+        botellas_contadas=F('botellas_contadas') + contadas
+    )
+
+    deltas_ingredientes = {ingrediente_id: delta for ingrediente_id, delta in deltas.items() if ingrediente_id is not None}
+    if not deltas_ingredientes:
+        return
+
+    conteos = models.ConteoIngredienteInspeccion.objects.filter(inspeccion_id=inspeccion_id, ingrediente_id__in=deltas_ingredientes.keys())
+    existentes = set(conteos.values_list('ingrediente_id', flat=True))
+
+    if existentes:
+        conteos.update(
+            botellas_total=F('botellas_total') + Case(
+                *[When(ingrediente_id=ingrediente_id, then=Value(deltas_ingredientes[ingrediente_id][0])) for ingrediente_id in existentes],
+                output_field=IntegerField()
+            ),
+            botellas_contadas=F('botellas_contadas') + Case(
+                *[When(ingrediente_id=ingrediente_id, then=Value(deltas_ingredientes[ingrediente_id][1])) for ingrediente_id in existentes],
+                output_field=IntegerField()
+            )
+        )
+
+    models.ConteoIngredienteInspeccion.objects.bulk_create([
+        models.ConteoIngredienteInspeccion(
+            inspeccion_id=inspeccion_id,
+            ingrediente_id=ingrediente_id,
+            botellas_total=delta[0],
+            botellas_contadas=delta[1]
+        )
+        for ingrediente_id, delta in deltas_ingredientes.items() if ingrediente_id not in existentes
+    ])
+
+
+"""
+-----------------------------------------------------------------------
+Inicializa los contadores de una inspección recién creada con las
+botellas que se le asignaron (conviene traerlas con su producto)
+-----------------------------------------------------------------------
+"""
+def registrar_inspeccion(inspeccion, botellas):
+
+    por_ingrediente = defaultdict(int)
+    total = 0
+    for botella in botellas:
+        total += 1
+        if botella.producto_id is not None:
+            por_ingrediente[botella.producto.ingrediente_id] += 1
+
+    models.Inspeccion.objects.filter(id=inspeccion.id).update(botellas_total=total, botellas_contadas=0)
+    inspeccion.botellas_total = total
+    inspeccion.botellas_contadas = 0
+
+    models.ConteoIngredienteInspeccion.objects.bulk_create([
+        models.ConteoIngredienteInspeccion(inspeccion_id=inspeccion.id, ingrediente_id=ingrediente_id, botellas_total=cantidad)
+        for ingrediente_id, cantidad in por_ingrediente.items()
+    ])
+
+
+"""
+-----------------------------------------------------------------------
+Resta de sus inspecciones los ItemInspeccion de una botella que se va a
+eliminar. Se llama antes de borrarla, mientras sus items existen.
+-----------------------------------------------------------------------
+"""
+def restar_botella(botella):
+
+    por_inspeccion = (
+        models.ItemInspeccion.objects
+        .filter(botella_id=botella.id)
+        .values('inspeccion_id')
+        .annotate(total=Count('id'), contadas=Count('id', filter=Q(inspeccionado=True)))
+        .order_by()
+    )
+    por_inspeccion = list(por_inspeccion)
+    if not por_inspeccion:
+        return
+
+    ingrediente_id = None
+    if botella.producto_id is not None:
+        ingrediente_id = models.Producto.objects.filter(id=botella.producto_id).values_list('ingrediente_id', flat=True).first()
+
+    for fila in sorted(por_inspeccion, key=lambda fila: fila['inspeccion_id']):
+        sumar(fila['inspeccion_id'], {ingrediente_id: (-fila['total'], -fila['contadas'])})
+
+
+"""
+-----------------------------------------------------------------------
+Suma a las contadas los items de 'items_ids' que todavía no están
+inspeccionados. Se llama dentro de la transacción del pesaje, antes de
+marcarlos, con la inspección ya bloqueada (ver 'pesaje.siguiente_version')
+para que dos pesajes de la misma botella no la cuenten dos veces.
+-----------------------------------------------------------------------
+"""
+def marcar_contados(items_ids):
+
+    por_contar = (
+        models.ItemInspeccion.objects
+        .filter(id__in=items_ids, inspeccionado=False)
+        .values('inspeccion_id', 'botella__producto__ingrediente_id')
+        .annotate(cantidad=Count('id'))
+        .order_by()
+    )
+
+    deltas = defaultdict(dict)
+    for fila in por_contar:
+        deltas[fila['inspeccion_id']][fila['botella__producto__ingrediente_id']] = (0, fila['cantidad'])
+
+    for inspeccion_id in sorted(deltas):
+        sumar(inspeccion_id, deltas[inspeccion_id])
+
+
+"""
+-----------------------------------------------------------------------
+Recalcula desde cero los contadores de una inspección a partir de sus
+ItemInspeccion. Retorna (botellas_total, botellas_contadas).
+-----------------------------------------------------------------------
+"""
+def recalcular(inspeccion_id):
+
+    with transaction.atomic():
+
+        # Bloqueamos la inspección para que ningún pesaje mueva los contadores mientras los recalculamos
+        models.Inspeccion.objects.select_for_update().filter(id=inspeccion_id).get()
+
+        filas = (
+            models.ItemInspeccion.objects
+            .filter(inspeccion_id=inspeccion_id)
+            .values('botella__producto__ingrediente_id')
+            .annotate(total=Count('id'), contadas=Count('id', filter=Q(inspeccionado=True)))
+            .order_by()
+        )
+        filas = list(filas)
+
+        total = sum(fila['total'] for fila in filas)
+        contadas = sum(fila['contadas'] for fila in filas)
+
+        models.ConteoIngredienteInspeccion.objects.filter(inspeccion_id=inspeccion_id).delete()
+        models.ConteoIngredienteInspeccion.objects.bulk_create([
+            models.ConteoIngredienteInspeccion(
+                inspeccion_id=inspeccion_id,
+                ingrediente_id=fila['botella__producto__ingrediente_id'],
+                botellas_total=fila['total'],
+                botellas_contadas=fila['contadas']
+            )
+            for fila in filas if fila['botella__producto__ingrediente_id'] is not None
+        ])
+        models.Inspeccion.objects.filter(id=inspeccion_id).update(botellas_total=total, botellas_contadas=contadas)
+
+    return total, contadas
@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField, CharField, DateTimeField
+from django.utils import timezone
+
+from core import models
+from inventarios import conteos
+
+
+"""
+-----------------------------------------------------------------------
+PESAJE POR LOTES DE LOS ITEMS DE UNA INSPECCION
+
+Aplica en una sola transacción los pesos capturados para varios
+ItemInspeccion: el ItemInspeccion queda inspeccionado con su peso y su
+Botella toma el mismo peso como 'peso_actual' y el estado capturado,
+igual que en 'update_peso_botella', pero con un UPDATE por tabla en
+lugar de dos por botella.
+
+Cada cambio incrementa la versión de la inspección y la guarda en los
+ItemInspeccion modificados; así la sincronización ('sincronizacion.py')
+sabe qué items cambiaron desde el cursor de un cliente.
+-----------------------------------------------------------------------
+"""
+
+# Máximo de pesos que se aceptan en un request
+MAXIMO_PESOS = 1000
+
+
+"""
+-----------------------------------------------------------------------
+Incrementa la versión de una inspección y la retorna. Debe llamarse
+dentro de una transacción: la inspección queda bloqueada hasta que ésta
+termina, así que sus cambios se numeran en orden.
+-----------------------------------------------------------------------
+"""
+def siguiente_version(inspeccion_id):
+
+    models.Inspeccion.objects.filter(id=inspeccion_id).update(version=F('version') + 1)
+
+    return models.Inspeccion.objects.filter(id=inspeccion_id).values_list('version', flat=True).get()
+
+
+"""
+-----------------------------------------------------------------------
+Construye un CASE que asigna a cada id su valor
+-----------------------------------------------------------------------
+"""
+def valor_por_id(valores, output_field):
+
+    return Case(
+        *[When(id=id_, then=Value(valor, output_field=output_field)) for id_, valor in valores.items()],
+        output_field=output_field
+    )
+
+
+"""
+-----------------------------------------------------------------------
+Actualiza los pesos validados. 'pesos' es una lista de diccionarios
+{'item_inspeccion', 'peso_botella', 'estado'} y opcionalmente
+'timestamp', el momento en que se pesó la botella (por default, ahora).
+
+Retorna un diccionario {id del ItemInspeccion: error}; los items
+actualizados no aparecen en él. Un item que no existe o que es de una
+sucursal que el usuario no tiene asignada no se actualiza.
+-----------------------------------------------------------------------
+"""
+def actualizar_pesos(pesos, usuario):
+
+    ids_items = set(peso['item_inspeccion'] for peso in pesos)
+    sucursales_usuario = set(usuario.sucursales.values_list('id', flat=True))
+
+    items = {
+        item['id']: item
+        for item in models.ItemInspeccion.objects.filter(id__in=ids_items).values('id', 'botella_id', 'inspeccion_id', 'inspeccion__sucursal_id')
+    }
+
+    ahora = timezone.now()
+    errores = {}
+    pesos_items = {}
+    timestamps_items = {}
+    inspecciones_items = {}
+    pesos_botellas = {}
+    estados_botellas = {}
+
+    # Si un item viene repetido, se queda su última captura
+    for peso in pesos:
+        item_id = peso['item_inspeccion']
+        item = items.get(item_id)
+
+        if item is None:
+            errores[item_id] = 'No existe el ItemInspeccion.'
+            continue
+
+        if item['inspeccion__sucursal_id'] not in sucursales_usuario:
+            errores[item_id] = 'El usuario no tiene asignada la sucursal de la inspección.'
+            continue
+
+        pesos_items[item_id] = peso['peso_botella']
+        timestamps_items[item_id] = peso.get('timestamp') or ahora
+        inspecciones_items[item_id] = item['inspeccion_id']
+        if item['botella_id'] is not None:
+            pesos_botellas[item['botella_id']] = peso['peso_botella']
+            estados_botellas[item['botella_id']] = peso['estado']
+
+    if not pesos_items:
+        return errores
+
+    with transaction.atomic():
+
+        versiones = {
+            inspeccion_id: siguiente_version(inspeccion_id)
+            for inspeccion_id in sorted(set(inspecciones_items.values()))
+        }
+
+        # Los items que apenas se cuentan suman a los contadores de su inspección
+        conteos.marcar_contados(pesos_items.keys())
+
+        models.ItemInspeccion.objects.filter(id__in=pesos_items.keys()).update(
+            peso_botella=valor_por_id(pesos_items, IntegerField()),
+            inspeccionado=True,
+            timestamp_inspeccion=valor_por_id(timestamps_items, DateTimeField()),
+            version=valor_por_id({item_id: versiones[inspeccion_id] for item_id, inspeccion_id in inspecciones_items.items()}, IntegerField())
+        )
+
+        if pesos_botellas:
+            models.Botella.objects.filter(id__in=pesos_botellas.keys()).update(
+                peso_actual=valor_por_id(pesos_botellas, IntegerField()),
+                estado=valor_por_id(estados_botellas, CharField())
+            )
+
+    return errores
@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from core import models
+
+
+# La clave incluye la versión de la inspección, que aumenta con cada pesaje (ver 'pesaje.py'), y su
+# número de botellas, que cambia con cada item que se agrega o se resta (ver 'conteos.py'): el cambio
+# deja obsoleto el resumen anterior sin tener que borrarlo del cache
+TIMEOUT_RESUMEN = 60 * 60
+
+
+"""
+-----------------------------------------------------------------------
+RESUMENES DE UNA INSPECCION
+
+Los resúmenes por categoría e ingrediente (todas las botellas, las
+contadas y las no contadas) salen de un solo GROUP BY sobre los
+ItemInspeccion de la inspección:
+
+    categoria | ingrediente | inspeccionado | cantidad
+
+Las filas se guardan en el cache y cada resumen se arma con una pasada
+sobre ellas.
+-----------------------------------------------------------------------
+"""
+
+def clave_resumen(inspeccion_id, version, botellas_total):
+    return 'resumen_inspeccion_{}_{}_{}'.format(inspeccion_id, version, botellas_total)
+
+
+"""
+-----------------------------------------------------------------------
+Cuenta los ItemInspeccion de la inspección por categoría, ingrediente
+y estado de conteo. Las filas vienen ordenadas por categoría e
+ingrediente.
+-----------------------------------------------------------------------
+"""
+def contar_items(inspeccion_id):
+
+    filas = (
+        models.ItemInspeccion.objects
+        .filter(inspeccion_id=inspeccion_id)
+        .values(
+            'botella__producto__ingrediente__categoria_id',
+            'botella__producto__ingrediente__categoria__nombre',
+            'botella__producto__ingrediente_id',
+            'botella__producto__ingrediente__nombre',
+            'inspeccionado'
+        )
+        .annotate(cantidad=Count('id'))
+        .order_by('botella__producto__ingrediente__categoria_id', 'botella__producto__ingrediente_id', 'inspeccionado')
+    )
+
+    return [
+        {
+            'categoria_id': fila['botella__producto__ingrediente__categoria_id'],
+            'categoria': fila['botella__producto__ingrediente__categoria__nombre'],
+            'ingrediente_id': fila['botella__producto__ingrediente_id'],
+            'ingrediente': fila['botella__producto__ingrediente__nombre'],
+            'inspeccionado': fila['inspeccionado'],
+            'cantidad': fila['cantidad']
+        }
+        for fila in filas
+    ]
+
+
+"""
+-----------------------------------------------------------------------
+Retorna las filas del conteo de la inspección desde el cache. Si no
+están en el cache, las contamos y las guardamos.
+-----------------------------------------------------------------------
+"""
+def get_conteo(inspeccion):
+
+    clave = clave_resumen(inspeccion.id, inspeccion.version, inspeccion.botellas_total)
+    filas = cache.get(clave)
+
+    if filas is None:
+        filas = contar_items(inspeccion.id)
+        cache.set(clave, filas, TIMEOUT_RESUMEN)
+
+    return filas
+
+
+"""
+-----------------------------------------------------------------------
+Arma el resumen por categoría:
+
+[{'categoria', 'total_botellas', 'botellas': [{'ingrediente', 'cantidad'}]}]
+
+- inspeccionado: True/False para solo contar los items contados/no
+  contados; None para contarlos todos
+- con_id: incluir 'ingrediente_id' en cada ingrediente
+-----------------------------------------------------------------------
+"""
+def resumen_categorias(filas, inspeccionado=None, con_id=False):
+
+    resumen = []
+    categoria_actual = None
+    ingrediente_actual = None
+
+    for fila in filas:
+        # Las botellas sin producto no tienen ingrediente que mostrar
+        if fila['ingrediente_id'] is None:
+            continue
+        if inspeccionado is not None and fila['inspeccionado'] != inspeccionado:
+            continue
+
+        # Las filas vienen ordenadas, así que cada categoría e ingrediente nuevo se agrega al final
+        if categoria_actual is None or categoria_actual['id'] != fila['categoria_id']:
+            categoria_actual = {'id': fila['categoria_id'], 'categoria': fila['categoria'], 'total_botellas': 0, 'botellas': []}
+            resumen.append(categoria_actual)
+            ingrediente_actual = None
+
+        if ingrediente_actual is None or ingrediente_actual['ingrediente_id'] != fila['ingrediente_id']:
+            ingrediente_actual = {'ingrediente_id': fila['ingrediente_id'], 'ingrediente': fila['ingrediente'], 'cantidad': 0}
+            categoria_actual['botellas'].append(ingrediente_actual)
+
+        ingrediente_actual['cantidad'] += fila['cantidad']
+        categoria_actual['total_botellas'] += fila['cantidad']
+
+    for categoria in resumen:
+        del categoria['id']
+        if not con_id:
+            for ingrediente in categoria['botellas']:
+                del ingrediente['ingrediente_id']
+
+    return resumen
+
@@ -1,9 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
 from core import models
 import datetime
 import re
 from django.utils.timezone import make_aware
+from inventarios import conteos
+from inventarios import pesaje
 
 
 class ItemInspeccionPostSerializer(serializers.ModelSerializer):
@@ -89,14 +92,11 @@ class InspeccionPostSerializer(serializers.ModelSerializer):
                     #print('::: LISTA DE BOTELLAS :::')
                     #print(botellas)
 
-                    # Creamos los ItemInspeccion
-                    for botella in botellas:
-                        # Tomamos el id de la botella
-                        botella_id = botella.id
-                        # Creamos el ItemInspeccion
-                        ii = models.ItemInspeccion.objects.create(inspeccion=inspeccion, botella=botella)
-                        #print('::: ITEM INSPECCION :::')
-                        #print(ii)
+                    # Creamos los ItemInspeccion en un solo INSERT
+                    models.ItemInspeccion.objects.bulk_create(
+                        [models.ItemInspeccion(inspeccion=inspeccion, botella_id=botella.id) for botella in botellas]
+                    )
+                    conteos.registrar_inspeccion(inspeccion, botellas)
 
                     #print(inspeccion.items_inspeccionados.all())
                     #print(inspeccion.items_inspeccionados.count())
@@ -127,10 +127,11 @@ class InspeccionPostSerializer(serializers.ModelSerializer):
             #print(botellas)
 
 
-            # Creamos los ItemInspeccion
-            for botella in botellas:
-                botella_id = botella.id
-                models.ItemInspeccion.objects.create(inspeccion=inspeccion, botella=botella)
+            # Creamos los ItemInspeccion en un solo INSERT
+            models.ItemInspeccion.objects.bulk_create(
+                [models.ItemInspeccion(inspeccion=inspeccion, botella_id=botella.id) for botella in botellas]
+            )
+            conteos.registrar_inspeccion(inspeccion, botellas)
 
             return inspeccion
 
@@ -373,8 +374,12 @@ class ItemInspeccionBotellaUpdateSerializer(serializers.ModelSerializer):
         #instance.botella.estado = data_botella['estado']
 
         # Guardamos los cambios en nuestras instancias de Botella e ItemInspeccion
-        botella.save()
-        instance.save()
+        with transaction.atomic():
+            # El cambio toma la siguiente versión de la inspección (ver 'pesaje.py')
+            instance.version = pesaje.siguiente_version(instance.inspeccion_id)
+            conteos.marcar_contados([instance.id])
+            botella.save()
+            instance.save()
         return instance
 
 
@@ -405,11 +410,52 @@ class ItemInspeccionUpdateSerializer2(serializers.ModelSerializer):
         #instance.botella.estado = data_botella['estado']
 
         # Guardamos los cambios en nuestras instancias de Botella e ItemInspeccion
-        botella.save()
-        instance.save()
+        with transaction.atomic():
+            # El cambio toma la siguiente versión de la inspección (ver 'pesaje.py')
+            instance.version = pesaje.siguiente_version(instance.inspeccion_id)
+            conteos.marcar_contados([instance.id])
+            botella.save()
+            instance.save()
         return instance
 
 
+class PesoBotellaLoteSerializer(serializers.Serializer):
+    """ Valida cada peso capturado en el pesaje por lotes de una inspección """
+
+    item_inspeccion = serializers.IntegerField()
+    peso_botella = serializers.IntegerField(min_value=0)
+    estado = serializers.ChoiceField(choices=models.Botella.ESTADOS_BOTELLA)
+
+
+class CambioItemInspeccionSerializer(PesoBotellaLoteSerializer):
+    """ Valida un pesaje capturado fuera de línea que el cliente manda al sincronizar """
+
+    version = serializers.IntegerField(min_value=0)
+    timestamp = serializers.DateTimeField()
+
+
+class ItemInspeccionSyncSerializer(serializers.ModelSerializer):
+    """ Estado de un ItemInspeccion que se envía al cliente al sincronizar """
+
+    folio = serializers.CharField(source='botella.folio', read_only=True)
+    ingrediente = serializers.CharField(source='botella.ingrediente', read_only=True)
+    estado = serializers.CharField(source='botella.estado', read_only=True)
+
+    class Meta:
+        model = models.ItemInspeccion
+        fields = (
+            'id',
+            'botella',
+            'folio',
+            'ingrediente',
+            'estado',
+            'peso_botella',
+            'inspeccionado',
+            'timestamp_inspeccion',
+            'version'
+        )
+
+
 #------------------------------------------------------------------
 class IngredienteSerializer(serializers.ModelSerializer):
 
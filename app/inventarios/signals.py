@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from core import models
+from inventarios import conteos
+
+
+def ingrediente_item(item):
+    return models.Botella.objects.filter(id=item.botella_id).values_list('producto__ingrediente_id', flat=True).first()
+
+
+"""
+-----------------------------------------------------------------------
+Los ItemInspeccion que se crean uno por uno (fuera de la creación de la
+inspección, que usa bulk_create) suman a los contadores de su
+inspección. No hay señal al eliminar un ItemInspeccion para que Django
+pueda borrar los items de una inspección con un solo DELETE; al
+eliminar una Botella se restan sus items antes de borrarlos.
+-----------------------------------------------------------------------
+"""
+@receiver(post_save, sender=models.ItemInspeccion)
+def sumar_item_inspeccion(sender, instance, created, **kwargs):
+    if created:
+        conteos.sumar(instance.inspeccion_id, {ingrediente_item(instance): (1, int(instance.inspeccionado))})
+
+
+@receiver(pre_delete, sender=models.Botella)
+def restar_items_botella(sender, instance, **kwargs):
+    conteos.restar_botella(instance)
@@ -0,0 +1,149 @@
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import models
+from inventarios import pesaje
+
+
+"""
+-----------------------------------------------------------------------
+SINCRONIZACION DE UNA INSPECCION CON UN CLIENTE FUERA DE LINEA
+
+El cliente guarda los pesos que captura sin conexión y, cuando puede,
+manda en un solo request sus cambios junto con su cursor (la versión de
+la inspección en su última sincronización). El servidor aplica los
+cambios y le regresa los ItemInspeccion que cambiaron desde el cursor y
+el cursor nuevo.
+
+Cada cambio trae la versión del item que el cliente tenía al pesarlo y
+el momento en que lo pesó. Si el item no ha cambiado en el servidor
+desde esa versión, el cambio se aplica. Si cambió (otro contador lo pesó
+en el inter), gana el pesaje más reciente: el del cliente si su
+timestamp es posterior al del servidor; si no, el cambio se rechaza
+como conflicto y el cliente recibe la versión del servidor.
+
+La versión de la inspección también sirve como secuencia de cambios
+para los contadores en línea: 'esperar_cambios' detiene el request
+(long-poll) hasta que otro contador pesa una botella, y el cliente
+recibe solo los items que cambiaron. La espera es corta (MAXIMO_ESPERA)
+porque cada request ocupa un worker síncrono del servidor todo ese
+tiempo: si no hubo cambios, el cliente vuelve a preguntar con la misma
+versión.
+-----------------------------------------------------------------------
+"""
+
+APLICADO = 'APLICADO'
+CONFLICTO = 'CONFLICTO'
+ERROR = 'ERROR'
+
+# Segundos entre cada lectura de la versión mientras se espera un cambio
+INTERVALO_ESPERA = 1
+# Máximo de segundos que un cliente puede esperar cambios en un request
+MAXIMO_ESPERA = 5
+
+
+"""
+-----------------------------------------------------------------------
+Retorna el cursor actual de la inspección y sus ItemInspeccion que
+cambiaron después de 'cursor' (todos si 'cursor' es None)
+-----------------------------------------------------------------------
+"""
+def cambios_desde(inspeccion_id, cursor=None):
+
+    # Primero el cursor: un cambio que se confirme entre los dos queries se reenvía en la siguiente sincronización
+    cursor_nuevo = models.Inspeccion.objects.filter(id=inspeccion_id).values_list('version', flat=True).get()
+
+    items = models.ItemInspeccion.objects.filter(inspeccion_id=inspeccion_id).select_related('botella')
+    if cursor is not None:
+        items = items.filter(version__gt=cursor)
+
+    return cursor_nuevo, items.order_by('id')
+
+
+"""
+-----------------------------------------------------------------------
+Espera hasta 'espera' segundos a que la versión de la inspección pase
+de 'desde' y la retorna. Cada lectura es de un solo renglón, así que
+varios contadores esperando cuestan mucho menos que volver a pedir los
+resúmenes. Si no hubo cambios retorna la versión actual (igual a
+'desde').
+-----------------------------------------------------------------------
+"""
+def esperar_cambios(inspeccion_id, desde, espera):
+
+    limite = time.monotonic() + espera
+
+    while True:
+        version = models.Inspeccion.objects.filter(id=inspeccion_id).values_list('version', flat=True).get()
+
+        if version > desde or time.monotonic() >= limite:
+            return version
+
+        time.sleep(min(INTERVALO_ESPERA, max(limite - time.monotonic(), 0)))
+
+
+"""
+-----------------------------------------------------------------------
+Aplica los cambios validados de un cliente a una inspección abierta.
+'cambios' es una lista de diccionarios {'item_inspeccion',
+'peso_botella', 'estado', 'version', 'timestamp'}.
+
+Retorna una lista con el resultado de cada cambio, en el mismo orden:
+{'item_inspeccion', 'resultado', 'error'}
+-----------------------------------------------------------------------
+"""
+def aplicar_cambios(inspeccion, cambios, usuario):
+
+    if inspeccion.estado != models.Inspeccion.ABIERTA:
+        return [
+            {'item_inspeccion': cambio['item_inspeccion'], 'resultado': ERROR, 'error': 'La inspección está cerrada.'}
+            for cambio in cambios
+        ]
+
+    ahora = timezone.now()
+
+    with transaction.atomic():
+
+        # Bloqueamos la inspección para comparar versiones sin que otro cliente la modifique
+        models.Inspeccion.objects.select_for_update().filter(id=inspeccion.id).get()
+
+        ids_items = set(cambio['item_inspeccion'] for cambio in cambios)
+        items = {
+            item['id']: item
+            for item in models.ItemInspeccion.objects.filter(inspeccion_id=inspeccion.id, id__in=ids_items).values('id', 'version', 'timestamp_inspeccion')
+        }
+
+        resultados = []
+        pesos = []
+        for cambio in cambios:
+            item = items.get(cambio['item_inspeccion'])
+
+            if item is None:
+                resultados.append({'item_inspeccion': cambio['item_inspeccion'], 'resultado': ERROR, 'error': 'El ItemInspeccion no es de la inspección.'})
+                continue
+
+            # Un reloj adelantado no puede ganarle a pesajes posteriores
+            timestamp = min(cambio['timestamp'], ahora)
+
+            if cambio['version'] < item['version'] and timestamp <= item['timestamp_inspeccion']:
+                resultados.append({'item_inspeccion': cambio['item_inspeccion'], 'resultado': CONFLICTO, 'error': None})
+                continue
+
+            pesos.append({
+                'item_inspeccion': cambio['item_inspeccion'],
+                'peso_botella': cambio['peso_botella'],
+                'estado': cambio['estado'],
+                'timestamp': timestamp
+            })
+            resultados.append({'item_inspeccion': cambio['item_inspeccion'], 'resultado': APLICADO, 'error': None})
+
+        errores = pesaje.actualizar_pesos(pesos, usuario) if pesos else {}
+
+    for resultado in resultados:
+        if resultado['resultado'] == APLICADO and resultado['item_inspeccion'] in errores:
+            resultado['resultado'] = ERROR
+            resultado['error'] = errores[resultado['item_inspeccion']]
+
+    return resultados
@@ -1,7 +1,14 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db.models import F, Q, QuerySet, Avg, Count, Sum, Subquery, OuterRef, Exists
+from django.db.models.deletion import Collector
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils.six import StringIO
 from unittest.mock import patch
 
 from rest_framework import status
@@ -9,6 +16,7 @@ from rest_framework.test import APIClient
 from rest_framework import serializers
 
 from core import models
+from ventas import consumo_diario
 from inventarios.serializers import (
                                         ItemInspeccionPostSerializer,
                                         InspeccionPostSerializer,
@@ -43,6 +51,9 @@ class InspeccionesTests(TestCase):
 
     def setUp(self):
 
+        # Los resúmenes de inspección se guardan en el cache
+        cache.clear()
+
         # API Client
         self.client = APIClient()
 
@@ -162,6 +173,9 @@ class InspeccionesTests(TestCase):
             volumen=60
         )
 
+        # Consumo diario de los consumos
+        consumo_diario.recalcular()
+
         # Productos
         self.producto_licor43 = models.Producto.objects.create(
             folio='Ii0000000001',
@@ -261,6 +275,42 @@ class InspeccionesTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertEqual(inspeccion.items_inspeccionados.count(), 2)
 
+    #--------------------------------------------------------------------------
+    def test_crear_inspeccion_queries(self):
+        """
+        Testear que el número de queries para crear una inspección no depende
+        del número de botellas a inspeccionar
+        """
+
+        # Agregamos 100 botellas de Licor 43 al almacén
+        models.Botella.objects.bulk_create([
+            models.Botella(
+                folio='Ii{:010d}'.format(i),
+                producto=self.producto_licor43,
+                capacidad=750,
+                usuario_alta=self.usuario,
+                sucursal=self.magno_brasserie,
+                almacen=self.barra_1,
+                proveedor=self.vinos_america
+            )
+            for i in range(2, 102)
+        ])
+
+        payload = {
+            'almacen': self.barra_1.id,
+            'sucursal': self.magno_brasserie.id,
+            'usuario_alta': self.usuario.id
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(INSPECCIONES_URL, payload)
+
+        inspeccion = models.Inspeccion.objects.get(id=res.data['id'])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(inspeccion.items_inspeccionados.count(), 102)
+        self.assertLessEqual(len(queries), 10)
+
     # #------------------------------------------------------------------------
     # def  test_crear_inspeccion_fecha_error(self):
     #     """
@@ -1589,6 +1639,131 @@ class InspeccionesTests(TestCase):
         self.assertEqual(len(response.data), 1)
 
 
+    #--------------------------------------------------------------------------------
+    def test_resumen_inspeccion_cache(self):
+        """
+        Testear que los resúmenes de una inspección salen de un solo conteo en cache
+        y que un pesaje los actualiza
+        """
+
+        inspeccion_1 = models.Inspeccion.objects.create(
+            almacen=self.barra_1,
+            sucursal=self.magno_brasserie,
+            usuario_alta=self.usuario
+        )
+        item_licor43 = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_licor43)
+        models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_herradura_blanco)
+
+        url_resumen = reverse('inventarios:resumen-inspeccion', args=[inspeccion_1.id])
+        url_no_contado = reverse('inventarios:resumen-inspeccion-no-contado', args=[inspeccion_1.id])
+        url_contado = reverse('inventarios:resumen-inspeccion-contado', args=[inspeccion_1.id])
+        url_conteo = reverse('inventarios:resumen-botellas-conteo', args=[inspeccion_1.id])
+
+        response = self.client.get(url_resumen)
+        self.assertEqual(
+            response.data,
+            [
+                {'categoria': 'LICOR', 'total_botellas': 1, 'botellas': [{'ingrediente': 'LICOR 43', 'cantidad': 1}]},
+                {'categoria': 'TEQUILA', 'total_botellas': 1, 'botellas': [{'ingrediente': 'HERRADURA BLANCO', 'cantidad': 1}]}
+            ]
+        )
+        self.assertEqual(self.client.get(url_contado).data, {'mensaje': 'Aún no hay botellas contadas.'})
+
+        # Los demás resúmenes usan el conteo en cache: solo se consulta la inspección
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url_no_contado)
+            self.client.get(url_conteo)
+        self.assertEqual(len(queries), 2)
+
+        # Pesamos la botella de Licor 43
+        self.client.patch(
+            reverse('inventarios:update-peso-botellas'),
+            [{'item_inspeccion': item_licor43.id, 'peso_botella': 800, 'estado': '1'}],
+            format='json'
+        )
+
+        self.assertEqual(
+            self.client.get(url_no_contado).data,
+            [{'categoria': 'TEQUILA', 'total_botellas': 1, 'botellas': [{'ingrediente_id': self.herradura_blanco.id, 'ingrediente': 'HERRADURA BLANCO', 'cantidad': 1}]}]
+        )
+        self.assertEqual(
+            self.client.get(url_contado).data,
+            [{'categoria': 'LICOR', 'total_botellas': 1, 'botellas': [{'ingrediente': 'LICOR 43', 'cantidad': 1}]}]
+        )
+        self.assertEqual(self.client.get(url_conteo).data, {'botellas_contadas': 1, 'botellas_no_contadas': 1})
+
+        # Un item que se agrega por fuera deja obsoleto el resumen en cache
+        models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_herradura_blanco_2)
+        self.assertEqual(
+            self.client.get(url_no_contado).data,
+            [{'categoria': 'TEQUILA', 'total_botellas': 2, 'botellas': [{'ingrediente_id': self.herradura_blanco.id, 'ingrediente': 'HERRADURA BLANCO', 'cantidad': 2}]}]
+        )
+
+
+    #--------------------------------------------------------------------------------
+    def test_conteos_inspeccion(self):
+        """
+        Testear que los contadores de botellas contadas se mantienen al crear la
+        inspección y al pesar, y que el comando de reparación los recalcula
+        """
+
+        payload = {
+            'almacen': self.barra_1.id,
+            'sucursal': self.magno_brasserie.id,
+            'usuario_alta': self.usuario.id
+        }
+        res = self.client.post(INSPECCIONES_URL, payload)
+        inspeccion = models.Inspeccion.objects.get(id=res.data['id'])
+        item_licor43 = inspeccion.items_inspeccionados.get(botella=self.botella_licor43)
+        item_herradura = inspeccion.items_inspeccionados.get(botella=self.botella_herradura_blanco)
+
+        self.assertEqual((inspeccion.botellas_total, inspeccion.botellas_contadas), (2, 0))
+
+        # Pesamos la botella de Licor 43 dos veces y la de Herradura una vez
+        url_pesos = reverse('inventarios:update-peso-botellas')
+        self.client.patch(url_pesos, [{'item_inspeccion': item_licor43.id, 'peso_botella': 800, 'estado': '1'}], format='json')
+        self.client.patch(url_pesos, [{'item_inspeccion': item_licor43.id, 'peso_botella': 790, 'estado': '1'}], format='json')
+        self.client.patch(reverse('inventarios:update-peso-botella'), {'item_inspeccion': item_herradura.id, 'peso_botella': 600, 'estado': '1'})
+
+        url_conteo = reverse('inventarios:resumen-botellas-conteo', args=[inspeccion.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url_conteo)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data, {'botellas_contadas': 2, 'botellas_no_contadas': 0})
+        self.assertEqual(
+            set(inspeccion.conteos_ingredientes.values_list('ingrediente_id', 'botellas_total', 'botellas_contadas')),
+            {(self.licor_43.id, 1, 1), (self.herradura_blanco.id, 1, 1)}
+        )
+
+        # Un item que se crea por fuera suma a los contadores
+        models.ItemInspeccion.objects.create(inspeccion=inspeccion, botella=self.botella_herradura_blanco_2)
+        self.assertEqual(self.client.get(url_conteo).data, {'botellas_contadas': 2, 'botellas_no_contadas': 1})
+
+        # Descomponemos los contadores y los reparamos
+        models.Inspeccion.objects.filter(id=inspeccion.id).update(botellas_total=0, botellas_contadas=7)
+        models.ConteoIngredienteInspeccion.objects.filter(inspeccion=inspeccion).delete()
+        out = StringIO()
+        call_command('recalcular_conteos_inspecciones', '--inspeccion', str(inspeccion.id), stdout=out)
+
+        self.assertIn('INSPECCION: {} - BOTELLAS: 0 -> 3 - CONTADAS: 7 -> 2'.format(inspeccion.id), out.getvalue())
+        self.assertEqual(self.client.get(url_conteo).data, {'botellas_contadas': 2, 'botellas_no_contadas': 1})
+        self.assertEqual(
+            set(inspeccion.conteos_ingredientes.values_list('ingrediente_id', 'botellas_total', 'botellas_contadas')),
+            {(self.licor_43.id, 1, 1), (self.herradura_blanco.id, 2, 1)}
+        )
+
+        # Al eliminar una botella se restan sus items
+        self.botella_herradura_blanco_2.delete()
+        self.assertEqual(self.client.get(url_conteo).data, {'botellas_contadas': 2, 'botellas_no_contadas': 0})
+        self.assertEqual(
+            set(inspeccion.conteos_ingredientes.values_list('ingrediente_id', 'botellas_total', 'botellas_contadas')),
+            {(self.licor_43.id, 1, 1), (self.herradura_blanco.id, 1, 1)}
+        )
+
+        # Los items de una inspección que se elimina se borran sin señales, con un solo DELETE
+        self.assertTrue(Collector(using='default').can_fast_delete(inspeccion.items_inspeccionados.all()))
+
+
     #--------------------------------------------------------------------------------
     def test_lista_botellas_no_contadas(self):
         """
@@ -2139,6 +2314,183 @@ class InspeccionesTests(TestCase):
         # Checamos que el nuevo peso de la botella sea correcto
         self.assertEqual(self.botella_licor43.peso_actual, payload['peso_botella'])
 
+
+    #-----------------------------------------------------------------------------
+    def test_update_peso_botellas(self):
+        """
+        Test para el view 'update_peso_botellas'.
+        Testear que los pesos válidos de un lote se actualizan juntos y que cada item reporta su resultado
+        """
+
+        inspeccion_1 = models.Inspeccion.objects.create(
+            almacen=self.barra_1,
+            sucursal=self.magno_brasserie,
+            usuario_alta=self.usuario
+        )
+        item_licor43 = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_licor43)
+        item_herradura = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_herradura_blanco)
+
+        # Una inspección de una sucursal que el usuario no tiene asignada
+        otra_sucursal = models.Sucursal.objects.create(nombre='OTRA SUCURSAL', cliente=self.operadora_magno)
+        otra_barra = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=otra_sucursal)
+        otra_inspeccion = models.Inspeccion.objects.create(almacen=otra_barra, sucursal=otra_sucursal, usuario_alta=self.usuario_2)
+        item_otra_sucursal = models.ItemInspeccion.objects.create(inspeccion=otra_inspeccion, botella=self.botella_herradura_blanco_2)
+
+        payload = [
+            {'item_inspeccion': item_licor43.id, 'peso_botella': 800, 'estado': '1'},
+            {'item_inspeccion': item_herradura.id, 'peso_botella': 500, 'estado': '0'},
+            {'item_inspeccion': item_herradura.id + 1000, 'peso_botella': 700, 'estado': '1'},
+            {'item_inspeccion': item_otra_sucursal.id, 'peso_botella': 700, 'estado': '1'},
+            {'item_inspeccion': item_licor43.id, 'peso_botella': 900, 'estado': '9'},
+        ]
+        url = reverse('inventarios:update-peso-botellas')
+        response = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(resultado['item_inspeccion'], resultado['actualizado']) for resultado in response.data],
+            [
+                (item_licor43.id, True),
+                (item_herradura.id, True),
+                (item_herradura.id + 1000, False),
+                (item_otra_sucursal.id, False),
+                (item_licor43.id, False)
+            ]
+        )
+        self.assertIn('estado', response.data[4]['errores'])
+
+        # Refrescamos nuestros ItemInspeccion y Botellas
+        item_licor43.refresh_from_db()
+        item_herradura.refresh_from_db()
+        item_otra_sucursal.refresh_from_db()
+        self.botella_licor43.refresh_from_db()
+        self.botella_herradura_blanco.refresh_from_db()
+
+        self.assertEqual((item_licor43.peso_botella, item_licor43.inspeccionado), (800, True))
+        self.assertEqual((item_herradura.peso_botella, item_herradura.inspeccionado), (500, True))
+        self.assertFalse(item_otra_sucursal.inspeccionado)
+        self.assertEqual((self.botella_licor43.peso_actual, self.botella_licor43.estado), (800, '1'))
+        self.assertEqual((self.botella_herradura_blanco.peso_actual, self.botella_herradura_blanco.estado), (500, '0'))
+
+        # Un request que no es una lista es un error
+        response = self.client.patch(url, payload[0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    #-----------------------------------------------------------------------------
+    def test_sincronizar_inspeccion(self):
+        """
+        Test para el view 'sincronizar_inspeccion'.
+        Testear que el cliente recibe los items que cambiaron desde su cursor y que
+        los conflictos se resuelven a favor del pesaje más reciente
+        """
+
+        inspeccion_1 = models.Inspeccion.objects.create(
+            almacen=self.barra_1,
+            sucursal=self.magno_brasserie,
+            usuario_alta=self.usuario
+        )
+        item_licor43 = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_licor43)
+        item_herradura = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_herradura_blanco)
+
+        url = reverse('inventarios:sincronizar-inspeccion', kwargs={'inspeccion_id': inspeccion_1.id})
+        hace_una_hora = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+        # La primera sincronización descarga todos los items
+        response = self.client.post(url, {'cursor': None, 'cambios': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cursor'], 0)
+        self.assertEqual([item['id'] for item in response.data['items']], [item_licor43.id, item_herradura.id])
+
+        # El cliente sube un pesaje capturado fuera de línea
+        cambios = [{'item_inspeccion': item_licor43.id, 'peso_botella': 800, 'estado': '1', 'version': 0, 'timestamp': hace_una_hora}]
+        response = self.client.post(url, {'cursor': 0, 'cambios': cambios}, format='json')
+        self.assertEqual(response.data['resultados'][0]['resultado'], 'APLICADO')
+        self.assertEqual(response.data['cursor'], 1)
+        self.assertEqual([(item['id'], item['peso_botella'], item['version']) for item in response.data['items']], [(item_licor43.id, 800, 1)])
+
+        # Otro contador pesa la botella de Herradura en línea
+        self.client.patch(
+            reverse('inventarios:update-peso-botellas'),
+            [{'item_inspeccion': item_herradura.id, 'peso_botella': 600, 'estado': '1'}],
+            format='json'
+        )
+
+        # Un pesaje anterior sobre una versión vieja es un conflicto y no se aplica
+        cambios = [
+            {'item_inspeccion': item_herradura.id, 'peso_botella': 500, 'estado': '1', 'version': 0, 'timestamp': hace_una_hora},
+            {'item_inspeccion': item_herradura.id, 'peso_botella': 500},
+        ]
+        response = self.client.post(url, {'cursor': 1, 'cambios': cambios}, format='json')
+        self.assertEqual([resultado['resultado'] for resultado in response.data['resultados']], ['CONFLICTO', 'ERROR'])
+        self.assertEqual([(item['id'], item['peso_botella']) for item in response.data['items']], [(item_herradura.id, 600)])
+
+        # Un pesaje posterior sí gana el conflicto
+        cambios[0]['timestamp'] = (timezone.now() + datetime.timedelta(minutes=1)).isoformat()
+        response = self.client.post(url, {'cursor': 2, 'cambios': cambios[:1]}, format='json')
+        self.assertEqual(response.data['resultados'][0]['resultado'], 'APLICADO')
+        self.assertEqual([(item['id'], item['peso_botella'], item['version']) for item in response.data['items']], [(item_herradura.id, 500, 3)])
+
+        # Una inspección cerrada ya no acepta cambios
+        models.Inspeccion.objects.filter(id=inspeccion_1.id).update(estado='1')
+        response = self.client.post(url, {'cursor': 3, 'cambios': cambios[:1]}, format='json')
+        self.assertEqual(response.data['resultados'][0]['resultado'], 'ERROR')
+        self.assertEqual(response.data['items'], [])
+
+
+    #-----------------------------------------------------------------------------
+    def test_get_cambios_inspeccion(self):
+        """
+        Test para el view 'get_cambios_inspeccion'.
+        Testear que el cliente espera hasta que otro contador pesa una botella y
+        recibe solo el item que cambió
+        """
+
+        inspeccion_1 = models.Inspeccion.objects.create(
+            almacen=self.barra_1,
+            sucursal=self.magno_brasserie,
+            usuario_alta=self.usuario
+        )
+        item_licor43 = models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_licor43)
+        models.ItemInspeccion.objects.create(inspeccion=inspeccion_1, botella=self.botella_herradura_blanco)
+
+        url = reverse('inventarios:get-cambios-inspeccion', kwargs={'inspeccion_id': inspeccion_1.id})
+
+        # La primera vez se reciben todos los items sin esperar
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['version'], len(response.data['items'])), (0, 2))
+        self.assertEqual((response.data['botellas_contadas'], response.data['botellas_no_contadas']), (0, 2))
+
+        # Sin cambios, el request termina al acabarse la espera
+        response = self.client.get(url, {'desde': 0, 'espera': 0})
+        self.assertEqual((response.data['version'], response.data['items']), (0, []))
+
+        # Otro contador pesa la botella de Licor 43 mientras el cliente espera
+        def pesar(segundos):
+            self.client.patch(
+                reverse('inventarios:update-peso-botellas'),
+                [{'item_inspeccion': item_licor43.id, 'peso_botella': 800, 'estado': '1'}],
+                format='json'
+            )
+
+        with patch('inventarios.sincronizacion.time.sleep', side_effect=pesar) as mock_sleep:
+            response = self.client.get(url, {'desde': 0, 'espera': 10})
+
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual([(item['id'], item['peso_botella'], item['inspeccionado']) for item in response.data['items']], [(item_licor43.id, 800, True)])
+        self.assertEqual((response.data['botellas_contadas'], response.data['botellas_no_contadas']), (1, 1))
+
+        # La espera no pasa del máximo aunque el cliente pida más
+        with patch('inventarios.sincronizacion.esperar_cambios', return_value=1) as mock_esperar:
+            self.client.get(url, {'desde': 1, 'espera': 60})
+        mock_esperar.assert_called_once_with(inspeccion_1.id, 1, 5)
+
+        # Parámetros inválidos
+        response = self.client.get(url, {'desde': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     
     #-----------------------------------------------------------------------------
     def test_cerrar_inspeccion(self):
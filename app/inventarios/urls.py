@@ -35,6 +35,9 @@ urlpatterns = [
     path('get-lista-sucursales', views.lista_sucursales, name='get-lista-sucursales'),
     path('get-lista-sucursales-almacenes', views.lista_sucursales_almacenes, name='get-lista-sucursales-almacenes'),
     path('update-peso-botella/', views.update_peso_botella, name='update-peso-botella'),
+    path('update-peso-botellas/', views.update_peso_botellas, name='update-peso-botellas'),
+    path('sincronizar-inspeccion/inspeccion/<int:inspeccion_id>', views.sincronizar_inspeccion, name='sincronizar-inspeccion'),
+    path('get-cambios-inspeccion/inspeccion/<int:inspeccion_id>', views.get_cambios_inspeccion, name='get-cambios-inspeccion'),
     path('cerrar-inspeccion/', views.cerrar_inspeccion, name='cerrar-inspeccion'),
     path('update-botella-nueva-vacia/', views.update_botella_nueva_vacia, name='update-botella-nueva-vacia'),
     path('get-marbete-sat/folio/<str:folio_id>', views.get_marbete_sat, name='get-marbete-sat'),
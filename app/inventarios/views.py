@@ -7,7 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import F, Q, QuerySet, Avg, Count, Sum, Subquery, OuterRef, Exists
+from django.db.models import F, Q, QuerySet, Avg, Sum
 from django.shortcuts import get_object_or_404
 import math
 import json
@@ -15,6 +15,9 @@ import re
 
 from inventarios import serializers
 from inventarios import scrapper, scrapper_2
+from inventarios import pesaje
+from inventarios import sincronizacion
+from inventarios import resumenes
 from core import models
 
 
@@ -55,9 +58,10 @@ class InspeccionViewSet(viewsets.ModelViewSet):
         sucursal_id = self.request.data['sucursal']
         almacen_id = self.request.data['almacen']
 
+        ultima_inspeccion = models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).order_by('-fecha_alta').first()
+
         # Si existe al menos una inspección registrada en la base de datos, tomamos su fecha y estado
-        if models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).exists():
-            ultima_inspeccion = models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).latest('fecha_alta')
+        if ultima_inspeccion is not None:
             fecha_ultima_inspeccion = ultima_inspeccion.fecha_alta
             estado_ultima_inspeccion = ultima_inspeccion.estado
 
@@ -87,8 +91,8 @@ class InspeccionViewSet(viewsets.ModelViewSet):
 
             # Checamos si hay consumos registrados después de la última inspección
             try:
-                models.ConsumoRecetaVendida.objects.filter(
-                    venta__caja__almacen__id=almacen_id,
+                models.ConsumoDiario.objects.filter(
+                    almacen__id=almacen_id,
                     fecha__gte=fecha_ultima_inspeccion
                 )
 
@@ -96,10 +100,11 @@ class InspeccionViewSet(viewsets.ModelViewSet):
                 return None
 
             else:
-                ultimos_consumos = models.ConsumoRecetaVendida.objects.filter(
-                    venta__caja__almacen__id=almacen_id,
+                # El consumo diario tiene un renglón por ingrediente y día, no uno por cada venta
+                ultimos_consumos = models.ConsumoDiario.objects.filter(
+                    almacen__id=almacen_id,
                     fecha__gte=fecha_ultima_inspeccion
-                )
+                ).select_related('ingrediente')
 
                 return ultimos_consumos
 
@@ -109,14 +114,14 @@ class InspeccionViewSet(viewsets.ModelViewSet):
         """
         try:
             almacen_id = self.request.data['almacen']
-            models.ConsumoRecetaVendida.objects.filter(venta__caja__almacen__id=almacen_id)
+            models.ConsumoDiario.objects.filter(almacen__id=almacen_id)
 
         # Si no hay consumos registrados, entonces retornamos None
         except ObjectDoesNotExist:
             return None
 
         else:
-            ultimos_consumos = models.ConsumoRecetaVendida.objects.filter(venta__caja__almacen__id=almacen_id)
+            ultimos_consumos = models.ConsumoDiario.objects.filter(almacen__id=almacen_id).select_related('ingrediente')
 
             return ultimos_consumos 
 
@@ -153,26 +158,16 @@ class InspeccionViewSet(viewsets.ModelViewSet):
 
         # Si hay consumos registrados después de la última inspección:
         if ultimos_consumos is not None:
-            # Tomamos los ingredientes de dichos consumos y los guardamos en una lista
-            lista_ingredientes = [consumo.ingrediente for consumo in ultimos_consumos]
-            # Creamos un set con ingredientes únicos
-            ingredientes_unicos = set(lista_ingredientes)
-
-            # Tomamos las botellas del almacén que contengan los ingredientes consumidos
-            botellas = []
-            for ingrediente in ingredientes_unicos:
-                # Seleccionamos las botellas del ingrediente en cuestión
-                qs_botellas_ingrediente = models.Botella.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id, producto__ingrediente__id=ingrediente.id)
-                # Excluimos las botellas VACIAS
-                qs_botellas_ingrediente = qs_botellas_ingrediente.exclude(estado='0')
-                # Excluimos las botellas PERDIDAS
-                qs_botellas_ingrediente = qs_botellas_ingrediente.exclude(estado='3')
-                # Guardamos las botellas del ingrediente en una lista
-                botellas_ingrediente = [botella for botella in qs_botellas_ingrediente]
-                # Agregamos las botellas a la lista maestra de botellas
-                botellas += botellas_ingrediente
-
-            return botellas
+            # Tomamos en un solo query las botellas del almacén cuyo ingrediente aparece en dichos consumos
+            botellas = models.Botella.objects.filter(
+                sucursal__id=sucursal_id,
+                almacen__id=almacen_id,
+                producto__ingrediente__in=ultimos_consumos.values('ingrediente')
+            )
+            # Excluimos las botellas VACIAS y PERDIDAS
+            botellas = botellas.exclude(estado__in=['0', '3']).select_related('producto').order_by('id')
+
+            return list(botellas)
 
         # Si no hay consumos registrados, no retornamos ninguna botella (no hay nada que inspeccionar)
         return None
@@ -463,95 +458,14 @@ TEQUILA (2)
 @authentication_classes((TokenAuthentication,))
 def resumen_inspeccion(request, inspeccion_id):
 
-    inspeccion_id = int(inspeccion_id)
-
     if request.method == 'GET':
         # Tomamos la Inspeccion a visualizar
-        inspeccion_1 = models.Inspeccion.objects.get(id=inspeccion_id)
-
-        #---------------------------------------------------------------
-        # Definimos los querysets a utilizar
-        #---------------------------------------------------------------
-
-        # QUERYSET 1: Cantidad de items a inspeccionar por tipo de ingrediente
-        queryset_1 = models.Ingrediente.objects.annotate(
-            items_inspeccion=Subquery(models.ItemInspeccion.objects
-                .filter(inspeccion=inspeccion_1, botella__producto__ingrediente=OuterRef('pk'))
-                .values('botella__producto__ingrediente')
-                .annotate(count=Count('botella__producto__ingrediente'))
-                .values('count')
-            )
-        )
-
-        # QUERYSET 2: Categorías que contienen items a inspeccionar
-        queryset_2 = models.Categoria.objects.annotate(
-            items_inspeccion=Exists(models.ItemInspeccion.objects
-                .filter(inspeccion=inspeccion_1, botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        ).filter(items_inspeccion=True)
-
-        # QUERYSET 2A: Numero de items a inspeccionar por categoría
-        queryset_2a = queryset_2.annotate(
-            items_inspeccion=Subquery(models.ItemInspeccion.objects
-                .filter(inspeccion=inspeccion_1, botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        )
+        inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
 
-        #---------------------------------------------------------------
-        # Construimos el JSON del response
-        #---------------------------------------------------------------
-
-        # Tomamos las categorías que contienen items a inspeccionar
-        categorias = queryset_2a
-        # Tomamos los ingredientes que contienen items a inspeccionar
-        ingredientes = queryset_1 
-
-        # Una lista donde guardaremos el output a renderearse por el Response
-        resumen_inspeccion = []
-
-        # Iteramos por el queryset de las categorias
-        for categoria in categorias:
-            # Creamos un objecto en donde guardaremos la categoría y sus items a inspeccionar
-            obj = {}
-            lista_ingredientes = []
-            # Tomamos el nombre de la categoria
-            nombre_categoria = categoria.nombre
-            # Tomamos el total de items a inspeccionar de la categoria
-            total_items_inspeccion = categoria.items_inspeccion
-            # Guardamos las variables en un diccionario
-            obj['categoria'] = nombre_categoria
-            obj['total_botellas'] = total_items_inspeccion
-
-            # Iteramos por el queryset de los ingredientes
-            for ingrediente in ingredientes:
-                obj_ingrediente = {}
-                # Si la categoría del ingrediente es igual a la categoría del loop:
-                if ingrediente.categoria.id == categoria.id:
-                    # Tomamos el nombre del ingrediente y sus items inspeccion
-                    nombre_ingrediente = ingrediente.nombre
-                    cantidad = ingrediente.items_inspeccion
-                    # Los guardamos en un diccionario
-                    obj_ingrediente['ingrediente'] = nombre_ingrediente
-                    obj_ingrediente['cantidad'] = cantidad
-                    # Guardamos el diccionario en una lista de ingredientes
-                    lista_ingredientes.append(obj_ingrediente)
-            
-            # Guardamos la lista de ingredientes en la categoría actual
-            obj['botellas'] = lista_ingredientes
-            # Guardamos el objecto en la lista del output del Response
-            resumen_inspeccion.append(obj)
-        
-        #---------------------------------------------------------------
-        # Construimos el Response
-        #---------------------------------------------------------------
+        # Contamos sus items por categoría e ingrediente (ver 'resumenes.py')
+        filas = resumenes.get_conteo(inspeccion)
 
-        return Response(resumen_inspeccion)
+        return Response(resumenes.resumen_categorias(filas))
 
     else:
         Response(status=status.HTTP_400_BAD_REQUEST)
@@ -574,24 +488,15 @@ def resumen_botellas_conteo(request, inspeccion_id):
 
     if request.method == 'GET':
 
-        # Tomamos el id de la Inspección del URL
-        inspeccion_id = int(inspeccion_id) 
-
-        #items_inspeccionar = models.ItemInspeccion.objects.filter(inspeccion__id=inspeccion_id).count()
-
-        # QUERYSET 1: Botellas no contadas
-        no_contados = models.ItemInspeccion.objects.filter(inspeccion__id=inspeccion_id, inspeccionado=False).count()
-        # QUERYSET 2: Botellas contadas
-        contados = models.ItemInspeccion.objects.filter(inspeccion__id=inspeccion_id, inspeccionado=True).count()
+        # Tomamos la Inspeccion del URL; sus contadores ya tienen las botellas contadas (ver 'conteos.py')
+        inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
 
         # Creamos un objeto para guardar la cantidad de botellas contadas y no contadas
-        resumen_botellas = {}
-
-        # Guardamos la cantidad de botellas contadas y no contadas en el objecto
-        resumen_botellas['botellas_contadas'] = contados
-        resumen_botellas['botellas_no_contadas'] = no_contados
+        resumen_botellas = {
+            'botellas_contadas': inspeccion.botellas_contadas,
+            'botellas_no_contadas': inspeccion.botellas_total - inspeccion.botellas_contadas
+        }
 
-        # Creamos un response con la info
         return Response(resumen_botellas)
 
     else:
@@ -618,114 +523,18 @@ TEQUILA (2)
 @authentication_classes((TokenAuthentication,))
 def resumen_inspeccion_no_contado(request, inspeccion_id):
 
-    inspeccion_id = int(inspeccion_id)
-
     if request.method == 'GET':
         # Tomamos la Inspeccion a visualizar
-        inspeccion_1 = models.Inspeccion.objects.get(id=inspeccion_id)
-
-        #---------------------------------------------------------------
-        # Definimos los querysets a utilizar
-        #---------------------------------------------------------------
-
-        # QUERYSET: ItemsInspeccion que pertenecen a nuestra Inspeccion
-        items = models.ItemInspeccion.objects.filter(inspeccion=inspeccion_1)
-
-        # QUERYSET: ItemsInspeccion NO CONTADOS/NO INSPECCIONADOS (excluimos los CONTADOS)
-        items = items.exclude(inspeccionado=True)
-
-        # QUERYSET 1: Cantidad de items a inspeccionar por tipo de ingrediente
-        queryset_1 = models.Ingrediente.objects.annotate(
-            items_inspeccion=Subquery(items
-                .filter(botella__producto__ingrediente=OuterRef('pk'))
-                .values('botella__producto__ingrediente')
-                .annotate(count=Count('botella__producto__ingrediente'))
-                .values('count')
-            )
-        )
-        #print('::: QUERYSET 1 - ORIGINAL :::')
-        #print(queryset_1)
-
-        #QUERYSET 1 AJUSTADO: Excluimos ingredientes donde 'items_inspeccion' = 0
-        queryset_1 = queryset_1.exclude(items_inspeccion=0)
-        #print('::: QUERYSET 1 - FIX :::')
-        #print(queryset_1)
-
-        # QUERYSET 2: Categorías que contienen items a inspeccionar
-        queryset_2 = models.Categoria.objects.annotate(
-            has_items_inspeccion=Exists(items
-                .filter(botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        ).filter(has_items_inspeccion=True)
-
-        # QUERYSET 2A: Numero de items a inspeccionar por categoría
-        queryset_2a = queryset_2.annotate(
-            items_inspeccion=Subquery(items
-                .filter(botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        )
+        inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
 
-        #---------------------------------------------------------------
-        # Construimos el JSON del response
-        #---------------------------------------------------------------
+        # Armamos el resumen con los items NO CONTADOS/NO INSPECCIONADOS
+        filas = resumenes.get_conteo(inspeccion)
+        resumen_inspeccion = resumenes.resumen_categorias(filas, inspeccionado=False, con_id=True)
 
         # Checamos que haya categorías con botellas pendientes de inspeccion
-        if queryset_2.exists():
-
-            # Tomamos las categorías que contienen items a inspeccionar
-            categorias = queryset_2a
-            # Tomamos los ingredientes que contienen items a inspeccionar
-            ingredientes = queryset_1 
-
-            # Una lista donde guardaremos el output que enviaremos en el Response
-            resumen_inspeccion = []
-
-            # Iteramos por el queryset de las categorias
-            for categoria in categorias:
-                # Creamos un objecto en donde guardaremos la categoría y sus items a inspeccionar
-                obj = {}
-                lista_ingredientes = []
-                # Tomamos el nombre de la categoria
-                nombre_categoria = categoria.nombre
-                # Tomamos el total de items a inspeccionar de la categoria
-                total_items_inspeccion = categoria.items_inspeccion
-                # Guardamos las variables en un diccionario
-                obj['categoria'] = nombre_categoria
-                obj['total_botellas'] = total_items_inspeccion
-
-                # Iteramos por el queryset de los ingredientes
-                for ingrediente in ingredientes:
-                    obj_ingrediente = {}
-                    # Si la categoría del ingrediente es igual a la categoría del loop:
-                    if ingrediente.categoria.id == categoria.id:
-                        # Tomamos el nombre del ingrediente y sus items inspeccion
-                        ingrediente_id = ingrediente.id
-                        nombre_ingrediente = ingrediente.nombre
-                        cantidad = ingrediente.items_inspeccion
-                        # Los guardamos en un diccionario
-                        obj_ingrediente['ingrediente_id'] = ingrediente_id
-                        obj_ingrediente['ingrediente'] = nombre_ingrediente
-                        obj_ingrediente['cantidad'] = cantidad
-                        # Guardamos el diccionario en una lista de ingredientes
-                        lista_ingredientes.append(obj_ingrediente)
-                
-                # Guardamos la lista de ingredientes en la categoría actual
-                obj['botellas'] = lista_ingredientes
-                # Guardamos el objecto en la lista del output del Response
-                resumen_inspeccion.append(obj)
-            
-            #---------------------------------------------------------------
-            # Construimos el Response
-            #---------------------------------------------------------------
-
+        if resumen_inspeccion:
             return Response(resumen_inspeccion)
-        
+
         # Si no hay botellas pendientes de inspección, enviamos un reponse con el mensaje
         else:
             return Response({'mensaje: No hay botellas pendientes de inspección.'})
@@ -754,112 +563,16 @@ TEQUILA (2)
 @authentication_classes((TokenAuthentication,))
 def resumen_inspeccion_contado(request, inspeccion_id):
 
-    inspeccion_id = int(inspeccion_id)
-
     if request.method == 'GET':
         # Tomamos la Inspeccion a visualizar
-        inspeccion_1 = models.Inspeccion.objects.get(id=inspeccion_id)
-
-        #---------------------------------------------------------------
-        # Definimos los querysets a utilizar
-        #---------------------------------------------------------------
-
-        # QUERYSET: ItemsInspeccion que pertenecen a nuestra Inspeccion
-        items = models.ItemInspeccion.objects.filter(inspeccion=inspeccion_1)
-
-        # QUERYSET: ItemsInspeccion CONTADOS/INSPECCIONADOS (excluimos los NO CONTADOS)
-        items = items.exclude(inspeccionado=False)
-
-        # QUERYSET 1: Cantidad de items a inspeccionar por tipo de ingrediente
-        queryset_1 = models.Ingrediente.objects.annotate(
-            items_inspeccion=Subquery(items
-                .filter(botella__producto__ingrediente=OuterRef('pk'))
-                .values('botella__producto__ingrediente')
-                .annotate(count=Count('botella__producto__ingrediente'))
-                .values('count')
-            )
-        )
-        #print('::: QUERYSET 1 - ORIGINAL :::')
-        #print(queryset_1)
-
-        #QUERYSET 1 AJUSTADO: Excluimos ingredientes donde 'items_inspeccion' = 0
-        queryset_1 = queryset_1.exclude(items_inspeccion=0)
-        #print('::: QUERYSET 1 - FIX :::')
-        #print(queryset_1)
-
-        # QUERYSET 2: Categorías que contienen items a inspeccionar
-        queryset_2 = models.Categoria.objects.annotate(
-            has_items_inspeccion=Exists(items
-                .filter(botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        ).filter(has_items_inspeccion=True)
-
-        # QUERYSET 2A: Numero de items a inspeccionar por categoría
-        queryset_2a = queryset_2.annotate(
-            items_inspeccion=Subquery(items
-                .filter(botella__producto__ingrediente__categoria=OuterRef('pk'))
-                .values('botella__producto__ingrediente__categoria')
-                .annotate(count=Count('botella__producto__ingrediente__categoria'))
-                .values('count')
-            )
-        )
+        inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
 
-        #---------------------------------------------------------------
-        # Construimos el JSON del response
-        #---------------------------------------------------------------
+        # Armamos el resumen con los items CONTADOS/INSPECCIONADOS
+        filas = resumenes.get_conteo(inspeccion)
+        resumen_inspeccion = resumenes.resumen_categorias(filas, inspeccionado=True)
 
         # Checamos si existen categorías con ItemsInspeccion YA CONTADOS
-        if queryset_2.exists():
-
-            # Tomamos las categorías que contienen items a inspeccionar
-            categorias = queryset_2a
-            # Tomamos los ingredientes que contienen items a inspeccionar
-            ingredientes = queryset_1 
-
-            # Una lista donde guardaremos el output a renderearse por el Response
-            resumen_inspeccion = []
-
-            # Iteramos por el queryset de las categorias
-            for categoria in categorias:
-                # Creamos un objecto en donde guardaremos la categoría y sus items a inspeccionar
-                obj = {}
-                lista_ingredientes = []
-                # Tomamos el nombre de la categoria
-                nombre_categoria = categoria.nombre
-                # Tomamos el total de items a inspeccionar de la categoria
-                total_items_inspeccion = categoria.items_inspeccion
-                # Guardamos las variables en un diccionario
-                obj['categoria'] = nombre_categoria
-                obj['total_botellas'] = total_items_inspeccion
-
-                # Iteramos por el queryset de los ingredientes
-                for ingrediente in ingredientes:
-                    obj_ingrediente = {}
-                    # Si la categoría del ingrediente es igual a la categoría del loop:
-                    if ingrediente.categoria.id == categoria.id:
-                        # Tomamos el nombre del ingrediente y sus items inspeccion
-                        ingrediente_id = ingrediente.id
-                        nombre_ingrediente = ingrediente.nombre
-                        cantidad = ingrediente.items_inspeccion
-                        # Los guardamos en un diccionario
-                        obj_ingrediente['ingrediente'] = nombre_ingrediente
-                        obj_ingrediente['ingrediente'] = nombre_ingrediente
-                        obj_ingrediente['cantidad'] = cantidad
-                        # Guardamos el diccionario en una lista de ingredientes
-                        lista_ingredientes.append(obj_ingrediente)
-                
-                # Guardamos la lista de ingredientes en la categoría actual
-                obj['botellas'] = lista_ingredientes
-                # Guardamos el objecto en la lista del output del Response
-                resumen_inspeccion.append(obj)
-            
-            #---------------------------------------------------------------
-            # Construimos el Response
-            #---------------------------------------------------------------
-
+        if resumen_inspeccion:
             return Response(resumen_inspeccion)
 
         # Si no hay categorías con ItemsInspeccion YA CONTADOS
@@ -870,7 +583,6 @@ def resumen_inspeccion_contado(request, inspeccion_id):
         Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-
 """
 --------------------------------------------------------------------------
 Endpoint que muestra las botellas de un ingrediente que están pendientes de
@@ -1139,6 +851,171 @@ def update_peso_botella(request):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+"""
+-----------------------------------------------------------------------------
+Endpoint que actualiza en un solo request el peso de varias botellas
+inspeccionadas.
+
+Recibe una lista de {'item_inspeccion', 'peso_botella', 'estado'} y
+retorna el resultado de cada item en el mismo orden. Los items válidos se
+actualizan juntos aunque otros tengan errores.
+-----------------------------------------------------------------------------
+"""
+@api_view(['PATCH'],)
+@permission_classes((IsAuthenticated,))
+@authentication_classes((TokenAuthentication,))
+def update_peso_botellas(request):
+
+    pesos = request.data
+
+    if not isinstance(pesos, list):
+        return Response({'error': 'Se espera una lista de pesos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(pesos) > pesaje.MAXIMO_PESOS:
+        return Response({'error': 'Se aceptan máximo {} pesos por request.'.format(pesaje.MAXIMO_PESOS)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validamos cada peso por separado para reportar sus errores
+    serializers_pesos = [serializers.PesoBotellaLoteSerializer(data=peso) for peso in pesos]
+    pesos_validos = [serializer.validated_data for serializer in serializers_pesos if serializer.is_valid()]
+
+    # Actualizamos los pesos válidos
+    errores = pesaje.actualizar_pesos(pesos_validos, request.user)
+
+    resultados = []
+    for peso, serializer in zip(pesos, serializers_pesos):
+
+        if serializer.errors:
+            item_id = peso.get('item_inspeccion') if isinstance(peso, dict) else None
+            resultados.append({'item_inspeccion': item_id, 'actualizado': False, 'errores': serializer.errors})
+
+        else:
+            item_id = serializer.validated_data['item_inspeccion']
+            error = errores.get(item_id)
+            resultados.append({'item_inspeccion': item_id, 'actualizado': error is None, 'errores': error})
+
+    return Response(resultados, status=status.HTTP_200_OK)
+
+
+"""
+-----------------------------------------------------------------------------
+Endpoint que sincroniza una inspección con un cliente fuera de línea.
+
+Recibe {'cursor', 'cambios'}: el cursor de la última sincronización del
+cliente (vacío la primera vez) y la lista de pesajes que capturó desde
+entonces. Aplica los cambios (ver 'sincronizacion.py') y retorna el
+resultado de cada uno, los ItemInspeccion que cambiaron desde el cursor
+y el cursor nuevo.
+-----------------------------------------------------------------------------
+"""
+@api_view(['POST'],)
+@permission_classes((IsAuthenticated,))
+@authentication_classes((TokenAuthentication,))
+def sincronizar_inspeccion(request, inspeccion_id):
+
+    inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
+
+    # Checamos que el usuario tenga asignada la sucursal de la inspección
+    if not request.user.sucursales.filter(id=inspeccion.sucursal_id).exists():
+        return Response(status=status.HTTP_403_FORBIDDEN)
+
+    cursor = request.data.get('cursor')
+    cambios = request.data.get('cambios', [])
+
+    if cursor is not None and (not isinstance(cursor, int) or isinstance(cursor, bool)):
+        return Response({'error': 'El cursor debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(cambios, list):
+        return Response({'error': 'Se espera una lista de cambios.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(cambios) > pesaje.MAXIMO_PESOS:
+        return Response({'error': 'Se aceptan máximo {} cambios por request.'.format(pesaje.MAXIMO_PESOS)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validamos cada cambio por separado para reportar sus errores
+    serializers_cambios = [serializers.CambioItemInspeccionSerializer(data=cambio) for cambio in cambios]
+    cambios_validos = [serializer.validated_data for serializer in serializers_cambios if serializer.is_valid()]
+
+    # Aplicamos los cambios válidos
+    resultados_validos = iter(sincronizacion.aplicar_cambios(inspeccion, cambios_validos, request.user))
+
+    resultados = []
+    for cambio, serializer in zip(cambios, serializers_cambios):
+
+        if serializer.errors:
+            item_id = cambio.get('item_inspeccion') if isinstance(cambio, dict) else None
+            resultados.append({'item_inspeccion': item_id, 'resultado': sincronizacion.ERROR, 'error': serializer.errors})
+
+        else:
+            resultados.append(next(resultados_validos))
+
+    # Tomamos los items que cambiaron desde el cursor del cliente
+    cursor_nuevo, items = sincronizacion.cambios_desde(inspeccion.id, cursor)
+
+    return Response(
+        {
+            'inspeccion': inspeccion.id,
+            'cursor': cursor_nuevo,
+            'items': serializers.ItemInspeccionSyncSerializer(items, many=True).data,
+            'resultados': resultados
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+"""
+-----------------------------------------------------------------------------
+Endpoint que envía a los contadores los cambios de una inspección
+(long-poll).
+
+Query params:
+- desde: versión de la inspección que ya tiene el cliente (vacío la
+  primera vez, para recibir todos los items)
+- espera: segundos que se espera a que haya un cambio (máximo 5)
+
+Si la inspección no ha cambiado desde 'desde', el request espera hasta
+que otro contador pese una botella o se acabe el tiempo. Retorna la
+versión nueva, los items que cambiaron y los contadores de la inspección.
+Si no hubo cambios, el cliente vuelve a llamar con la versión recibida.
+-----------------------------------------------------------------------------
+"""
+@api_view(['GET'],)
+@permission_classes((IsAuthenticated,))
+@authentication_classes((TokenAuthentication,))
+def get_cambios_inspeccion(request, inspeccion_id):
+
+    inspeccion = get_object_or_404(models.Inspeccion, id=inspeccion_id)
+
+    # Checamos que el usuario tenga asignada la sucursal de la inspección
+    if not request.user.sucursales.filter(id=inspeccion.sucursal_id).exists():
+        return Response(status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        desde = request.query_params.get('desde')
+        desde = int(desde) if desde not in (None, '') else None
+        espera = float(request.query_params.get('espera', sincronizacion.MAXIMO_ESPERA))
+    except ValueError:
+        return Response({'error': 'Los parámetros desde y espera deben ser números.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Esperamos solo si el cliente ya tiene una versión
+    if desde is not None:
+        sincronizacion.esperar_cambios(inspeccion.id, desde, min(max(espera, 0), sincronizacion.MAXIMO_ESPERA))
+
+    version, items = sincronizacion.cambios_desde(inspeccion.id, desde)
+    items = serializers.ItemInspeccionSyncSerializer(items, many=True).data
+    # Los contadores se leen después de los items para que nunca vayan atrás de ellos
+    inspeccion.refresh_from_db(fields=['botellas_total', 'botellas_contadas'])
+
+    return Response(
+        {
+            'inspeccion': inspeccion.id,
+            'version': version,
+            'items': items,
+            'botellas_contadas': inspeccion.botellas_contadas,
+            'botellas_no_contadas': inspeccion.botellas_total - inspeccion.botellas_contadas
+        },
+        status=status.HTTP_200_OK
+    )
+
+
 """
 -----------------------------------------------------------------------------
 Endpoint que modifica el estado de una Inspeccion a 'CERRADA'
@@ -1879,9 +1756,10 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
         sucursal_id = self.request.data['sucursal']
         almacen_id = self.request.data['almacen']
 
+        ultima_inspeccion = models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).order_by('-fecha_alta').first()
+
         # Si existe al menos una inspección registrada en la base de datos, tomamos su fecha y estado
-        if models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).exists():
-            ultima_inspeccion = models.Inspeccion.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id).latest('fecha_alta')
+        if ultima_inspeccion is not None:
             fecha_ultima_inspeccion = ultima_inspeccion.fecha_alta
             estado_ultima_inspeccion = ultima_inspeccion.estado
 
@@ -1912,8 +1790,8 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
 
             # Checamos si hay consumos registrados después de la última inspección
             try:
-                models.ConsumoRecetaVendida.objects.filter(
-                    venta__caja__almacen__id=almacen_id,
+                models.ConsumoDiario.objects.filter(
+                    almacen__id=almacen_id,
                     fecha__gte=fecha_ultima_inspeccion
                 )
 
@@ -1921,10 +1799,11 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
                 return None
 
             else:
-                ultimos_consumos = models.ConsumoRecetaVendida.objects.filter(
-                    venta__caja__almacen__id=almacen_id,
+                # El consumo diario tiene un renglón por ingrediente y día, no uno por cada venta
+                ultimos_consumos = models.ConsumoDiario.objects.filter(
+                    almacen__id=almacen_id,
                     fecha__gte=fecha_ultima_inspeccion
-                )
+                ).select_related('ingrediente')
 
                 return ultimos_consumos
 
@@ -1934,14 +1813,14 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
         """
         try:
             almacen_id = self.request.data['almacen']
-            models.ConsumoRecetaVendida.objects.filter(venta__caja__almacen__id=almacen_id)
+            models.ConsumoDiario.objects.filter(almacen__id=almacen_id)
 
         # Si no hay consumos registrados, entonces retornamos None
         except ObjectDoesNotExist:
             return None
 
         else:
-            ultimos_consumos = models.ConsumoRecetaVendida.objects.filter(venta__caja__almacen__id=almacen_id)
+            ultimos_consumos = models.ConsumoDiario.objects.filter(almacen__id=almacen_id).select_related('ingrediente')
 
             return ultimos_consumos 
 
@@ -1966,7 +1845,7 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
                 botellas = models.Botella.objects.filter(almacen__id=almacen_id)
                 botellas = botellas.exclude(estado='0')
                 botellas = botellas.exclude(estado='3')
-                return botellas
+                return botellas.select_related('producto')
 
             # Si no hay botellas registradas en el almacén, no retornamos ninguna botella
             except ObjectDoesNotExist:
@@ -1982,26 +1861,16 @@ class InspeccionTotalViewSet(viewsets.ModelViewSet):
 
         # Si hay consumos registrados después de la última inspección:
         if ultimos_consumos is not None:
-            # Tomamos los ingredientes de dichos consumos y los guardamos en una lista
-            lista_ingredientes = [consumo.ingrediente for consumo in ultimos_consumos]
-            # Creamos un set con ingredientes únicos
-            ingredientes_unicos = set(lista_ingredientes)
-
-            # Tomamos las botellas del almacén que contengan los ingredientes consumidos
-            botellas = []
-            for ingrediente in ingredientes_unicos:
-                # Seleccionamos las botellas del ingrediente en cuestión
-                qs_botellas_ingrediente = models.Botella.objects.filter(sucursal__id=sucursal_id, almacen__id=almacen_id, producto__ingrediente__id=ingrediente.id)
-                # Excluimos las botellas VACIAS
-                qs_botellas_ingrediente = qs_botellas_ingrediente.exclude(estado='0')
-                # Excluimos las botellas PERDIDAS
-                qs_botellas_ingrediente = qs_botellas_ingrediente.exclude(estado='3')
-                # Guardamos las botellas del ingrediente en una lista
-                botellas_ingrediente = [botella for botella in qs_botellas_ingrediente]
-                # Agregamos las botellas a la lista maestra de botellas
-                botellas += botellas_ingrediente
-
-            return botellas
+            # Tomamos en un solo query las botellas del almacén cuyo ingrediente aparece en dichos consumos
+            botellas = models.Botella.objects.filter(
+                sucursal__id=sucursal_id,
+                almacen__id=almacen_id,
+                producto__ingrediente__in=ultimos_consumos.values('ingrediente')
+            )
+            # Excluimos las botellas VACIAS y PERDIDAS
+            botellas = botellas.exclude(estado__in=['0', '3']).select_related('producto').order_by('id')
+
+            return list(botellas)
 
         # Si no hay consumos registrados, no retornamos ninguna botella (no hay nada que inspeccionar)
         return None
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class VentasConfig(AppConfig):
     name = 'ventas'
+
+    def ready(self):
+        # Conectamos las señales que invalidan la matriz de recetas y reconstruyen el consumo diario
+        from ventas import signals
+
+        # Validamos los parsers al arrancar en lugar de al subir el primer reporte
+        from ventas.parsers import registro
+        registro.cargar_registro()
+        if settings.VENTAS_PRECARGAR_PARSERS:
+            registro.precargar_dependencias()
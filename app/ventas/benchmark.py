@@ -0,0 +1,329 @@
+import csv
+import datetime
+import gc
+import os
+import resource
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.db import connection, transaction
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+from ventas.parsers import motor
+from ventas.parsers.especificaciones import ESPECIFICACIONES
+
+
+"""
+-----------------------------------------------------------------------
+BENCHMARK DE LA INGESTA DE VENTAS
+
+Genera reportes sintéticos con el formato de exportación de cada punto
+de venta y mide por separado las tres etapas de la ingesta sobre el
+mismo recorrido por bloques que usa la carga real:
+
+- 'parseo': lectura del archivo y limpieza de cada bloque (motor)
+- 'consumos': cruce del bloque contra la matriz de recetas
+- 'registro': escritura de ventas y consumos (COPY o bulk_create),
+  dentro de una transacción que se revierte al terminar
+
+Los formatos de Excel se escriben como .xlsx: un .xls no admite más de
+65,536 renglones y algunos puntos de venta ya exportan .xlsx con
+extensión '.XLS', así que el motor los lee igual.
+-----------------------------------------------------------------------
+"""
+
+TAMANOS = [1000, 10000, 100000, 1000000]
+
+# Fracción de renglones sin receta y de renglones que el formato excluye (comida, refrescos)
+FRACCION_SIN_REGISTRO = 0.1
+FRACCION_EXCLUIDOS = 0.1
+
+FECHA_BENCHMARK = datetime.date(1990, 1, 1)
+
+
+"""
+-----------------------------------------------------------------------
+Generadores de reportes sintéticos. Cada uno recibe la ruta del archivo
+y un dataframe con 'codigo_pos', 'nombre', 'unidades', 'importe' y
+'excluido', y escribe el reporte tal como lo exporta el punto de venta.
+-----------------------------------------------------------------------
+"""
+def escribir_xlsx(ruta, renglones):
+
+    wb = openpyxl.Workbook(write_only=True)
+    hoja = wb.create_sheet()
+
+    for renglon in renglones:
+        hoja.append(renglon)
+
+    wb.save(ruta)
+
+
+def generar_magno_brasserie(ruta, df_reporte):
+
+    encabezado = [
+        ['MAGNO BRASSERIE'], [], ['Reporte de Venta por Producto'], [], ['Todas las Cajas'], [], ['Todos los Cajeros'], [],
+        [None, 'Codigo Producto', 'Nom Producto', 'Cantidad', None, 'Monto', '%'],
+    ]
+    codigos = np.where(df_reporte['excluido'], 'PF' + df_reporte['codigo_pos'], df_reporte['codigo_pos'])
+    productos = ([None, codigo_pos, nombre, unidades, None, importe, 0] for codigo_pos, nombre, unidades, importe in zip(
+        codigos, df_reporte['nombre'], df_reporte['unidades'].tolist(), df_reporte['importe'].tolist()
+    ))
+    pie = [
+        [None, None, None, None, None, int(df_reporte['importe'].sum())],
+        [],
+        [None, '- Descuentos por Producto:', None, None, 0],
+        [None, '- Descuentos por Mesa:', None, None, 0],
+        [None, 'Monto de Venta:', None, None, int(df_reporte['importe'].sum())],
+    ]
+
+    escribir_xlsx(ruta, _encadenar(encabezado, productos, pie))
+
+
+def generar_pecos(ruta, df_reporte):
+
+    encabezado = [
+        ['PRODUCTOS VENDIDOS'], ['LA CABAÑA DE PECOS'], ['GASTRONOMICA GAMA SA DE CV'], ['SAN LUIS POTOSI'],
+        ['CLAVE', 'DESCRIPCION', 'GRUPO', 'PRECIO', 'CANTIDAD', 'VENTA_TOTAL', 'COSTO'],
+    ]
+    grupos = np.where(df_reporte['excluido'], 'REFRESCOS', 'LICORES')
+    productos = ([codigo_pos, nombre, grupo, importe // unidades, unidades, importe, 0] for codigo_pos, nombre, grupo, unidades, importe in zip(
+        df_reporte['codigo_pos'], df_reporte['nombre'], grupos, df_reporte['unidades'].tolist(), df_reporte['importe'].tolist()
+    ))
+    pie = [[None, None, None, None, int(df_reporte['unidades'].sum()), int(df_reporte['importe'].sum())]]
+
+    escribir_xlsx(ruta, _encadenar(encabezado, productos, pie))
+
+
+def generar_gambinos_saopaulo(ruta, df_reporte):
+
+    encabezado = [[
+        'Tipo de fila', 'Clase de producto Padre', 'Clase', 'Nombre', 'SKU', 'Código de barras',
+        'Categoría de productos', 'Subcategoría de productos', 'Cant.', 'Peso', 'Total Ventas', 'COGS'
+    ]]
+    categorias = np.where(df_reporte['excluido'], 'Comida', 'Bebidas')
+    productos = (['Product', 'Unknown Class', 'Unknown Class', nombre, None, codigo_pos, categoria, 'Copeo', unidades, None, importe, 0] for codigo_pos, nombre, categoria, unidades, importe in zip(
+        df_reporte['codigo_pos'], df_reporte['nombre'], categorias, df_reporte['unidades'].tolist(), df_reporte['importe'].tolist()
+    ))
+
+    escribir_xlsx(ruta, _encadenar(encabezado, productos, []))
+
+
+def generar_kinkin(ruta, df_reporte):
+
+    divisiones = np.where(df_reporte['excluido'], 'KINKIN|SIN ALCOHOL', 'KINKIN|BEBIDAS BAR|COPAS')
+
+    # El reporte no trae código POS: el nombre del producto es su código
+    with open(ruta, 'w', newline='') as f:
+        escritor = csv.writer(f, lineterminator='\r')
+        escritor.writerow(['Column1', 'Division', 'Producto', 'Cantidad', 'Total'])
+        for division, codigo_pos, unidades, importe in zip(divisiones, df_reporte['codigo_pos'], df_reporte['unidades'].tolist(), df_reporte['importe'].tolist()):
+            escritor.writerow([' Subtotal producto', division, codigo_pos, unidades, '${:,.2f}'.format(importe)])
+
+
+def _encadenar(*partes):
+    for parte in partes:
+        yield from parte
+
+
+# {slug del formato: (generador, extensión)}
+FORMATOS = {
+    'MAGNO-BRASSERIE': (generar_magno_brasserie, 'xlsx'),
+    'PECOS': (generar_pecos, 'xlsx'),
+    'KINKIN': (generar_kinkin, 'csv'),
+    'GAMBINOS-SAOPAULO': (generar_gambinos_saopaulo, 'xlsx'),
+}
+
+
+"""
+-----------------------------------------------------------------------
+Arma los renglones de un reporte sintético con los códigos POS de las
+recetas de la sucursal, una fracción de códigos sin receta y una
+fracción de renglones que el formato excluye. Es determinista: la misma
+semilla da el mismo reporte.
+-----------------------------------------------------------------------
+"""
+def renglones_prueba(codigos, renglones, semilla=0):
+
+    aleatorio = np.random.RandomState(semilla)
+
+    codigos_pos = aleatorio.choice(np.array(codigos, dtype=object), renglones)
+    sin_registro = aleatorio.rand(renglones) < FRACCION_SIN_REGISTRO
+    codigos_pos[sin_registro] = ['SR{:07d}'.format(i) for i in range(sin_registro.sum())]
+    unidades = aleatorio.randint(1, 4, renglones)
+
+    return pd.DataFrame({
+        'codigo_pos': codigos_pos,
+        'nombre': codigos_pos,
+        'unidades': unidades,
+        'importe': unidades * 100,
+        'excluido': aleatorio.rand(renglones) < FRACCION_EXCLUIDOS,
+    })
+
+
+"""
+-----------------------------------------------------------------------
+Escribe el reporte sintético de un formato en 'directorio' y retorna su
+ruta
+-----------------------------------------------------------------------
+"""
+def generar_reporte(formato, codigos, renglones, directorio, semilla=0):
+
+    generador, extension = FORMATOS[formato]
+    ruta = os.path.join(directorio, 'ventas_{}_{}.{}'.format(formato.lower(), renglones, extension))
+
+    generador(ruta, renglones_prueba(codigos, renglones, semilla))
+
+    return ruta
+
+
+"""
+-----------------------------------------------------------------------
+Memoria pico del proceso en MB.
+
+En Linux reiniciamos el pico (VmHWM) antes de cada corrida escribiendo
+en '/proc/self/clear_refs', así que cada resultado mide solo su corrida.
+En otros sistemas 'ru_maxrss' es el pico desde que arrancó el proceso.
+-----------------------------------------------------------------------
+"""
+def reiniciar_memoria_pico():
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def memoria_pico():
+
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta bytes; Linux, KB
+    return maximo / (1024 * 1024) if sys.platform == 'darwin' else maximo / 1024
+
+
+def etapa(segundos, renglones):
+    return {
+        'segundos': round(segundos, 4),
+        'renglones_segundo': round(renglones / segundos) if segundos > 0 else None,
+    }
+
+
+"""
+-----------------------------------------------------------------------
+Mide la ingesta de un reporte con la especificación de su formato.
+
+Recorre el reporte por bloques igual que la carga real y cronometra cada
+etapa por separado. El registro se hace dentro de una transacción que se
+revierte, así que no queda nada guardado. Con 'registrar=False' se mide
+solo el parseo y los consumos.
+-----------------------------------------------------------------------
+"""
+def medir_reporte(ruta, formato, sucursal, tamano_bloque, registrar=True):
+
+    # Usamos la primera barra de la sucursal en lugar de la del restaurante
+    especificacion = dict(ESPECIFICACIONES[formato], barra=None)
+    matriz = matriz_recetas.get_matriz(sucursal)
+
+    gc.collect()
+    medicion_memoria = reiniciar_memoria_pico()
+
+    tiempos = Counter()
+    totales = Counter()
+    cajas = {}
+    ocurrencias = Counter()
+
+    with transaction.atomic():
+        bloques = motor.parsear_bloques(ruta, sucursal, especificacion, tamano_bloque)
+
+        while True:
+            inicio = time.perf_counter()
+            df_ventas = next(bloques, None)
+            tiempos['parseo'] += time.perf_counter() - inicio
+
+            if df_ventas is None:
+                break
+
+            totales['renglones_ventas'] += len(df_ventas)
+
+            inicio = time.perf_counter()
+            df_consumos = ventas_consumos.calcular_consumos(df_ventas, matriz)
+            tiempos['consumos'] += time.perf_counter() - inicio
+            totales['consumos'] += len(df_consumos)
+
+            if registrar:
+                inicio = time.perf_counter()
+                ventas_consumos.cargar_bloque(df_ventas, sucursal, matriz, FECHA_BENCHMARK, cajas, ocurrencias)
+                tiempos['registro'] += time.perf_counter() - inicio
+
+        transaction.set_rollback(True)
+
+    return tiempos, totales, medicion_memoria
+
+
+"""
+-----------------------------------------------------------------------
+Corre el benchmark de cada formato y tamaño y retorna los resultados
+listos para guardarse como JSON. 'reportar' recibe cada resultado en
+cuanto termina (para imprimir el avance).
+-----------------------------------------------------------------------
+"""
+def correr(sucursal, codigos, formatos, tamanos, directorio, tamano_bloque, registrar=True, reportar=None):
+
+    resultados = []
+
+    for formato in formatos:
+        for renglones in tamanos:
+
+            inicio = time.perf_counter()
+            ruta = generar_reporte(formato, codigos, renglones, directorio)
+            segundos_generar = time.perf_counter() - inicio
+
+            try:
+                tiempos, totales, medicion_memoria = medir_reporte(ruta, formato, sucursal, tamano_bloque, registrar)
+                tamano_archivo = os.path.getsize(ruta)
+            finally:
+                os.remove(ruta)
+
+            etapas = {nombre: etapa(tiempos[nombre], renglones) for nombre in ['parseo', 'consumos']}
+            if registrar:
+                etapas['registro'] = etapa(tiempos['registro'], renglones)
+            etapas['total'] = etapa(sum(tiempos.values()), renglones)
+
+            resultado = {
+                'formato': formato,
+                'renglones': renglones,
+                'renglones_ventas': totales['renglones_ventas'],
+                'consumos': totales['consumos'],
+                'bytes_archivo': tamano_archivo,
+                'segundos_generar': round(segundos_generar, 4),
+                'etapas': etapas,
+                'memoria_pico_mb': round(memoria_pico(), 1),
+                'memoria_pico_por_corrida': medicion_memoria,
+            }
+            resultados.append(resultado)
+
+            if reportar is not None:
+                reportar(resultado)
+
+    return {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'base_de_datos': connection.vendor,
+        'tamano_bloque': tamano_bloque,
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'resultados': resultados,
+    }
@@ -0,0 +1,152 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from core import models
+
+import zlib
+
+
+"""
+-----------------------------------------------------------------------
+BLOQUEOS DE LA INGESTA DE VENTAS POR SUCURSAL
+
+Dos cargas de la misma sucursal y la misma fecha no pueden correr al
+mismo tiempo: sus inserts se intercalarían y los renglones de un reporte
+podrían registrarse dos veces. Las cargas de fechas o sucursales
+distintas sí corren en paralelo (como los días de 'ventas.historico').
+
+En PostgreSQL usamos advisory locks:
+- Una carga con fecha toma compartido el candado de la sucursal
+  (CLAVE_INGESTA, sucursal_id) y exclusivo el de su fecha
+  (CLAVE_INGESTA_FECHA, clave_fecha(sucursal_id, fecha))
+- Una operación sobre todas las fechas de la sucursal (como reatribuir
+  los productos sin registro) toma exclusivo el de la sucursal y espera
+  a que terminen las cargas con fecha
+
+En las demás bases de datos bloqueamos el renglón de la Sucursal con
+'SELECT ... FOR UPDATE' sin importar la fecha (SQLite lo ignora, pero ya
+serializa todas las escrituras).
+-----------------------------------------------------------------------
+"""
+
+# Primera mitad de la clave de los advisory locks de la ingesta de ventas
+CLAVE_INGESTA = 7301
+CLAVE_INGESTA_FECHA = 7302
+CLAVE_SIN_REGISTRO = 7303
+
+
+def usa_advisory_locks():
+    return connection.vendor == 'postgresql'
+
+
+"""
+-----------------------------------------------------------------------
+Segunda mitad de la clave del candado de una fecha de la sucursal: un
+entero de 32 bits con signo. Si dos fechas comparten clave solo se
+esperan una a la otra.
+-----------------------------------------------------------------------
+"""
+def clave_fecha(sucursal_id, fecha):
+    return zlib.crc32('{}|{}'.format(sucursal_id, fecha.isoformat()).encode('utf-8')) - 2 ** 31
+
+
+"""
+-----------------------------------------------------------------------
+Bloquea la sucursal (o solo su 'fecha') hasta que termine la transacción
+actual. Se llama dentro de un 'transaction.atomic()'; si otra carga
+tiene el candado, espera a que lo suelte.
+-----------------------------------------------------------------------
+"""
+def bloquear_sucursal(sucursal_id, fecha=None):
+
+    if usa_advisory_locks():
+        with connection.cursor() as cursor:
+            if fecha is None:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+            else:
+                cursor.execute('SELECT pg_advisory_xact_lock_shared(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [CLAVE_INGESTA_FECHA, clave_fecha(sucursal_id, fecha)])
+        return
+
+    list(models.Sucursal.objects.select_for_update().filter(id=sucursal_id).values_list('id', flat=True))
+
+
+"""
+-----------------------------------------------------------------------
+Bloquea la sucursal (o solo su 'fecha') durante todo el bloque 'with',
+aunque adentro se abran y se confirmen varias transacciones (como
+'ingesta.procesar', que guarda cada bloque en su propia transacción).
+
+En PostgreSQL son advisory locks de sesión. En las demás bases de datos
+no hay un candado que sobreviva a la transacción, así que cada bloque se
+protege solo con 'bloquear_sucursal'.
+-----------------------------------------------------------------------
+"""
+@contextmanager
+def bloqueo_sucursal(sucursal_id, fecha=None):
+
+    if not usa_advisory_locks():
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        if fecha is None:
+            cursor.execute('SELECT pg_advisory_lock(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+        else:
+            cursor.execute('SELECT pg_advisory_lock_shared(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+            cursor.execute('SELECT pg_advisory_lock(%s, %s)', [CLAVE_INGESTA_FECHA, clave_fecha(sucursal_id, fecha)])
+
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            if fecha is None:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+            else:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [CLAVE_INGESTA_FECHA, clave_fecha(sucursal_id, fecha)])
+                cursor.execute('SELECT pg_advisory_unlock_shared(%s, %s)', [CLAVE_INGESTA, sucursal_id])
+
+
+"""
+-----------------------------------------------------------------------
+Bloquea el resumen de productos sin registro de la sucursal hasta que
+termine la transacción actual. Las cargas de fechas distintas lo
+comparten (ResumenSinRegistro es uno por código POS), así que no pueden
+crear ni reconstruir los mismos renglones al mismo tiempo. En las demás
+bases de datos ya lo protege 'bloquear_sucursal'.
+-----------------------------------------------------------------------
+"""
+def bloquear_sin_registro(sucursal_id):
+
+    if usa_advisory_locks():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [CLAVE_SIN_REGISTRO, sucursal_id])
+
+
+"""
+-----------------------------------------------------------------------
+Checa si alguna carga tiene el candado de la sucursal (o, con 'fecha',
+el de esa fecha de la sucursal), sin esperar a que lo suelte. En
+PostgreSQL intenta tomar el advisory lock y, si lo logra, lo suelta de
+inmediato. En las demás bases de datos no hay forma de saberlo y
+retorna False.
+-----------------------------------------------------------------------
+"""
+def sucursal_ocupada(sucursal_id, fecha=None):
+
+    if not usa_advisory_locks():
+        return False
+
+    if fecha is None:
+        clave = [CLAVE_INGESTA, sucursal_id]
+    else:
+        clave = [CLAVE_INGESTA_FECHA, clave_fecha(sucursal_id, fecha)]
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', clave)
+        tomado = cursor.fetchone()[0]
+
+        if tomado:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)', clave)
+
+    return not tomado
@@ -0,0 +1,245 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+import csv
+import io
+import numpy as np
+from core import models
+from ventas import consumo_diario
+from ventas import sin_registro
+
+
+"""
+-----------------------------------------------------------------------
+CARGA DE VENTAS CON 'COPY' DE POSTGRESQL
+
+En lugar de construir un objeto del ORM por cada Venta y mandar INSERTs
+con parámetros, copiamos los renglones del bloque a una tabla temporal
+con 'COPY ... FROM STDIN' y de ahí los pasamos a las tablas de Venta,
+ConsumoRecetaVendida, ConsumoDiario, ProductoSinRegistro y
+ResumenSinRegistro con unos cuantos queries 'INSERT ... SELECT'. Los consumos se calculan en la base
+de datos con un JOIN contra IngredienteReceta (la receta actual); las
+ventas de fechas con recetas corregidas después se cargan con el ORM
+(ver 'ventas_consumos.cargar_bloque').
+
+Solo funciona en PostgreSQL; en las demás bases de datos (SQLite en los
+tests) 'ventas_consumos.cargar_bloque' usa 'bulk_create'.
+-----------------------------------------------------------------------
+"""
+
+TABLA_CARGA = 'ventas_carga'
+COLUMNAS_CARGA = ['receta_id', 'caja_id', 'codigo_pos', 'nombre', 'unidades', 'importe', 'huella']
+
+
+"""
+-----------------------------------------------------------------------
+Checa si se puede usar la carga con COPY: PostgreSQL y
+'settings.VENTAS_CARGA_COPY' activado
+-----------------------------------------------------------------------
+"""
+def disponible():
+    return settings.VENTAS_CARGA_COPY and connection.vendor == 'postgresql'
+
+
+"""
+-----------------------------------------------------------------------
+Convierte los renglones del bloque a CSV para el COPY. Los valores None
+se escriben vacíos, que COPY interpreta como NULL.
+-----------------------------------------------------------------------
+"""
+def renglones_csv(renglones):
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    for renglon in renglones:
+        writer.writerow(['' if valor is None else valor for valor in renglon])
+
+    buffer.seek(0)
+
+    return buffer
+
+
+"""
+-----------------------------------------------------------------------
+Arma los renglones de la tabla temporal: la receta de cada renglón (None
+si no está registrada) se toma de la matriz de recetas de la sucursal.
+Revisa que existan las cajas de las ventas, igual que 'registrar_bloque'.
+-----------------------------------------------------------------------
+"""
+def renglones_carga(df_ventas, matriz, huellas, cajas):
+
+    filas = matriz.buscar_filas(df_ventas['codigo_pos']) if len(df_ventas) > 0 else np.array([], dtype=np.int64)
+    recetas_ids = [receta.id for receta in matriz.recetas]
+
+    # Cargamos con un solo query las cajas del bloque que aún no tenemos
+    cajas_ids = set(df_ventas['caja_id'].tolist()) - set(cajas) if len(df_ventas) > 0 else set()
+    if cajas_ids:
+        cajas.update(models.Caja.objects.select_related('almacen').in_bulk(cajas_ids))
+
+    renglones = []
+    for fila, huella, (sucursal_id, caja_id, codigo_pos, nombre, unidades, importe) in zip(filas.tolist(), huellas, df_ventas.itertuples(index=False, name=None)):
+
+        receta_id = recetas_ids[fila] if fila >= 0 else None
+        if receta_id is not None and caja_id not in cajas:
+            raise models.Caja.DoesNotExist('La caja con el id "{}" no existe.'.format(caja_id))
+
+        renglones.append((receta_id, int(caja_id), codigo_pos, nombre, int(unidades), int(importe), huella))
+
+    return renglones
+
+
+"""
+-----------------------------------------------------------------------
+Registra un bloque de ventas con COPY.
+
+Recibe las huellas de los renglones ya calculadas (ver
+'ventas_consumos.huellas_renglones'). Los renglones que ya estaban
+registrados se omiten o se reemplazan según 'settings.VENTAS_DUPLICADOS'.
+Debe llamarse dentro de una transacción: la tabla temporal se borra al
+terminar la transacción.
+
+Retorna los totales: {'ventas', 'consumos', 'productos_no_registrados',
+'duplicados'}
+-----------------------------------------------------------------------
+"""
+def registrar_bloque(df_ventas, sucursal, matriz, fecha, huellas, cajas):
+
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError('La carga con COPY debe correr dentro de transaction.atomic()')
+
+    renglones = renglones_carga(df_ventas, matriz, huellas, cajas)
+
+    tablas = {
+        'carga': TABLA_CARGA,
+        'venta': models.Venta._meta.db_table,
+        'consumo': models.ConsumoRecetaVendida._meta.db_table,
+        'consumo_diario': models.ConsumoDiario._meta.db_table,
+        'caja': models.Caja._meta.db_table,
+        'sin_registro': models.ProductoSinRegistro._meta.db_table,
+        'resumen': models.ResumenSinRegistro._meta.db_table,
+        'ingrediente_receta': models.IngredienteReceta._meta.db_table,
+    }
+    parametros = {
+        'sucursal': sucursal.id,
+        'fecha': fecha,
+    }
+
+    with connection.cursor() as cursor:
+
+        # Tabla temporal del bloque
+        cursor.execute('''
+            CREATE TEMPORARY TABLE IF NOT EXISTS {carga} (
+                receta_id integer,
+                caja_id integer,
+                codigo_pos text,
+                nombre text,
+                unidades integer,
+                importe integer,
+                huella varchar(40)
+            ) ON COMMIT DROP
+        '''.format(**tablas))
+        cursor.execute('TRUNCATE {carga}'.format(**tablas))
+
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (codigo_pos, nombre))'.format(TABLA_CARGA, ', '.join(COLUMNAS_CARGA)),
+            renglones_csv(renglones)
+        )
+
+        # Renglones que ya estaban registrados como Venta o como ProductoSinRegistro
+        registrados = '''
+            EXISTS (SELECT 1 FROM {venta} v WHERE v.sucursal_id = %(sucursal)s AND v.huella = c.huella)
+            OR EXISTS (SELECT 1 FROM {sin_registro} p WHERE p.sucursal_id = %(sucursal)s AND p.huella = c.huella)
+        '''.format(**tablas)
+
+        cursor.execute('SELECT count(*) FROM {carga} c WHERE '.format(**tablas) + registrados, parametros)
+        duplicados = cursor.fetchone()[0]
+
+        if duplicados and settings.VENTAS_DUPLICADOS == 'actualizar':
+            # Reemplazamos los renglones registrados (primero sus consumos)
+            cursor.execute('''
+                DELETE FROM {consumo} x USING {venta} v, {carga} c
+                WHERE x.venta_id = v.id AND v.sucursal_id = %(sucursal)s AND v.huella = c.huella
+            '''.format(**tablas), parametros)
+            cursor.execute('''
+                DELETE FROM {venta} v USING {carga} c
+                WHERE v.sucursal_id = %(sucursal)s AND v.huella = c.huella
+            '''.format(**tablas), parametros)
+            consumo_diario.recalcular(sucursal, fecha, fecha)
+            cursor.execute('''
+                DELETE FROM {sin_registro} p USING {carga} c
+                WHERE p.sucursal_id = %(sucursal)s AND p.huella = c.huella
+                RETURNING p.codigo_pos
+            '''.format(**tablas), parametros)
+
+            # Descontamos del resumen los productos sin registro reemplazados
+            codigos = {codigo_pos for (codigo_pos,) in cursor.fetchall()}
+            if codigos:
+                sin_registro.recalcular(sucursal, codigos)
+
+        elif duplicados:
+            cursor.execute('DELETE FROM {carga} c WHERE '.format(**tablas) + registrados, parametros)
+
+        # Ventas, sus consumos y el consumo diario en un solo query
+        cursor.execute('''
+            WITH nuevas AS (
+                INSERT INTO {venta} (receta_id, sucursal_id, fecha, unidades, importe, caja_id, huella)
+                SELECT receta_id, %(sucursal)s, %(fecha)s, unidades, importe, caja_id, huella
+                FROM {carga}
+                WHERE receta_id IS NOT NULL
+                RETURNING id, receta_id, unidades, importe, caja_id
+            ), consumos AS (
+                INSERT INTO {consumo} (ingrediente_id, receta_id, venta_id, fecha, volumen)
+                SELECT ir.ingrediente_id, n.receta_id, n.id, %(fecha)s, ir.volumen * n.unidades
+                FROM nuevas n
+                JOIN {ingrediente_receta} ir ON ir.receta_id = n.receta_id
+                RETURNING ingrediente_id, venta_id, volumen
+            ), diario AS (
+                INSERT INTO {consumo_diario} AS d (ingrediente_id, almacen_id, fecha, volumen, unidades, importe)
+                SELECT x.ingrediente_id, cj.almacen_id, %(fecha)s, sum(x.volumen), sum(n.unidades), sum(n.importe)
+                FROM consumos x
+                JOIN nuevas n ON n.id = x.venta_id
+                JOIN {caja} cj ON cj.id = n.caja_id
+                GROUP BY x.ingrediente_id, cj.almacen_id
+                ON CONFLICT (ingrediente_id, almacen_id, fecha) DO UPDATE SET
+                    volumen = d.volumen + EXCLUDED.volumen,
+                    unidades = d.unidades + EXCLUDED.unidades,
+                    importe = d.importe + EXCLUDED.importe
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM nuevas), (SELECT count(*) FROM consumos)
+        '''.format(**tablas), parametros)
+        ventas, consumos = cursor.fetchone()
+
+        # Productos sin registro
+        cursor.execute('''
+            INSERT INTO {sin_registro} (sucursal_id, codigo_pos, caja, nombre, fecha, unidades, importe, huella)
+            SELECT %(sucursal)s, codigo_pos, caja_id, nombre, %(fecha)s, unidades, importe, huella
+            FROM {carga}
+            WHERE receta_id IS NULL
+        '''.format(**tablas), parametros)
+        productos_no_registrados = cursor.rowcount
+
+        # Los sumamos al resumen de su código POS
+        if productos_no_registrados:
+            cursor.execute('''
+                INSERT INTO {resumen} AS r (sucursal_id, codigo_pos, nombre, renglones, unidades, importe, primera_fecha, ultima_fecha)
+                SELECT %(sucursal)s, codigo_pos, max(nombre), count(*), coalesce(sum(unidades), 0), coalesce(sum(importe), 0), %(fecha)s, %(fecha)s
+                FROM {carga}
+                WHERE receta_id IS NULL
+                GROUP BY codigo_pos
+                ON CONFLICT (sucursal_id, codigo_pos) DO UPDATE SET
+                    nombre = EXCLUDED.nombre,
+                    renglones = r.renglones + EXCLUDED.renglones,
+                    unidades = r.unidades + EXCLUDED.unidades,
+                    importe = r.importe + EXCLUDED.importe,
+                    primera_fecha = least(r.primera_fecha, EXCLUDED.primera_fecha),
+                    ultima_fecha = greatest(r.ultima_fecha, EXCLUDED.ultima_fecha)
+            '''.format(**tablas), parametros)
+
+    return {
+        'ventas': ventas,
+        'consumos': consumos,
+        'productos_no_registrados': productos_no_registrados,
+        'duplicados': duplicados,
+    }
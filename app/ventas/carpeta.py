@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import shutil
+
+from django.core.files import File
+from django.db import connections
+from core import models
+from ventas import ingesta
+from ventas.parsers import registro
+
+
+"""
+-----------------------------------------------------------------------
+INGESTA DE UNA CARPETA DE REPORTES DE VENTAS
+
+Los puntos de venta dejan sus reportes en una carpeta con una
+subcarpeta por sucursal:
+
+    carpeta/MAGNO-BRASSERIE/ventas_2019-10-14.xls
+    carpeta/PECOS/PRODUCTOS_VENDIDOS.XLS
+
+Cada reporte se encola como un ReporteVentas (así un archivo que ya se
+procesó no se vuelve a registrar) y los reportes de cada sucursal se
+procesan en orden en un mismo worker. Las sucursales se reparten entre
+varios procesos para que corran en paralelo. Al terminar, cada archivo
+se mueve a 'procesados/' o 'errores/' dentro de su subcarpeta.
+-----------------------------------------------------------------------
+"""
+
+CARPETA_PROCESADOS = 'procesados'
+CARPETA_ERRORES = 'errores'
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los archivos de la carpeta agrupados por sucursal:
+({sucursal: [rutas]}, [subcarpetas sin sucursal])
+
+Las subcarpetas se reconocen por el slug de la sucursal (sin importar
+mayúsculas ni '_' o '-').
+-----------------------------------------------------------------------
+"""
+def archivos_carpeta(carpeta):
+
+    sucursales = {registro.clave_slug(sucursal.slug): sucursal for sucursal in models.Sucursal.objects.all()}
+    archivos = {}
+    desconocidas = []
+
+    for nombre in sorted(os.listdir(carpeta)):
+        subcarpeta = os.path.join(carpeta, nombre)
+        if not os.path.isdir(subcarpeta):
+            continue
+
+        sucursal = sucursales.get(registro.clave_slug(nombre))
+        if sucursal is None:
+            desconocidas.append(nombre)
+            continue
+
+        rutas = [
+            os.path.join(subcarpeta, archivo) for archivo in sorted(os.listdir(subcarpeta))
+            if os.path.isfile(os.path.join(subcarpeta, archivo)) and not archivo.startswith('.')
+        ]
+        if rutas:
+            archivos[sucursal] = rutas
+
+    return archivos, desconocidas
+
+
+"""
+-----------------------------------------------------------------------
+Encola un archivo de la carpeta. Retorna el ReporteVentas (nuevo o el
+que ya existía con la misma huella).
+-----------------------------------------------------------------------
+"""
+def encolar_archivo(ruta, sucursal, fecha=None):
+
+    with open(ruta, 'rb') as f:
+        reporte, creado = ingesta.encolar(File(f, name=os.path.basename(ruta)), sucursal, fecha=fecha)
+
+    return reporte
+
+
+"""
+-----------------------------------------------------------------------
+Procesa en orden los reportes de una sucursal. Es la tarea de cada
+worker. Retorna los ids de los reportes que procesó.
+-----------------------------------------------------------------------
+"""
+def procesar_reportes(reportes_ids):
+
+    procesados = []
+
+    for reporte_id in reportes_ids:
+        # Si otro worker ya lo tomó, lo saltamos
+        reporte = ingesta.tomar_siguiente(ids=[reporte_id])
+        if reporte is None:
+            continue
+
+        ingesta.procesar(reporte)
+        procesados.append(reporte_id)
+
+    return procesados
+
+
+"""
+-----------------------------------------------------------------------
+Procesa las listas de reportes de 'tareas' (una por sucursal) en
+'procesos' workers. Conviene ordenar las tareas de la más pesada a la
+más ligera para que una sucursal grande no se quede al final sola.
+
+Cerramos las conexiones antes de crear los workers: cada proceso abre
+las suyas y no comparte el socket de la conexión del proceso padre.
+-----------------------------------------------------------------------
+"""
+def procesar_en_paralelo(tareas, procesos):
+
+    if procesos <= 1:
+        return [procesar_reportes(reportes_ids) for reportes_ids in tareas]
+
+    connections.close_all()
+    with multiprocessing.Pool(procesos) as pool:
+        return pool.map(procesar_reportes, tareas, chunksize=1)
+
+
+"""
+-----------------------------------------------------------------------
+Mueve el archivo de un reporte a 'procesados/' o 'errores/' según su
+estado. Los reportes que siguen pendientes o en proceso se quedan en la
+carpeta. Retorna la nueva ruta (None si no se movió).
+-----------------------------------------------------------------------
+"""
+def archivar(ruta, reporte):
+
+    if reporte.estado == models.ReporteVentas.TERMINADO:
+        destino = CARPETA_PROCESADOS
+    elif reporte.estado == models.ReporteVentas.ERROR:
+        destino = CARPETA_ERRORES
+    else:
+        return None
+
+    carpeta_destino = os.path.join(os.path.dirname(ruta), destino)
+    os.makedirs(carpeta_destino, exist_ok=True)
+
+    nueva_ruta = os.path.join(carpeta_destino, os.path.basename(ruta))
+    shutil.move(ruta, nueva_ruta)
+
+    return nueva_ruta
@@ -0,0 +1,171 @@
+import datetime
+import os
+import traceback
+from urllib.parse import urlparse
+
+import requests
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from core import models
+from ventas import ingesta
+
+
+"""
+-----------------------------------------------------------------------
+CONECTORES DE REPORTES DE VENTAS
+
+Cada ConectorVentas sabe descargar el reporte de un día de su sucursal.
+Sincronizar un conector descarga, encola y procesa en orden los días
+posteriores a su marca de agua ('ultima_fecha') hasta ayer. La marca
+avanza después de cada día registrado, así que si la sincronización se
+interrumpe o un día todavía no está publicado, la siguiente ejecución
+continúa desde ahí sin repetir trabajo.
+
+Los reportes pasan por 'ingesta.encolar', así que un archivo que ya se
+registró (misma huella) no se vuelve a procesar.
+-----------------------------------------------------------------------
+"""
+
+TIMEOUT_HTTP = 60
+
+
+class ReporteNoDisponible(LookupError):
+    """ El origen todavía no publica el reporte del día """
+    pass
+
+
+def ubicacion_fecha(conector, fecha):
+    return conector.ubicacion.format(fecha=fecha)
+
+
+"""
+-----------------------------------------------------------------------
+Descarga el reporte de un día de una carpeta local o montada (por
+ejemplo un SFTP montado con sshfs)
+-----------------------------------------------------------------------
+"""
+def descargar_carpeta(conector, fecha):
+
+    ruta = ubicacion_fecha(conector, fecha)
+
+    if not os.path.isfile(ruta):
+        raise ReporteNoDisponible('No existe el archivo {}'.format(ruta))
+
+    with open(ruta, 'rb') as f:
+        return ContentFile(f.read(), name=os.path.basename(ruta))
+
+
+"""
+-----------------------------------------------------------------------
+Descarga el reporte de un día de un endpoint HTTP. Un 404 significa que
+el reporte todavía no está publicado; cualquier otro error se arroja.
+-----------------------------------------------------------------------
+"""
+def descargar_http(conector, fecha):
+
+    url = ubicacion_fecha(conector, fecha)
+    encabezados = {'Authorization': 'Bearer {}'.format(conector.token)} if conector.token else {}
+
+    respuesta = requests.get(url, headers=encabezados, timeout=TIMEOUT_HTTP)
+
+    if respuesta.status_code == 404:
+        raise ReporteNoDisponible('No existe el reporte {}'.format(url))
+    respuesta.raise_for_status()
+
+    nombre = os.path.basename(urlparse(url).path) or 'ventas_{}'.format(fecha.isoformat())
+
+    return ContentFile(respuesta.content, name=nombre)
+
+
+# {tipo de conector: función que descarga el reporte de un día}
+DESCARGAS = {
+    models.ConectorVentas.CARPETA: descargar_carpeta,
+    models.ConectorVentas.HTTP: descargar_http,
+}
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los días que faltan por sincronizar, del siguiente a la marca
+de agua (o 'fecha_inicial') hasta 'hasta'
+-----------------------------------------------------------------------
+"""
+def fechas_pendientes(conector, hasta):
+
+    if conector.ultima_fecha is not None:
+        fecha = conector.ultima_fecha + datetime.timedelta(days=1)
+    else:
+        fecha = conector.fecha_inicial
+
+    fechas = []
+    while fecha <= hasta:
+        fechas.append(fecha)
+        fecha += datetime.timedelta(days=1)
+
+    return fechas
+
+
+"""
+-----------------------------------------------------------------------
+Descarga, encola y procesa el reporte de un día. Retorna el
+ReporteVentas.
+
+Si el archivo ya se había subido (por ejemplo a mano) se regresa ese
+reporte; si está pendiente, se procesa aquí.
+-----------------------------------------------------------------------
+"""
+def sincronizar_fecha(conector, fecha):
+
+    archivo = DESCARGAS[conector.tipo](conector, fecha)
+    reporte, creado = ingesta.encolar(archivo, conector.sucursal, fecha=fecha)
+
+    tomado = ingesta.tomar_siguiente(ids=[reporte.id])
+    if tomado is not None:
+        return ingesta.procesar(tomado)
+
+    reporte.refresh_from_db()
+
+    return reporte
+
+
+"""
+-----------------------------------------------------------------------
+Sincroniza un conector hasta 'hasta' (por default, ayer).
+
+Se detiene en el primer día que no está publicado o que no se pudo
+registrar, para que la marca de agua nunca se salte un día. Retorna:
+{'fechas': días registrados, 'ventas': ventas registradas, 'error': texto o ''}
+-----------------------------------------------------------------------
+"""
+def sincronizar(conector, hasta=None):
+
+    if hasta is None:
+        hasta = datetime.date.today() - datetime.timedelta(days=1)
+
+    resultado = {'fechas': 0, 'ventas': 0, 'error': ''}
+
+    for fecha in fechas_pendientes(conector, hasta):
+
+        try:
+            reporte = sincronizar_fecha(conector, fecha)
+        except ReporteNoDisponible:
+            break
+        except Exception:
+            resultado['error'] = traceback.format_exc()
+            break
+
+        if reporte.estado != models.ReporteVentas.TERMINADO:
+            resultado['error'] = reporte.errores or 'El reporte {} está {}'.format(reporte.id, reporte.get_estado_display())
+            break
+
+        conector.ultima_fecha = fecha
+        models.ConectorVentas.objects.filter(id=conector.id).update(ultima_fecha=fecha)
+
+        resultado['fechas'] += 1
+        resultado['ventas'] += reporte.ventas_registradas
+
+    conector.timestamp_ultima_ejecucion = timezone.now()
+    conector.ultimo_error = resultado['error']
+    conector.save(update_fields=['timestamp_ultima_ejecucion', 'ultimo_error'])
+
+    return resultado
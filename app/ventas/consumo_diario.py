@@ -0,0 +1,167 @@
+from django.db import transaction
+from django.db.models import F, Sum
+
+import functools
+from core import models
+from ventas import bloqueos
+
+
+"""
+-----------------------------------------------------------------------
+CONSUMO DIARIO POR INGREDIENTE Y ALMACÉN
+
+Los reportes de mermas y las inspecciones suman el consumo de ventas de
+un ingrediente en un almacén entre dos fechas. En lugar de recorrer cada
+ConsumoRecetaVendida con sus JOINs a Venta, Caja y Almacen, leen el
+ConsumoDiario: un renglón por (ingrediente, almacén, fecha).
+
+La carga de ventas lo actualiza en la misma transacción en que guarda
+los consumos. Cuando se elimina una Venta (desde el admin o en cascada)
+la señal de 'ventas.signals' reconstruye su fecha al confirmarse la
+transacción. Los ConsumosRecetaVendida que se modifican o eliminan
+directamente no lo actualizan: después hay que correr el comando
+'reconstruir_consumo_diario', que lo arma otra vez a partir de los
+ConsumosRecetaVendida.
+-----------------------------------------------------------------------
+"""
+
+
+"""
+-----------------------------------------------------------------------
+Suma una lista de ConsumosRecetaVendida recién guardados (con su venta
+y la caja de la venta) al ConsumoDiario de su ingrediente, almacén y
+fecha. Debe llamarse dentro de la transacción que los guardó.
+-----------------------------------------------------------------------
+"""
+def acumular(consumos):
+
+    totales = {}
+    for consumo in consumos:
+        venta = consumo.venta
+        clave = (consumo.ingrediente_id, venta.caja.almacen_id, consumo.fecha)
+        total = totales.setdefault(clave, {'volumen': 0, 'unidades': 0, 'importe': 0})
+        total['volumen'] += consumo.volumen
+        total['unidades'] += venta.unidades
+        total['importe'] += venta.importe
+
+    if not totales:
+        return
+
+    ingredientes_ids = {ingrediente_id for (ingrediente_id, almacen_id, fecha) in totales}
+    almacenes_ids = {almacen_id for (ingrediente_id, almacen_id, fecha) in totales}
+    fechas = {fecha for (ingrediente_id, almacen_id, fecha) in totales}
+
+    existentes = models.ConsumoDiario.objects.select_for_update().filter(
+        ingrediente__in=ingredientes_ids,
+        almacen__in=almacenes_ids,
+        fecha__in=fechas
+    )
+    existentes = {(diario.ingrediente_id, diario.almacen_id, diario.fecha): diario.id for diario in existentes}
+
+    nuevos = []
+    for (ingrediente_id, almacen_id, fecha), total in totales.items():
+
+        diario_id = existentes.get((ingrediente_id, almacen_id, fecha))
+        if diario_id is None:
+            nuevos.append(models.ConsumoDiario(ingrediente_id=ingrediente_id, almacen_id=almacen_id, fecha=fecha, **total))
+            continue
+
+        # Los totales se suman en la base de datos
+        models.ConsumoDiario.objects.filter(id=diario_id).update(
+            volumen=F('volumen') + total['volumen'],
+            unidades=F('unidades') + total['unidades'],
+            importe=F('importe') + total['importe']
+        )
+
+    models.ConsumoDiario.objects.bulk_create(nuevos)
+
+
+"""
+-----------------------------------------------------------------------
+Reconstruye el ConsumoDiario de una sucursal (o de todas) entre dos
+fechas (o de todas) con un solo GROUP BY sobre los ConsumosRecetaVendida.
+Con 'ingredientes' (ids) solo se reconstruyen esos ingredientes.
+
+Retorna el número de renglones de ConsumoDiario creados.
+-----------------------------------------------------------------------
+"""
+def recalcular(sucursal=None, fecha_inicial=None, fecha_final=None, ingredientes=None):
+
+    consumos = models.ConsumoRecetaVendida.objects.all()
+    diarios = models.ConsumoDiario.objects.all()
+
+    if sucursal is not None:
+        consumos = consumos.filter(venta__sucursal=sucursal)
+        diarios = diarios.filter(almacen__sucursal=sucursal)
+
+    if fecha_inicial is not None:
+        consumos = consumos.filter(fecha__gte=fecha_inicial)
+        diarios = diarios.filter(fecha__gte=fecha_inicial)
+
+    if fecha_final is not None:
+        consumos = consumos.filter(fecha__lte=fecha_final)
+        diarios = diarios.filter(fecha__lte=fecha_final)
+
+    if ingredientes is not None:
+        ingredientes = list(ingredientes)
+        consumos = consumos.filter(ingrediente__in=ingredientes)
+        diarios = diarios.filter(ingrediente__in=ingredientes)
+
+    totales = consumos.values('ingrediente_id', 'venta__caja__almacen_id', 'fecha').annotate(
+        total_volumen=Sum('volumen'),
+        total_unidades=Sum('venta__unidades'),
+        total_importe=Sum('venta__importe')
+    ).order_by()
+
+    nuevos = [
+        models.ConsumoDiario(
+            ingrediente_id=total['ingrediente_id'],
+            almacen_id=total['venta__caja__almacen_id'],
+            fecha=total['fecha'],
+            volumen=total['total_volumen'] or 0,
+            unidades=total['total_unidades'] or 0,
+            importe=total['total_importe'] or 0
+        )
+        for total in totales
+    ]
+
+    with transaction.atomic():
+        diarios.delete()
+        models.ConsumoDiario.objects.bulk_create(nuevos, batch_size=1000)
+
+    return len(nuevos)
+
+
+"""
+-----------------------------------------------------------------------
+Reconstruye el ConsumoDiario de una fecha de la sucursal con la fecha
+bloqueada para las cargas de ventas
+-----------------------------------------------------------------------
+"""
+def reconstruir_fecha(sucursal_id, fecha):
+
+    with transaction.atomic():
+        bloqueos.bloquear_sucursal(sucursal_id, fecha)
+        recalcular(sucursal_id, fecha, fecha)
+
+
+"""
+-----------------------------------------------------------------------
+Programa la reconstrucción del ConsumoDiario de una fecha de la sucursal
+para cuando se confirme la transacción actual: una sola vez por fecha,
+aunque se eliminen muchas Ventas. Fuera de una transacción se
+reconstruye de inmediato.
+-----------------------------------------------------------------------
+"""
+def programar_reconstruccion(sucursal_id, fecha):
+
+    clave = (sucursal_id, fecha)
+
+    # Si la transacción se revierte, Django descarta sus callbacks y la fecha se vuelve a programar
+    pendientes = transaction.get_connection().run_on_commit
+    if any(getattr(funcion, 'clave_consumo_diario', None) == clave for savepoints, funcion in pendientes):
+        return
+
+    funcion = functools.partial(reconstruir_fecha, sucursal_id, fecha)
+    funcion.clave_consumo_diario = clave
+    transaction.on_commit(funcion)
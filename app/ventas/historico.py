@@ -0,0 +1,209 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.files.base import ContentFile
+from django.db import connections
+
+import datetime
+import io
+import os
+import re
+import time
+import zipfile
+from core import models
+from ventas import ingesta
+from ventas import ventas_consumos
+
+
+# Fecha en el nombre del archivo: 2019-10-14, 2019_10_14 o 20191014
+PATRON_FECHA = re.compile(r'(\d{4})[-_]?(\d{2})[-_]?(\d{2})')
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la fecha de las ventas de un reporte a partir del nombre del
+archivo ('ventas_2019-10-14.csv'). Retorna None si el nombre no trae una
+fecha válida.
+-----------------------------------------------------------------------
+"""
+def fecha_archivo(nombre_archivo):
+
+    coincidencia = PATRON_FECHA.search(os.path.basename(nombre_archivo))
+    if coincidencia is None:
+        return None
+
+    try:
+        return datetime.date(*(int(parte) for parte in coincidencia.groups()))
+    except ValueError:
+        return None
+
+
+"""
+-----------------------------------------------------------------------
+Lista los reportes de un histórico: una carpeta o un archivo .zip con un
+reporte por día.
+
+Retorna (reportes, sin_fecha) donde 'reportes' es una lista ordenada por
+fecha de (fecha, origen). 'origen' es la ruta del archivo o la tupla
+(ruta del zip, nombre dentro del zip); así cada día se puede abrir en un
+proceso distinto.
+-----------------------------------------------------------------------
+"""
+def listar_reportes(ruta):
+
+    if zipfile.is_zipfile(ruta):
+        with zipfile.ZipFile(ruta) as archivo_zip:
+            nombres = [info.filename for info in archivo_zip.infolist() if not info.is_dir()]
+        origenes = [(nombre, (ruta, nombre)) for nombre in nombres]
+
+    else:
+        nombres = sorted(os.listdir(ruta))
+        origenes = [(nombre, os.path.join(ruta, nombre)) for nombre in nombres if os.path.isfile(os.path.join(ruta, nombre))]
+
+    reportes = []
+    sin_fecha = []
+    for nombre, origen in origenes:
+        fecha = fecha_archivo(nombre)
+        if fecha is None:
+            sin_fecha.append(nombre)
+        else:
+            reportes.append((fecha, origen))
+
+    reportes.sort(key=lambda reporte: reporte[0])
+
+    return reportes, sin_fecha
+
+
+"""
+-----------------------------------------------------------------------
+Abre el reporte de un día, ya sea un archivo o un miembro de un zip
+-----------------------------------------------------------------------
+"""
+def abrir_reporte(origen):
+
+    if isinstance(origen, tuple):
+        ruta_zip, nombre = origen
+        with zipfile.ZipFile(ruta_zip) as archivo_zip:
+            return io.BytesIO(archivo_zip.read(nombre))
+
+    return open(origen, 'rb')
+
+
+"""
+-----------------------------------------------------------------------
+Registra las ventas de un día del histórico en su propia transacción.
+
+Se ejecuta en los procesos del pool, así que recibe el id de la
+sucursal y retorna un diccionario (ambos se pueden serializar). Si el
+reporte tiene un error, se regresa en 'error' y no se registra nada de
+ese día.
+-----------------------------------------------------------------------
+"""
+def registrar_dia(sucursal_id, fecha, origen):
+
+    resultado = {'fecha': fecha, 'error': None}
+
+    try:
+        sucursal = models.Sucursal.objects.get(id=sucursal_id)
+
+        with abrir_reporte(origen) as archivo:
+            bloques_ventas = ingesta.bloques_reporte(archivo, sucursal)
+            resultado.update(ventas_consumos.registrar_por_bloques(bloques_ventas, sucursal, fecha))
+
+    except Exception as e:
+        resultado['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    return resultado
+
+
+"""
+-----------------------------------------------------------------------
+Carga el histórico de ventas de una sucursal.
+
+Los días se procesan en paralelo en un pool de 'procesos' procesos; cada
+día se registra en su propia transacción con 'bulk_create' y solo
+bloquea su fecha (ver 'ventas.bloqueos'), así que los días de la misma
+sucursal no se esperan entre sí. Con procesos=1 todo se procesa en el
+proceso actual.
+
+'al_terminar_dia' se llama con el resultado de cada día conforme van
+terminando (para mostrar el avance), así que con varios procesos los
+días no llegan en orden. Retorna el resumen del histórico, con los
+errores ordenados por fecha.
+-----------------------------------------------------------------------
+"""
+def cargar_historico(sucursal, ruta, procesos=1, al_terminar_dia=None):
+
+    inicio = time.time()
+    reportes, sin_fecha = listar_reportes(ruta)
+
+    resumen = {
+        'dias': len(reportes),
+        'dias_con_error': 0,
+        'sin_fecha': sin_fecha,
+        'renglones': 0,
+        'ventas': 0,
+        'consumos': 0,
+        'productos_no_registrados': 0,
+        'duplicados': 0,
+        'errores': [],
+    }
+
+    if procesos > 1:
+        # Cada proceso abre su propia conexión: no deben heredar la del proceso padre
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(registrar_dia, sucursal.id, fecha, origen) for fecha, origen in reportes]
+            resultados = (futuro.result() for futuro in as_completed(futuros))
+            acumular_resultados(resumen, resultados, al_terminar_dia)
+    else:
+        resultados = (registrar_dia(sucursal.id, fecha, origen) for fecha, origen in reportes)
+        acumular_resultados(resumen, resultados, al_terminar_dia)
+
+    resumen['errores'].sort(key=lambda error: error['fecha'])
+    resumen['segundos'] = round(time.time() - inicio, 2)
+
+    return resumen
+
+
+def acumular_resultados(resumen, resultados, al_terminar_dia):
+
+    for resultado in resultados:
+        if resultado['error'] is not None:
+            resumen['dias_con_error'] += 1
+            resumen['errores'].append({'fecha': resultado['fecha'], 'error': resultado['error']})
+        else:
+            for campo in ['renglones', 'ventas', 'consumos', 'productos_no_registrados', 'duplicados']:
+                resumen[campo] += resultado[campo]
+
+        if al_terminar_dia is not None:
+            al_terminar_dia(resultado)
+
+
+"""
+-----------------------------------------------------------------------
+Encola un ReporteVentas por cada día de un histórico subido como zip.
+Los workers de 'procesar_reportes_ventas' los procesan en paralelo.
+
+Retorna (reportes, duplicados, sin_fecha).
+-----------------------------------------------------------------------
+"""
+def encolar_historico(archivo_zip, sucursal, usuario=None):
+
+    reportes = []
+    duplicados = []
+    sin_fecha = []
+
+    with zipfile.ZipFile(archivo_zip) as historico:
+        for info in historico.infolist():
+            if info.is_dir():
+                continue
+
+            fecha = fecha_archivo(info.filename)
+            if fecha is None:
+                sin_fecha.append(info.filename)
+                continue
+
+            archivo = ContentFile(historico.read(info.filename), name=os.path.basename(info.filename))
+            reporte, creado = ingesta.encolar(archivo, sucursal, usuario, fecha)
+            (reportes if creado else duplicados).append(reporte)
+
+    return reportes, duplicados, sin_fecha
@@ -0,0 +1,261 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from collections import Counter
+import datetime
+import hashlib
+import traceback
+from core import models
+from ventas import bloqueos
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+from ventas.parsers import motor
+from ventas.parsers import registro
+
+
+# Minutos que debe llevar un reporte PROCESANDO para considerarlo interrumpido
+# cuando la base de datos no tiene advisory locks
+MINUTOS_INTERRUMPIDO = 30
+
+
+"""
+-----------------------------------------------------------------------
+Calcula el SHA-256 de un archivo subido leyéndolo por partes
+-----------------------------------------------------------------------
+"""
+def huella_archivo(archivo):
+
+    sha256 = hashlib.sha256()
+    for parte in archivo.chunks():
+        sha256.update(parte)
+
+    return sha256.hexdigest()
+
+
+"""
+-----------------------------------------------------------------------
+Guarda un reporte de ventas subido por el usuario y lo deja PENDIENTE
+para que lo procese el worker ('manage.py procesar_reportes_ventas').
+
+Las ventas se registran con 'fecha'. Por default es la fecha de ayer
+respecto al momento en que se sube el reporte, no al momento en que se
+procesa.
+
+Si el mismo archivo ya se subió para la sucursal (misma huella) y no
+terminó con error, no se vuelve a encolar. Con 'fecha' solo cuenta como
+duplicado si se subió para esa misma fecha: dos días de un histórico
+pueden traer reportes idénticos. Retorna (reporte, creado) igual que
+'get_or_create'.
+-----------------------------------------------------------------------
+"""
+def encolar(archivo, sucursal, usuario=None, fecha=None):
+
+    huella = huella_archivo(archivo)
+
+    reportes_existentes = models.ReporteVentas.objects.filter(sucursal=sucursal, huella=huella).exclude(estado=models.ReporteVentas.ERROR)
+    if fecha is not None:
+        reportes_existentes = reportes_existentes.filter(fecha=fecha)
+
+    reporte_existente = reportes_existentes.order_by('id').first()
+    if reporte_existente is not None:
+        return reporte_existente, False
+
+    if fecha is None:
+        fecha = datetime.date.today() - datetime.timedelta(days=1)
+
+    reporte = models.ReporteVentas(
+        sucursal=sucursal,
+        usuario=usuario,
+        nombre_archivo=archivo.name,
+        huella=huella,
+        fecha=fecha
+    )
+    reporte.archivo.save(archivo.name, archivo, save=False)
+    reporte.save()
+
+    return reporte, True
+
+
+"""
+-----------------------------------------------------------------------
+Toma el siguiente ReporteVentas PENDIENTE y lo marca como PROCESANDO.
+
+En PostgreSQL usamos 'SELECT ... FOR UPDATE SKIP LOCKED' para que varios
+workers puedan correr al mismo tiempo sin tomar el mismo reporte.
+Con 'ids' solo se toman los reportes con esos ids. Retorna None si no
+hay reportes pendientes.
+-----------------------------------------------------------------------
+"""
+def tomar_siguiente(ids=None):
+
+    with transaction.atomic():
+        pendientes = models.ReporteVentas.objects.select_for_update(skip_locked=True).filter(estado=models.ReporteVentas.PENDIENTE)
+        if ids is not None:
+            pendientes = pendientes.filter(id__in=ids)
+
+        reporte = pendientes.order_by('id').first()
+
+        if reporte is None:
+            return None
+
+        reporte.estado = models.ReporteVentas.PROCESANDO
+        reporte.timestamp_inicio = timezone.now()
+        reporte.save(update_fields=['estado', 'timestamp_inicio'])
+
+    return reporte
+
+
+"""
+-----------------------------------------------------------------------
+Regresa a PENDIENTE los reportes que se quedaron PROCESANDO (por ejemplo
+si el worker se reinició a la mitad de un reporte). Al procesarlos de
+nuevo se continúa a partir del último bloque guardado.
+
+En PostgreSQL un reporte que otro worker sigue procesando tiene tomado
+el candado de su fecha ('bloqueos.bloqueo_sucursal'), así que se
+reencolan todos los que no lo tienen, sin importar cuándo empezaron. En
+las demás bases de datos no hay forma de saberlo y solo se reencolan los
+que empezaron hace más de 'minutos' minutos.
+-----------------------------------------------------------------------
+"""
+def reencolar_interrumpidos(minutos=MINUTOS_INTERRUMPIDO):
+
+    interrumpidos = models.ReporteVentas.objects.filter(estado=models.ReporteVentas.PROCESANDO)
+
+    if bloqueos.usa_advisory_locks():
+        ids = [
+            reporte_id for reporte_id, sucursal_id, fecha in interrumpidos.values_list('id', 'sucursal_id', 'fecha')
+            if not bloqueos.sucursal_ocupada(sucursal_id, fecha)
+        ]
+    else:
+        limite = timezone.now() - datetime.timedelta(minutes=minutos)
+        ids = list(interrumpidos
+            .filter(Q(timestamp_inicio__lt=limite) | Q(timestamp_inicio__isnull=True))
+            .values_list('id', flat=True)
+        )
+
+    return (models.ReporteVentas.objects
+        .filter(id__in=ids, estado=models.ReporteVentas.PROCESANDO)
+        .update(estado=models.ReporteVentas.PENDIENTE)
+    )
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los bloques de ventas del reporte. Si el formato del reporte
+tiene especificación se lee por bloques; si no, se procesa el archivo
+completo con el parser de la sucursal como un solo bloque.
+-----------------------------------------------------------------------
+"""
+def bloques_reporte(archivo, sucursal):
+
+    especificacion = registro.detectar_especificacion(archivo, sucursal)
+
+    if especificacion is not None:
+        return motor.parsear_bloques(archivo, sucursal, especificacion, settings.VENTAS_TAMANO_BLOQUE)
+
+    resultado_parser = registro.get_parser(sucursal)(archivo, sucursal)
+    if resultado_parser['procesado'] == False:
+        raise motor.ErrorReporte('Hubo un error al procesar el reporte de ventas.')
+
+    return [resultado_parser['df_ventas']]
+
+
+"""
+-----------------------------------------------------------------------
+Procesa un ReporteVentas.
+
+Cada bloque se guarda en su propia transacción junto con el avance del
+reporte ('renglones_procesados' y los totales), así que el endpoint de
+estado ve el avance mientras se procesa el reporte. Si el proceso se
+interrumpe, los renglones ya guardados se saltan al reintentar y no se
+registran dos veces.
+
+La fecha de la sucursal queda bloqueada mientras se procesa el reporte:
+si otro reporte de la misma sucursal y la misma fecha se está
+procesando, espera a que termine.
+-----------------------------------------------------------------------
+"""
+def procesar(reporte):
+
+    sucursal = reporte.sucursal
+    cajas = {}
+    ocurrencias = Counter()
+    saltar = reporte.renglones_procesados
+
+    try:
+        with bloqueos.bloqueo_sucursal(sucursal.id, reporte.fecha), reporte.archivo.open('rb') as archivo:
+
+            matriz = matriz_recetas.get_matriz(sucursal, reporte.fecha)
+
+            for df_ventas in bloques_reporte(archivo, sucursal):
+
+                # Saltamos los renglones que ya se guardaron en un intento anterior
+                if saltar > 0:
+                    guardados = min(saltar, len(df_ventas))
+                    # Contamos sus ocurrencias para que las huellas de los siguientes renglones no cambien
+                    ventas_consumos.huellas_renglones(df_ventas.iloc[:guardados], reporte.fecha, ocurrencias)
+                    df_ventas = df_ventas.iloc[guardados:]
+                    saltar -= guardados
+
+                if len(df_ventas) == 0:
+                    continue
+
+                with transaction.atomic():
+                    bloqueos.bloquear_sucursal(sucursal.id, reporte.fecha)
+                    totales = ventas_consumos.cargar_bloque(df_ventas, sucursal, matriz, reporte.fecha, cajas, ocurrencias)
+
+                    models.ReporteVentas.objects.filter(id=reporte.id).update(
+                        bloques_procesados=F('bloques_procesados') + 1,
+                        renglones_procesados=F('renglones_procesados') + len(df_ventas),
+                        ventas_registradas=F('ventas_registradas') + totales['ventas'],
+                        consumos_registrados=F('consumos_registrados') + totales['consumos'],
+                        productos_no_registrados=F('productos_no_registrados') + totales['productos_no_registrados'],
+                        renglones_duplicados=F('renglones_duplicados') + totales['duplicados']
+                    )
+
+    # Si hay un error lo guardamos en el reporte para mostrarlo en el endpoint de estado
+    except Exception:
+        models.ReporteVentas.objects.filter(id=reporte.id).update(
+            estado=models.ReporteVentas.ERROR,
+            errores=traceback.format_exc(),
+            timestamp_fin=timezone.now()
+        )
+
+    else:
+        models.ReporteVentas.objects.filter(id=reporte.id).update(
+            estado=models.ReporteVentas.TERMINADO,
+            timestamp_fin=timezone.now()
+        )
+
+    reporte.refresh_from_db()
+
+    return reporte
+
+
+"""
+-----------------------------------------------------------------------
+Retorna el estado de un ReporteVentas para el endpoint de estado
+-----------------------------------------------------------------------
+"""
+def estado_reporte(reporte):
+
+    return {
+        'id': reporte.id,
+        'sucursal': reporte.sucursal_id,
+        'archivo': reporte.nombre_archivo,
+        'fecha': reporte.fecha,
+        'estado': reporte.get_estado_display(),
+        'timestamp_alta': reporte.timestamp_alta,
+        'timestamp_inicio': reporte.timestamp_inicio,
+        'timestamp_fin': reporte.timestamp_fin,
+        'bloques_procesados': reporte.bloques_procesados,
+        'renglones_procesados': reporte.renglones_procesados,
+        'ventas_registradas': reporte.ventas_registradas,
+        'consumos_registrados': reporte.consumos_registrados,
+        'productos_no_registrados': reporte.productos_no_registrados,
+        'renglones_duplicados': reporte.renglones_duplicados,
+        'errores': reporte.errores,
+    }
@@ -0,0 +1,214 @@
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+import numpy as np
+import pandas as pd
+from core import models
+
+
+# Los recetarios casi no cambian y la matriz se guarda con el sello de las recetas con las que se
+# construyó (ver 'sello_recetas'), así que podemos guardarla por un día completo
+TIMEOUT_MATRIZ = 60 * 60 * 24
+
+
+"""
+-----------------------------------------------------------------------
+Matriz dispersa RECETA x INGREDIENTE de una sucursal (formato CSR).
+
+Cada fila es una receta y cada columna un ingrediente; el valor de la
+celda es el volumen en ml del ingrediente que lleva la receta. Convertir
+ventas en consumo de ingredientes es entonces un producto de matrices:
+
+    unidades vendidas por receta  x  ml por ingrediente
+
+- codigos: {codigo_pos: fila}
+- recetas: Recetas ordenadas por fila
+- ingredientes: Ingredientes ordenados por columna
+- indptr, indices, data: arreglos CSR de NumPy
+- fecha: None si tiene los volúmenes de la receta actual, o la fecha
+  de los volúmenes de sus versiones
+-----------------------------------------------------------------------
+"""
+class MatrizRecetas:
+
+    def __init__(self, recetas, ingredientes, indptr, indices, data, fecha=None):
+        self.recetas = recetas
+        self.ingredientes = ingredientes
+        self.ingredientes_ids = np.array([ingrediente.id for ingrediente in ingredientes], dtype=np.int64)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.fecha = fecha
+
+        # Si hay códigos POS repetidos nos quedamos con la receta más antigua
+        self.codigos = {}
+        for fila, receta in enumerate(recetas):
+            self.codigos.setdefault(receta.codigo_pos, fila)
+
+
+    def buscar_filas(self, codigos_pos):
+        """
+        Retorna un arreglo con la fila de cada código POS (-1 si no existe la receta)
+        """
+        codigos = pd.Series(codigos_pos).astype(str)
+        filas = codigos.map(self.codigos).fillna(-1)
+
+        return filas.to_numpy(dtype=np.int64)
+
+
+    def explotar(self, filas, unidades):
+        """
+        Multiplica las unidades vendidas de cada renglón por los ml de su receta.
+
+        Retorna tres arreglos paralelos (uno por cada consumo generado):
+        - renglon: posición del renglón de venta que generó el consumo
+        - columna: columna del ingrediente consumido
+        - volumen: ml consumidos
+        """
+        filas = np.asarray(filas, dtype=np.int64)
+        unidades = np.asarray(unidades, dtype=np.int64)
+
+        # Número de ingredientes de la receta de cada renglón
+        inicio = self.indptr[filas]
+        cantidad = self.indptr[filas + 1] - inicio
+        total = int(cantidad.sum())
+
+        # Posición de cada consumo dentro de los arreglos CSR
+        renglon = np.repeat(np.arange(len(filas), dtype=np.int64), cantidad)
+        desplazamiento = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+        posiciones = np.repeat(inicio, cantidad) + desplazamiento
+
+        columna = self.indices[posiciones]
+        volumen = self.data[posiciones] * np.repeat(unidades, cantidad)
+
+        return renglon, columna, volumen
+
+
+    def consumo_total(self, filas, unidades):
+        """
+        Retorna un arreglo con los ml totales consumidos de cada ingrediente (por columna)
+        """
+        renglon, columna, volumen = self.explotar(filas, unidades)
+
+        return np.bincount(columna, weights=volumen, minlength=len(self.ingredientes)).astype(np.int64)
+
+
+"""
+-----------------------------------------------------------------------
+Construye la matriz de recetas de una sucursal con tres queries.
+
+Con 'fecha', cada ingrediente que tiene versiones (ver
+'ventas.versiones_recetas') toma el volumen de la versión vigente en esa
+fecha en lugar del de la receta actual.
+-----------------------------------------------------------------------
+"""
+def construir_matriz(sucursal_id, fecha=None):
+
+    recetas = list(models.Receta.objects.filter(sucursal__id=sucursal_id).order_by('id'))
+    filas_receta = {receta.id: fila for fila, receta in enumerate(recetas)}
+
+    volumenes = {
+        (receta_id, ingrediente_id): volumen
+        for receta_id, ingrediente_id, volumen in models.IngredienteReceta.objects.filter(receta__sucursal__id=sucursal_id).values_list('receta_id', 'ingrediente_id', 'volumen')
+    }
+
+    if fecha is not None:
+        versiones = (models.VersionIngredienteReceta.objects
+            .filter(receta__sucursal__id=sucursal_id, fecha_inicial__lte=fecha)
+            .order_by('fecha_inicial')
+            .values_list('receta_id', 'ingrediente_id', 'volumen')
+        )
+        # Las versiones vienen en orden, así que se queda la última que ya había empezado
+        for receta_id, ingrediente_id, volumen in versiones:
+            if volumen > 0:
+                volumenes[(receta_id, ingrediente_id)] = volumen
+            else:
+                # Volumen 0: la receta no llevaba el ingrediente en esa fecha
+                volumenes.pop((receta_id, ingrediente_id), None)
+
+    volumenes = sorted(volumenes.items())
+    objetos_ingredientes = models.Ingrediente.objects.in_bulk(set(ingrediente_id for (receta_id, ingrediente_id), volumen in volumenes))
+
+    ingredientes = []
+    columnas = {}
+    conteo = np.zeros(len(recetas) + 1, dtype=np.int64)
+    indices = []
+    data = []
+
+    for (receta_id, ingrediente_id), volumen in volumenes:
+        if ingrediente_id not in columnas:
+            columnas[ingrediente_id] = len(ingredientes)
+            ingredientes.append(objetos_ingredientes[ingrediente_id])
+
+        conteo[filas_receta[receta_id] + 1] += 1
+        indices.append(columnas[ingrediente_id])
+        data.append(volumen)
+
+    indptr = np.cumsum(conteo)
+    indices = np.array(indices, dtype=np.int64)
+    data = np.array(data, dtype=np.int64)
+
+    return MatrizRecetas(recetas, ingredientes, indptr, indices, data, fecha)
+
+
+def clave_matriz(sucursal_id):
+    return 'matriz_recetas_{}'.format(sucursal_id)
+
+
+"""
+-----------------------------------------------------------------------
+Retorna el sello de las recetas de la sucursal: cuántas Recetas e
+IngredientesReceta tiene y cuándo se modificó el último de cada uno
+('timestamp_update'), con un solo query.
+
+Cambia con cualquier alta, cambio o baja, aunque se haga en otro
+proceso (el cache por default es local a cada proceso y las señales de
+'ventas.signals' solo lo invalidan en el proceso donde ocurren) o con un
+'bulk_create'. Un '.update()' sobre Receta o IngredienteReceta debe
+asignar también 'timestamp_update'.
+-----------------------------------------------------------------------
+"""
+def sello_recetas(sucursal_id):
+
+    sello = models.Receta.objects.filter(sucursal__id=sucursal_id).aggregate(
+        recetas=Count('id', distinct=True),
+        receta_update=Max('timestamp_update'),
+        ingredientes=Count('ingredientereceta'),
+        ingrediente_update=Max('ingredientereceta__timestamp_update')
+    )
+
+    return (sello['recetas'], sello['receta_update'], sello['ingredientes'], sello['ingrediente_update'])
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la matriz de recetas de la sucursal desde el cache. Si no está
+en el cache o su sello ya no es el de las recetas de la sucursal, la
+construimos y la guardamos.
+
+Las ventas se cargan con la matriz de su 'fecha': si alguna receta de la
+sucursal tiene una versión posterior a 'fecha', la receta actual no es
+la que valía ese día y construimos (sin guardarla en el cache) la matriz
+con los volúmenes vigentes en 'fecha'.
+-----------------------------------------------------------------------
+"""
+def get_matriz(sucursal, fecha=None):
+
+    if fecha is not None and models.VersionIngredienteReceta.objects.filter(receta__sucursal__id=sucursal.id, fecha_inicial__gt=fecha).exists():
+        return construir_matriz(sucursal.id, fecha)
+
+    clave = clave_matriz(sucursal.id)
+    sello = sello_recetas(sucursal.id)
+    guardada = cache.get(clave)
+
+    if guardada is not None and guardada[0] == sello:
+        return guardada[1]
+
+    matriz = construir_matriz(sucursal.id)
+    cache.set(clave, (sello, matriz), TIMEOUT_MATRIZ)
+
+    return matriz
+
+
+def invalidar_matriz(sucursal_id):
+    cache.delete(clave_matriz(sucursal_id))
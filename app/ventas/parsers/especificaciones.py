@@ -0,0 +1,153 @@
+"""
+-----------------------------------------------------------------------
+ESPECIFICACIONES DE LOS REPORTES DE VENTAS DE CADA SUCURSAL
+
+Cada sucursal se identifica con su slug y describe su reporte de ventas
+con un diccionario que interpreta 'ventas.parsers.motor':
+
+- 'lector': 'excel' o 'csv'
+- 'opciones': parámetros para 'pd.read_excel' o 'pd.read_csv'
+- 'columnas': {columna del reporte: columna del dataframe}. Las
+  ventas se reparten entre las cajas con cualquiera de estas columnas
+  (ver MapeoCaja), por default 'categoria'. Si el reporte trae la caja o
+  terminal del punto de venta, se toma como 'terminal'.
+- 'copiar': {columna nueva: columna existente}
+- 'requeridos': columnas que no pueden ser NaN
+- 'excluir': {columna: [textos]} Se eliminan los renglones cuya columna
+  contenga cualquiera de los textos
+- 'numericos': {columna: 'truncar' | 'redondear'}
+- 'descartar_ceros': columnas donde un 0 elimina el renglón
+- 'barra': nombre del almacén cuya caja registra las ventas (None toma
+  el primer almacén de la sucursal)
+- 'firma': textos del renglón de encabezados que identifican el formato
+  (opcional; por default, los nombres de 'columnas' cuando son texto)
+
+Para dar de alta un restaurante nuevo basta con agregar su entrada.
+-----------------------------------------------------------------------
+"""
+# Códigos POS de Magno Brasserie que no son bebidas con alcohol
+EXCLUIR_MAGNO = [
+    'PF',   # Platillos Fuertes
+    'ENT',  # Entradas
+    'BEB',  # Bebidas Sin Alcohol
+    'POS',  # Postres
+    'CHA',  # Charcuteria
+    'REF',  # Refrescos
+    'CVZ',  # Cervezas
+    'PAS',  # Pastas
+    'COR',  # Cortesias
+    'MEN',  # Menus
+    'PC',
+    'BVT',  # Botellas de Vino Tinto
+    'BVB',  # Botellas de Vino Blanco
+    'BVR',  # Botellas de Vino Rosado
+    'BVE',  # Botellas de Vino Espumoso
+    'CVT',  # Copas de Vino Tinto
+    'CVB',  # Copas de Vino Blanco
+    'CVR',  # Copas de Vino Rosado
+    'CVE',  # Copas de Vino Espumoso
+    'CVD',  # Copas de Vino Dulce
+    'EXT',
+    'CIG',  # Cigarros
+    'DES',  # Descorche
+]
+
+
+ESPECIFICACIONES = {
+
+    'MAGNO-BRASSERIE': {
+        'lector': 'excel',
+        'opciones': {'header': None, 'skiprows': 9, 'skipfooter': 5, 'engine': 'xlrd'},
+        'columnas': {1: 'codigo_pos', 2: 'nombre', 3: 'unidades', 5: 'importe'},
+        'firma': ['Codigo Producto', 'Nom Producto', 'Cantidad', 'Monto'],
+        'requeridos': [],
+        'excluir': {'codigo_pos': EXCLUIR_MAGNO},
+        'numericos': {'unidades': 'truncar', 'importe': 'truncar'},
+        'descartar_ceros': [],
+        'barra': None,
+    },
+
+    'GAMBINOS-SAOPAULO': {
+        'lector': 'excel',
+        'opciones': {'header': None, 'skiprows': 1, 'dtype': object, 'engine': 'xlrd'},
+        'columnas': {3: 'nombre', 5: 'codigo_pos', 6: 'categoria', 7: 'subcat', 8: 'unidades', 10: 'importe'},
+        'firma': ['Nombre', 'Código de barras', 'Categoría de productos', 'Cant.', 'Total Ventas'],
+        'requeridos': ['categoria', 'codigo_pos'],
+        'excluir': {
+            'categoria': ['Comida'],
+            'subcat': ['NO Alcoholico', 'Cervezas'],
+        },
+        'numericos': {'unidades': 'truncar', 'importe': 'truncar'},
+        'descartar_ceros': [],
+        'barra': 'BARRA 1',
+    },
+
+    'PECOS': {
+        'lector': 'excel',
+        'opciones': {'header': 4, 'skipfooter': 1, 'dtype': {'CLAVE': str, 'VENTA_TOTAL': str}, 'engine': 'xlrd'},
+        'columnas': {'CLAVE': 'codigo_pos', 'DESCRIPCION': 'nombre', 'GRUPO': 'categoria', 'CANTIDAD': 'unidades', 'VENTA_TOTAL': 'importe'},
+        'requeridos': [],
+        'excluir': {
+            'categoria': ['REFRESCOS', 'CERVEZAS'],
+        },
+        'numericos': {'unidades': 'truncar', 'importe': 'truncar'},
+        'descartar_ceros': ['unidades'],
+        'barra': 'BARRA 1',
+    },
+
+    'KINKIN': {
+        'lector': 'csv',
+        'opciones': {'lineterminator': '\r'},
+        'columnas': {'Division': 'categoria', 'Producto': 'nombre', 'Cantidad': 'unidades', 'Total': 'importe'},
+        # El reporte no trae código POS, usamos el nombre del producto
+        'copiar': {'codigo_pos': 'nombre'},
+        'requeridos': ['nombre'],
+        'excluir': {
+            'categoria': ['CERVEZA/Be', 'SIN ALCOHOL', 'ENERGY DRINKS'],
+        },
+        'numericos': {'unidades': 'redondear', 'importe': 'truncar'},
+        'descartar_ceros': [],
+        'barra': 'BARRA 1',
+    },
+
+    'DEMO': {
+        'lector': 'csv',
+        'opciones': {},
+        'columnas': {'codigo_pos': 'codigo_pos', 'nombre': 'nombre', 'unidades': 'unidades', 'importe': 'importe'},
+        'requeridos': [],
+        'excluir': {},
+        'numericos': {},
+        'descartar_ceros': [],
+        'barra': 'BARRA DEMO',
+    },
+
+}
+
+
+"""
+-----------------------------------------------------------------------
+FORMATOS ALTERNOS
+
+Cuando una sucursal cambia la forma de exportar su reporte (por ejemplo
+de .xls a .csv), su formato nuevo se agrega aquí. Al subir un reporte se
+reconoce el formato por su firma y se usa la especificación que
+corresponda (ver 'ventas.parsers.firmas').
+-----------------------------------------------------------------------
+"""
+ALTERNOS = {
+
+    'MAGNO-BRASSERIE': [
+        {
+            'lector': 'csv',
+            'opciones': {'dtype': {'Código': str}},
+            'columnas': {'Código': 'codigo_pos', 'Descripción': 'nombre', 'Cantidad': 'unidades', 'Monto': 'importe'},
+            'firma': ['Código', 'Descripción', '%', 'Cantidad', 'Monto'],
+            'requeridos': ['codigo_pos'],
+            'excluir': {'codigo_pos': EXCLUIR_MAGNO},
+            'numericos': {'unidades': 'truncar', 'importe': 'truncar'},
+            'descartar_ceros': [],
+            'barra': None,
+        },
+    ],
+
+}
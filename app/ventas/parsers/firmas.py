@@ -0,0 +1,172 @@
+import csv
+import io
+import unicodedata
+import openpyxl
+import xlrd
+
+
+# Bytes y renglones que revisamos para reconocer el formato de un reporte
+TAMANO_MUESTRA = 64 * 1024
+RENGLONES_MUESTRA = 20
+
+FIRMA_XLS = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+FIRMA_XLSX = b'PK\x03\x04'
+
+
+"""
+-----------------------------------------------------------------------
+Lee los primeros 'tamano' bytes del archivo sin mover su posición
+-----------------------------------------------------------------------
+"""
+def leer_inicio(archivo, tamano=TAMANO_MUESTRA):
+
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            return f.read(tamano)
+
+    posicion = archivo.tell()
+    inicio = archivo.read(tamano)
+    archivo.seek(posicion)
+
+    return inicio
+
+
+"""
+-----------------------------------------------------------------------
+Retorna el tipo de contenedor del archivo por sus primeros bytes: 'xls'
+(OLE2), 'xlsx' (ZIP) o 'csv' (texto). No confiamos en la extensión: hay
+puntos de venta que exportan un .xlsx con extensión '.XLS'.
+-----------------------------------------------------------------------
+"""
+def tipo_archivo(inicio):
+
+    if inicio.startswith(FIRMA_XLS):
+        return 'xls'
+
+    if inicio.startswith(FIRMA_XLSX):
+        return 'xlsx'
+
+    return 'csv'
+
+
+def renglones_csv(inicio):
+
+    try:
+        texto = inicio.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texto = inicio.decode('latin-1')
+
+    # El último renglón de la muestra puede venir cortado
+    lineas = texto.splitlines()[:RENGLONES_MUESTRA]
+
+    return list(csv.reader(lineas))
+
+
+def renglones_xlsx(archivo):
+
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            return renglones_xlsx(f)
+
+    posicion = archivo.tell()
+    wb = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+
+    try:
+        return [list(renglon) for renglon in wb.worksheets[0].iter_rows(max_row=RENGLONES_MUESTRA, values_only=True)]
+    finally:
+        wb.close()
+        archivo.seek(posicion)
+
+
+def renglones_xls(archivo):
+
+    # El formato OLE2 no se puede leer por partes, pero solo convertimos los
+    # primeros renglones de la primera hoja
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+    else:
+        posicion = archivo.tell()
+        contenido = archivo.read()
+        archivo.seek(posicion)
+
+    wb = xlrd.open_workbook(file_contents=contenido, on_demand=True, logfile=io.StringIO())
+
+    try:
+        hoja = wb.sheet_by_index(0)
+        return [hoja.row_values(i) for i in range(min(hoja.nrows, RENGLONES_MUESTRA))]
+    finally:
+        wb.release_resources()
+
+
+"""
+-----------------------------------------------------------------------
+Normaliza el texto de una celda para comparar encabezados: sin acentos,
+sin espacios a los lados y en mayúsculas ('Código ' -> 'CODIGO')
+-----------------------------------------------------------------------
+"""
+def normalizar(valor):
+
+    if valor is None:
+        return ''
+
+    texto = unicodedata.normalize('NFKD', str(valor))
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+
+    return texto.strip().upper()
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los encabezados que identifican el formato de una
+especificación: su 'firma' o, si no tiene, los nombres de sus columnas
+-----------------------------------------------------------------------
+"""
+def encabezados(especificacion):
+
+    firma = especificacion.get('firma')
+    if firma is None:
+        firma = [columna for columna in especificacion['columnas'] if isinstance(columna, str)]
+
+    return {normalizar(texto) for texto in firma}
+
+
+"""
+-----------------------------------------------------------------------
+Reconoce el formato de un reporte de ventas.
+
+Lee solo el inicio del archivo, saca sus primeros renglones y busca la
+primera especificación de 'especificaciones' cuyo lector corresponde al
+tipo de archivo y cuyos encabezados aparecen todos en un mismo renglón.
+Retorna None si ninguna coincide.
+-----------------------------------------------------------------------
+"""
+def detectar(archivo, especificaciones):
+
+    tipo = tipo_archivo(leer_inicio(archivo, len(FIRMA_XLS)))
+    lector = 'csv' if tipo == 'csv' else 'excel'
+
+    candidatas = [especificacion for especificacion in especificaciones if especificacion['lector'] == lector]
+    if not candidatas:
+        return None
+
+    try:
+        if tipo == 'csv':
+            renglones = renglones_csv(leer_inicio(archivo))
+        elif tipo == 'xlsx':
+            renglones = renglones_xlsx(archivo)
+        else:
+            renglones = renglones_xls(archivo)
+
+    # Un archivo dañado no coincide con ningún formato
+    except Exception:
+        return None
+
+    celdas_renglones = [{normalizar(valor) for valor in renglon} for renglon in renglones]
+
+    for especificacion in candidatas:
+        firma = encabezados(especificacion)
+        if firma and any(firma <= celdas for celdas in celdas_renglones):
+            return especificacion
+
+    return None
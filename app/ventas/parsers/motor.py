@@ -0,0 +1,530 @@
+import re
+from collections import deque
+import numpy as np
+import pandas as pd
+import openpyxl
+import xlrd
+from core import models
+from ventas.parsers.especificaciones import ESPECIFICACIONES
+
+
+COLUMNAS_VENTAS = ['sucursal_id', 'caja_id', 'codigo_pos', 'nombre', 'unidades', 'importe']
+
+# Renglones por bloque al leer un reporte de Excel completo
+TAMANO_BLOQUE_EXCEL = 5000
+
+# Especificaciones ya compiladas (por id del diccionario de la especificación)
+_compiladas = {}
+
+
+class ErrorReporte(Exception):
+    """ El reporte de ventas no se pudo leer o no cumple con su especificación """
+    pass
+
+
+"""
+-----------------------------------------------------------------------
+Compila una especificación de reporte de ventas.
+
+Los textos a excluir de cada columna se juntan en una sola expresión
+regular ('PF|ENT|BEB|...') para filtrar el dataframe con una sola
+pasada en lugar de un 'str.contains' por cada texto.
+-----------------------------------------------------------------------
+"""
+def compilar(especificacion):
+
+    clave = id(especificacion)
+    compilada = _compiladas.get(clave)
+
+    if compilada is None:
+        exclusiones = {
+            columna: re.compile('|'.join(re.escape(texto) for texto in textos))
+            for columna, textos in especificacion.get('excluir', {}).items()
+            if textos
+        }
+        compilada = {'especificacion': especificacion, 'exclusiones': exclusiones}
+        _compiladas[clave] = compilada
+
+    return compilada
+
+
+"""
+-----------------------------------------------------------------------
+Lee el archivo del reporte de ventas tal como viene del punto de venta.
+Los reportes de Excel se leen con el mismo lector por bloques que la
+carga (ver 'leer_bloques') y solo traen las columnas que se usan.
+-----------------------------------------------------------------------
+"""
+def leer(archivo, especificacion):
+
+    opciones = especificacion.get('opciones', {})
+
+    if especificacion['lector'] == 'excel':
+        bloques = list(leer_bloques(archivo, especificacion, TAMANO_BLOQUE_EXCEL))
+        return pd.concat(bloques) if bloques else pd.DataFrame(columns=list(especificacion['columnas']))
+
+    return pd.read_csv(archivo, **opciones)
+
+
+"""
+-----------------------------------------------------------------------
+Checa si el archivo es un Excel moderno (.xlsx), que es un ZIP
+-----------------------------------------------------------------------
+"""
+def es_xlsx(archivo):
+
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            firma = f.read(4)
+    else:
+        posicion = archivo.tell()
+        firma = archivo.read(4)
+        archivo.seek(posicion)
+
+    return firma == b'PK\x03\x04'
+
+
+"""
+-----------------------------------------------------------------------
+Retiene los últimos 'filas_pie' renglones de una secuencia de bloques.
+
+Equivale a 'skipfooter' pero sin conocer de antemano el tamaño del
+archivo: siempre guardamos el final del bloque anterior hasta saber si
+vienen más renglones.
+-----------------------------------------------------------------------
+"""
+def retener_pie(bloques, filas_pie):
+
+    if not filas_pie:
+        yield from bloques
+        return
+
+    pendiente = None
+    for bloque in bloques:
+        if pendiente is not None:
+            bloque = pd.concat([pendiente, bloque])
+
+        pendiente = bloque.iloc[-filas_pie:]
+        if len(bloque) > filas_pie:
+            yield bloque.iloc[:-filas_pie]
+
+
+"""
+-----------------------------------------------------------------------
+Retiene los últimos 'filas_pie' renglones crudos de la hoja. Igual que
+'skipfooter' de pandas, cuenta también los renglones vacíos del pie.
+-----------------------------------------------------------------------
+"""
+def retener_pie_renglones(renglones, filas_pie):
+
+    if not filas_pie:
+        yield from renglones
+        return
+
+    pendientes = deque()
+    for renglon in renglones:
+        pendientes.append(renglon)
+        if len(pendientes) > filas_pie:
+            yield pendientes.popleft()
+
+
+"""
+-----------------------------------------------------------------------
+Renglones de la primera hoja de un .xlsx con el modo 'read_only' de
+openpyxl: el XML de la hoja se lee conforme se piden los renglones.
+-----------------------------------------------------------------------
+"""
+def renglones_xlsx(archivo):
+
+    # openpyxl rechaza las rutas con extensión '.xls' aunque el archivo sea un
+    # .xlsx (como los reportes de algunos puntos de venta), así que le pasamos
+    # el archivo abierto
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            yield from renglones_xlsx(f)
+        return
+
+    wb = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+"""
+-----------------------------------------------------------------------
+Convierte una celda de xlrd al mismo valor que 'pd.read_excel': los
+números enteros como int, las fechas como datetime y las celdas vacías
+o con error como None.
+-----------------------------------------------------------------------
+"""
+def valor_xls(tipo, valor, datemode):
+
+    if tipo == xlrd.XL_CELL_NUMBER:
+        return int(valor) if valor == int(valor) else valor
+
+    if tipo in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR) or valor == '':
+        return None
+
+    if tipo == xlrd.XL_CELL_DATE:
+        return xlrd.xldate.xldate_as_datetime(valor, datemode)
+
+    if tipo == xlrd.XL_CELL_BOOLEAN:
+        return bool(valor)
+
+    return valor
+
+
+"""
+-----------------------------------------------------------------------
+Renglones de la primera hoja de un .xls. Con 'on_demand' xlrd solo
+carga la hoja que leemos y no el libro completo; al terminar liberamos
+la hoja.
+-----------------------------------------------------------------------
+"""
+def renglones_xls(archivo):
+
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+    else:
+        contenido = archivo.read()
+
+    libro = xlrd.open_workbook(file_contents=contenido, on_demand=True)
+    del contenido
+
+    try:
+        hoja = libro.sheet_by_index(0)
+        for i in range(hoja.nrows):
+            yield tuple(valor_xls(tipo, valor, libro.datemode) for tipo, valor in zip(hoja.row_types(i), hoja.row_values(i)))
+    finally:
+        libro.release_resources()
+
+
+"""
+-----------------------------------------------------------------------
+Arma el dataframe de un bloque de renglones con las columnas del
+reporte que usa la especificación. Las columnas quedan tipadas (int,
+float u object) igual que con 'pd.read_excel'.
+-----------------------------------------------------------------------
+"""
+def armar_bloque(bloque, columnas, dtype, desplazamiento):
+
+    df = pd.DataFrame(bloque, columns=columnas, dtype=object)
+    df.index = pd.RangeIndex(desplazamiento, desplazamiento + len(df))
+
+    if dtype is object:
+        return df
+
+    # Convertimos a texto antes de inferir los tipos para que un NaN no
+    # convierta los códigos en flotantes ('14001' -> '14001.0')
+    if isinstance(dtype, dict):
+        for columna, tipo in dtype.items():
+            if columna in df.columns and tipo is str:
+                df[columna] = df[columna].astype(object).where(df[columna].isnull(), df[columna].astype(str))
+
+    return df.infer_objects()
+
+
+"""
+-----------------------------------------------------------------------
+Lee los renglones crudos de una hoja de Excel en bloques de
+'tamano_bloque' renglones, con las mismas reglas que 'pd.read_excel'
+('skiprows', 'header', 'skipfooter', 'dtype').
+
+El encabezado y el pie se saltan sin armar dataframes y cada bloque
+solo trae las columnas de 'columnas' (posiciones si 'header' es None,
+nombres del encabezado si no), así que la memoria depende del tamaño del
+bloque y del número de columnas que usamos, no del tamaño de la hoja.
+-----------------------------------------------------------------------
+"""
+def leer_bloques_excel(renglones, opciones, columnas, tamano_bloque):
+
+    # Saltamos los renglones iniciales y tomamos los encabezados
+    header = opciones.get('header', 0)
+    inicio = (opciones.get('skiprows') or 0) + (header or 0)
+    for i in range(inicio):
+        next(renglones, None)
+
+    if header is not None:
+        encabezados = list(next(renglones, ()))
+        faltantes = [columna for columna in columnas if columna not in encabezados]
+        if faltantes:
+            raise ValueError('El reporte no tiene las columnas: {}'.format(', '.join(str(columna) for columna in faltantes)))
+        posiciones = [encabezados.index(columna) for columna in columnas]
+    else:
+        posiciones = list(columnas)
+
+    dtype = opciones.get('dtype')
+    desplazamiento = 0
+    bloque = []
+
+    for renglon in retener_pie_renglones(renglones, opciones.get('skipfooter', 0)):
+        # Igual que pandas, ignoramos los renglones vacíos
+        if all(valor is None for valor in renglon):
+            continue
+
+        # Los renglones pueden traer menos celdas que los encabezados (p. ej. el
+        # renglón de totales); las celdas que faltan quedan como NaN
+        ancho = len(renglon)
+        bloque.append(tuple(renglon[posicion] if posicion < ancho else None for posicion in posiciones))
+
+        if len(bloque) == tamano_bloque:
+            yield armar_bloque(bloque, columnas, dtype, desplazamiento)
+            desplazamiento += len(bloque)
+            bloque = []
+
+    if bloque:
+        yield armar_bloque(bloque, columnas, dtype, desplazamiento)
+
+
+"""
+-----------------------------------------------------------------------
+Lee el reporte de ventas en bloques de 'tamano_bloque' renglones.
+
+- CSV: 'pd.read_csv' con 'chunksize'
+- XLSX: iterador de renglones de openpyxl (modo 'read_only')
+- XLS: xlrd con 'on_demand' (solo la primera hoja)
+
+Los reportes de Excel solo traen las columnas que usa la especificación.
+La memoria depende del tamaño del bloque y no del tamaño del archivo.
+-----------------------------------------------------------------------
+"""
+def leer_bloques(archivo, especificacion, tamano_bloque):
+
+    opciones = dict(especificacion.get('opciones', {}))
+
+    if especificacion['lector'] == 'csv':
+        filas_pie = opciones.pop('skipfooter', 0)
+        return retener_pie(pd.read_csv(archivo, chunksize=tamano_bloque, **opciones), filas_pie)
+
+    renglones = renglones_xlsx(archivo) if es_xlsx(archivo) else renglones_xls(archivo)
+
+    return leer_bloques_excel(renglones, opciones, list(especificacion['columnas']), tamano_bloque)
+
+
+"""
+-----------------------------------------------------------------------
+Convierte una columna a INT de forma vectorizada.
+
+- 'truncar': elimina los decimales (equivale a cortar el texto en el '.')
+- 'redondear': redondea al entero más cercano
+
+Los textos con formato de moneda ('$1,950.00') se limpian antes de
+convertirlos. Un valor vacío o no numérico arroja ValueError.
+-----------------------------------------------------------------------
+"""
+def convertir_entero(columna, regla):
+
+    if columna.dtype == object:
+        columna = columna.astype(str).str.replace(r'[$,]', '', regex=True)
+
+    numeros = pd.to_numeric(columna).to_numpy(dtype=np.float64)
+
+    if regla == 'redondear':
+        numeros = np.round(numeros)
+    else:
+        numeros = np.trunc(numeros)
+
+    if np.isnan(numeros).any():
+        raise ValueError('La columna "{}" tiene valores vacíos.'.format(columna.name))
+
+    return pd.Series(numeros.astype(np.int64), index=columna.index, name=columna.name)
+
+
+"""
+-----------------------------------------------------------------------
+Retorna una máscara con los renglones cuya columna contiene el patrón.
+Los valores que no son texto (NaN, números) nunca coinciden.
+-----------------------------------------------------------------------
+"""
+def contiene(columna, patron):
+
+    try:
+        return columna.astype(object).str.contains(patron, na=False).to_numpy(dtype=bool)
+
+    # Un bloque sin textos (p. ej. una columna de puros NaN) no tiene nada que excluir
+    except AttributeError:
+        return np.zeros(len(columna), dtype=bool)
+
+
+"""
+-----------------------------------------------------------------------
+Aplica una especificación a un dataframe leído del reporte de ventas y
+retorna el dataframe de ventas con las columnas:
+
+'sucursal_id', 'caja_id', 'codigo_pos', 'nombre', 'unidades', 'importe'
+-----------------------------------------------------------------------
+"""
+def procesar(df_reporte, especificacion, sucursal_id, caja_id, mapeo_cajas=None):
+
+    compilada = compilar(especificacion)
+
+    # Tomamos y renombramos solo las columnas que nos interesan
+    columnas = especificacion['columnas']
+    df_ventas = df_reporte.loc[:, list(columnas.keys())]
+    df_ventas.columns = list(columnas.values())
+
+    copias = {nueva: df_ventas[existente] for nueva, existente in especificacion.get('copiar', {}).items()}
+    df_ventas = df_ventas.assign(**copias)
+
+    # Construimos una sola máscara con todos los renglones a eliminar
+    eliminar = np.zeros(len(df_ventas), dtype=bool)
+
+    for columna in especificacion.get('requeridos', []):
+        eliminar |= df_ventas[columna].isnull().to_numpy()
+
+    for columna, patron in compilada['exclusiones'].items():
+        eliminar |= contiene(df_ventas[columna], patron)
+
+    df_ventas = df_ventas.loc[~eliminar, :]
+
+    # Convertimos las columnas numéricas a INT
+    numericos = especificacion.get('numericos', {})
+    df_ventas = df_ventas.assign(**{columna: convertir_entero(df_ventas[columna], regla) for columna, regla in numericos.items()})
+
+    # Eliminamos los renglones con ceros
+    descartar_ceros = especificacion.get('descartar_ceros', [])
+    if descartar_ceros:
+        df_ventas = df_ventas.loc[(df_ventas[descartar_ceros] != 0).all(axis=1), :]
+
+    # Repartimos los renglones entre las cajas de la sucursal
+    if mapeo_cajas:
+        caja_id = asignar_cajas(df_ventas, mapeo_cajas, caja_id)
+
+    # Añadimos las columnas 'sucursal_id' y 'caja_id' y ordenamos las columnas
+    df_ventas = df_ventas.assign(sucursal_id=sucursal_id, caja_id=caja_id)
+
+    return df_ventas.reindex(columns=COLUMNAS_VENTAS)
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la caja que registra las ventas de la sucursal
+-----------------------------------------------------------------------
+"""
+def get_caja(sucursal, especificacion):
+
+    almacenes = sucursal.almacenes.all()
+    nombre_barra = especificacion.get('barra')
+
+    if nombre_barra is None:
+        barra = almacenes[0]
+    else:
+        barra = almacenes.filter(nombre=nombre_barra)[0]
+
+    return barra.cajas.all()[0]
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los mapeos de cajas de la sucursal como una lista de
+(columna, {valor: caja_id}) ordenada por prioridad. Solo toma en cuenta
+las cajas que pertenecen a la sucursal.
+-----------------------------------------------------------------------
+"""
+def get_mapeo_cajas(sucursal):
+
+    mapeos = (models.MapeoCaja.objects
+        .filter(sucursal=sucursal, caja__almacen__sucursal=sucursal)
+        .order_by('prioridad', 'columna')
+        .values_list('columna', 'valor', 'caja_id')
+    )
+
+    mapeo_cajas = {}
+    for columna, valor, caja_id in mapeos:
+        mapeo_cajas.setdefault(columna, {})[normalizar_valor(valor)] = caja_id
+
+    return list(mapeo_cajas.items())
+
+
+def normalizar_valor(valor):
+    return str(valor).strip().upper()
+
+
+"""
+-----------------------------------------------------------------------
+Normaliza una columna del reporte para compararla contra los valores de
+los mapeos: texto sin espacios a los lados y en mayúsculas. Los números
+enteros leídos como flotantes se comparan sin decimales ('2.0' -> '2').
+-----------------------------------------------------------------------
+"""
+def normalizar_columna(columna):
+
+    texto = columna.astype(str).str.strip().str.upper()
+
+    return texto.str.replace(r'\.0$', '', regex=True).where(columna.notnull())
+
+
+"""
+-----------------------------------------------------------------------
+Asigna a cada renglón la caja de su mapeo en una pasada por columna
+('map' sobre toda la columna). La primera columna que coincide gana; los
+renglones sin mapeo se quedan con 'caja_default'.
+-----------------------------------------------------------------------
+"""
+def asignar_cajas(df_ventas, mapeo_cajas, caja_default):
+
+    cajas = pd.Series(np.nan, index=df_ventas.index)
+
+    for columna, valores in mapeo_cajas:
+        if columna in df_ventas.columns:
+            cajas = cajas.fillna(normalizar_columna(df_ventas[columna]).map(valores))
+
+    return cajas.fillna(caja_default).astype(int)
+
+
+"""
+-----------------------------------------------------------------------
+Procesa un reporte de ventas con la especificación de la sucursal.
+
+Retorna el mismo diccionario que los parsers:
+{'df_ventas': dataframe, 'procesado': True | False}
+-----------------------------------------------------------------------
+"""
+def parsear(archivo, sucursal, especificacion):
+
+    caja = get_caja(sucursal, especificacion)
+    mapeo_cajas = get_mapeo_cajas(sucursal)
+
+    try:
+        df_reporte = leer(archivo, especificacion)
+        df_ventas = procesar(df_reporte, especificacion, sucursal.id, caja.id, mapeo_cajas)
+
+    # Si hay algún error con el reporte, lo notificamos
+    except Exception:
+        return({'df_ventas': {}, 'procesado': False})
+
+    return({'df_ventas': df_ventas, 'procesado': True})
+
+
+"""
+-----------------------------------------------------------------------
+Procesa un reporte de ventas por bloques.
+
+Es un generador: cada bloque se lee, se filtra y se limpia hasta que se
+pide el siguiente. Si el reporte tiene algún error arroja 'ErrorReporte'.
+-----------------------------------------------------------------------
+"""
+def parsear_bloques(archivo, sucursal, especificacion, tamano_bloque):
+
+    caja = get_caja(sucursal, especificacion)
+    mapeo_cajas = get_mapeo_cajas(sucursal)
+
+    try:
+        for df_reporte in leer_bloques(archivo, especificacion, tamano_bloque):
+            yield procesar(df_reporte, especificacion, sucursal.id, caja.id, mapeo_cajas)
+
+    except Exception as e:
+        raise ErrorReporte(str(e)) from e
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la especificación del reporte de ventas de una sucursal (None si
+la sucursal no tiene especificación)
+-----------------------------------------------------------------------
+"""
+def get_especificacion(sucursal):
+    return ESPECIFICACIONES.get(sucursal.slug)
@@ -0,0 +1,229 @@
+from django.core.exceptions import ImproperlyConfigured
+from importlib import import_module
+
+import inspect
+import io
+import pkgutil
+import pandas as pd
+from ventas import parsers
+from ventas.parsers import firmas
+from ventas.parsers import motor
+from ventas.parsers.especificaciones import ESPECIFICACIONES, ALTERNOS
+
+
+PREFIJO_MODULO = 'parser_'
+LECTORES = ['excel', 'csv']
+CAMPOS_ESPECIFICACION = ['lector', 'opciones', 'columnas', 'requeridos', 'excluir', 'numericos', 'descartar_ceros', 'barra']
+
+# {slug de la sucursal: módulo del parser o función armada con su especificación}
+REGISTRO = {}
+
+# {slug de la sucursal: 'modulo' | 'especificacion'}
+ORIGENES = {}
+
+
+class ParserNoEncontrado(LookupError):
+    """ La sucursal no tiene módulo de parser ni especificación """
+    pass
+
+
+"""
+-----------------------------------------------------------------------
+Convierte un slug de sucursal a la clave del registro. Así
+'parser_magno_brasserie' y la sucursal 'MAGNO-BRASSERIE' usan la misma
+clave.
+-----------------------------------------------------------------------
+"""
+def clave_slug(slug):
+    return slug.replace('_', '-').upper()
+
+
+"""
+-----------------------------------------------------------------------
+Revisa que un módulo de parser tenga una función 'parser(archivo,
+sucursal)'. Si no, arroja ImproperlyConfigured para que el error salga
+al arrancar y no al subir un reporte.
+-----------------------------------------------------------------------
+"""
+def validar_modulo(modulo):
+
+    funcion = getattr(modulo, 'parser', None)
+    if not callable(funcion):
+        raise ImproperlyConfigured('{} no define la función parser(archivo, sucursal)'.format(modulo.__name__))
+
+    try:
+        inspect.signature(funcion).bind(None, None)
+    except TypeError:
+        raise ImproperlyConfigured('{}.parser debe recibir (archivo, sucursal)'.format(modulo.__name__))
+
+    return funcion
+
+
+"""
+-----------------------------------------------------------------------
+Revisa que una especificación tenga todos sus campos y un lector válido
+-----------------------------------------------------------------------
+"""
+def validar_especificacion(slug, especificacion):
+
+    faltantes = [campo for campo in CAMPOS_ESPECIFICACION if campo not in especificacion]
+    if faltantes:
+        raise ImproperlyConfigured('La especificación {} no tiene: {}'.format(slug, ', '.join(faltantes)))
+
+    if especificacion['lector'] not in LECTORES:
+        raise ImproperlyConfigured('La especificación {} tiene un lector inválido: {}'.format(slug, especificacion['lector']))
+
+    for columna, regla in especificacion['numericos'].items():
+        if regla not in ['truncar', 'redondear']:
+            raise ImproperlyConfigured('La especificación {} tiene una regla inválida para {}: {}'.format(slug, columna, regla))
+
+
+def parser_especificacion(especificacion):
+
+    def parser(archivo, sucursal):
+        return motor.parsear(archivo, sucursal, especificacion)
+
+    return parser
+
+
+"""
+-----------------------------------------------------------------------
+Arma el registro de parsers.
+
+Importa y valida todos los módulos 'parser_*' de 'ventas.parsers' y
+todas las especificaciones. Si una sucursal tiene módulo propio se usa
+el módulo; si no, su especificación. Se llama una vez al arrancar desde
+'VentasConfig.ready()'.
+-----------------------------------------------------------------------
+"""
+def cargar_registro():
+
+    registro = {}
+    origenes = {}
+
+    for slug, especificacion in ESPECIFICACIONES.items():
+        validar_especificacion(slug, especificacion)
+        registro[clave_slug(slug)] = parser_especificacion(especificacion)
+        origenes[clave_slug(slug)] = 'especificacion'
+
+    for slug, alternos in ALTERNOS.items():
+        for especificacion in alternos:
+            validar_especificacion(slug, especificacion)
+
+    for info in pkgutil.iter_modules(parsers.__path__):
+        if not info.name.startswith(PREFIJO_MODULO):
+            continue
+
+        modulo = import_module('{}.{}'.format(parsers.__name__, info.name))
+        slug = clave_slug(info.name[len(PREFIJO_MODULO):])
+        validar_modulo(modulo)
+        # Guardamos el módulo y no su función para que 'parser' se resuelva al usarlo
+        registro[slug] = modulo
+        origenes[slug] = 'modulo'
+
+    REGISTRO.clear()
+    REGISTRO.update(registro)
+    ORIGENES.clear()
+    ORIGENES.update(origenes)
+
+    return REGISTRO
+
+
+"""
+-----------------------------------------------------------------------
+Inicializa el parser de CSV de pandas una vez por worker, para que el
+primer reporte que se sube después de arrancar no pague ese costo. Los
+lectores de Excel ya quedan importados con 'motor.py'.
+-----------------------------------------------------------------------
+"""
+def precargar_dependencias():
+
+    pd.read_csv(io.StringIO('codigo_pos,unidades\nA,1\n'))
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la función que procesa el reporte de ventas de una sucursal
+-----------------------------------------------------------------------
+"""
+def get_parser(sucursal):
+
+    if not REGISTRO:
+        cargar_registro()
+
+    slug = clave_slug(sucursal.slug)
+
+    if slug not in REGISTRO:
+        raise ParserNoEncontrado('La sucursal {} no tiene parser de ventas'.format(sucursal.slug))
+
+    if ORIGENES[slug] == 'modulo':
+        return REGISTRO[slug].parser
+
+    return REGISTRO[slug]
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los formatos de reporte de una sucursal: su especificación y
+sus formatos alternos
+-----------------------------------------------------------------------
+"""
+def formatos(sucursal):
+
+    especificacion = motor.get_especificacion(sucursal)
+    principal = [especificacion] if especificacion is not None else []
+
+    return principal + ALTERNOS.get(sucursal.slug, [])
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la especificación que corresponde al formato del archivo.
+
+Si la sucursal tiene un solo formato no se revisa el archivo. Si tiene
+varios, se reconoce por los encabezados de sus primeros renglones (sin
+intentar procesarlo completo con cada formato). Si no se reconoce, se
+usa la especificación principal de la sucursal.
+-----------------------------------------------------------------------
+"""
+def detectar_especificacion(archivo, sucursal):
+
+    especificaciones = formatos(sucursal)
+    principal = motor.get_especificacion(sucursal)
+
+    if len(especificaciones) <= 1:
+        return principal
+
+    especificacion = firmas.detectar(archivo, especificaciones)
+
+    return especificacion if especificacion is not None else principal
+
+
+"""
+-----------------------------------------------------------------------
+Retorna el parser que corresponde al formato del archivo. El formato
+principal usa el parser de la sucursal (su módulo o su especificación);
+un formato alterno se procesa con su especificación.
+-----------------------------------------------------------------------
+"""
+def get_parser_archivo(archivo, sucursal):
+
+    especificacion = detectar_especificacion(archivo, sucursal)
+
+    if especificacion is None or especificacion is motor.get_especificacion(sucursal):
+        return get_parser(sucursal)
+
+    return parser_especificacion(especificacion)
+
+
+"""
+-----------------------------------------------------------------------
+Retorna las sucursales que no tienen parser de ventas
+-----------------------------------------------------------------------
+"""
+def sucursales_sin_parser(sucursales):
+
+    if not REGISTRO:
+        cargar_registro()
+
+    return [sucursal for sucursal in sucursales if clave_slug(sucursal.slug) not in REGISTRO]
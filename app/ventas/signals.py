@@ -0,0 +1,41 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core import models
+from ventas import consumo_diario
+from ventas import matriz_recetas
+
+
+"""
+-----------------------------------------------------------------------
+Invalidamos la matriz de recetas de la sucursal cada vez que se crea,
+modifica o elimina una Receta o alguno de sus ingredientes. Solo libera
+el cache del proceso actual; los demás procesos detectan el cambio con
+el sello de las recetas (ver 'matriz_recetas.sello_recetas').
+-----------------------------------------------------------------------
+"""
+@receiver(post_save, sender=models.Receta)
+@receiver(post_delete, sender=models.Receta)
+def invalidar_matriz_receta(sender, instance, **kwargs):
+    matriz_recetas.invalidar_matriz(instance.sucursal_id)
+
+
+@receiver(post_save, sender=models.IngredienteReceta)
+@receiver(post_delete, sender=models.IngredienteReceta)
+def invalidar_matriz_ingrediente_receta(sender, instance, **kwargs):
+    sucursal_id = models.Receta.objects.filter(id=instance.receta_id).values_list('sucursal__id', flat=True).first()
+
+    # Si la Receta ya se eliminó, su propia señal invalida la matriz
+    if sucursal_id is not None:
+        matriz_recetas.invalidar_matriz(sucursal_id)
+
+
+"""
+-----------------------------------------------------------------------
+Cuando se elimina una Venta (sus consumos se eliminan en cascada),
+reconstruimos el ConsumoDiario de su fecha al confirmar la transacción
+-----------------------------------------------------------------------
+"""
+@receiver(post_delete, sender=models.Venta)
+def reconstruir_consumo_diario_venta(sender, instance, **kwargs):
+    consumo_diario.programar_reconstruccion(instance.sucursal_id, instance.fecha)
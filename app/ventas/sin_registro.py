@@ -0,0 +1,258 @@
+from django.db import transaction
+from django.db.models import F, Count, Sum, Min, Max
+
+from core import models
+from ventas import bloqueos
+from ventas import consumo_diario
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+
+
+# ProductosSinRegistro por lote al reatribuir
+TAMANO_LOTE_REATRIBUIR = 1000
+
+
+"""
+-----------------------------------------------------------------------
+RESUMEN DE PRODUCTOS SIN REGISTRO
+
+Cada renglón del reporte de ventas sin receta registrada se guarda como
+un ProductoSinRegistro (con su fecha y su huella), pero los reportes
+leen el ResumenSinRegistro de cada código POS: renglones, unidades e
+importe acumulados y la primera y última fecha en que apareció.
+
+Los ProductosSinRegistro son el pendiente que se reatribuye cuando se
+registra la receta de su código: se convierten en Ventas con sus
+consumos y se borran.
+-----------------------------------------------------------------------
+"""
+
+
+"""
+-----------------------------------------------------------------------
+Suma una lista de ProductosSinRegistro recién guardados a los resúmenes
+de la sucursal: actualiza los códigos que ya tenían resumen y crea los
+que faltan. Debe llamarse dentro de la transacción que los guardó.
+-----------------------------------------------------------------------
+"""
+def acumular(sucursal, productos):
+
+    totales = {}
+    for producto in productos:
+        total = totales.setdefault(producto.codigo_pos, {
+            'nombre': producto.nombre,
+            'renglones': 0,
+            'unidades': 0,
+            'importe': 0,
+            'fechas': [],
+        })
+        total['nombre'] = producto.nombre
+        total['renglones'] += 1
+        total['unidades'] += producto.unidades or 0
+        total['importe'] += producto.importe or 0
+        if producto.fecha is not None:
+            total['fechas'].append(producto.fecha)
+
+    if not totales:
+        return
+
+    # Las cargas de otras fechas de la sucursal pueden estar creando los mismos resúmenes
+    bloqueos.bloquear_sin_registro(sucursal.id)
+
+    existentes = models.ResumenSinRegistro.objects.select_for_update().filter(sucursal=sucursal, codigo_pos__in=list(totales))
+    existentes = {resumen.codigo_pos: resumen for resumen in existentes}
+
+    nuevos = []
+    for codigo_pos, total in totales.items():
+        primera_fecha = min(total['fechas']) if total['fechas'] else None
+        ultima_fecha = max(total['fechas']) if total['fechas'] else None
+
+        resumen = existentes.get(codigo_pos)
+        if resumen is None:
+            nuevos.append(models.ResumenSinRegistro(
+                sucursal=sucursal,
+                codigo_pos=codigo_pos,
+                nombre=total['nombre'],
+                renglones=total['renglones'],
+                unidades=total['unidades'],
+                importe=total['importe'],
+                primera_fecha=primera_fecha,
+                ultima_fecha=ultima_fecha
+            ))
+            continue
+
+        fechas = [fecha for fecha in [resumen.primera_fecha, resumen.ultima_fecha, primera_fecha, ultima_fecha] if fecha is not None]
+
+        # Los contadores se suman en la base de datos
+        models.ResumenSinRegistro.objects.filter(id=resumen.id).update(
+            nombre=total['nombre'],
+            renglones=F('renglones') + total['renglones'],
+            unidades=F('unidades') + total['unidades'],
+            importe=F('importe') + total['importe'],
+            primera_fecha=min(fechas) if fechas else None,
+            ultima_fecha=max(fechas) if fechas else None
+        )
+
+    models.ResumenSinRegistro.objects.bulk_create(nuevos)
+
+
+"""
+-----------------------------------------------------------------------
+Reconstruye los resúmenes de la sucursal (o solo los de 'codigos') a
+partir de sus ProductosSinRegistro con un solo GROUP BY. Los códigos
+que ya no tienen ProductosSinRegistro se quedan sin resumen.
+-----------------------------------------------------------------------
+"""
+def recalcular(sucursal, codigos=None):
+
+    productos = models.ProductoSinRegistro.objects.filter(sucursal=sucursal)
+    resumenes = models.ResumenSinRegistro.objects.filter(sucursal=sucursal)
+
+    if codigos is not None:
+        codigos = list(codigos)
+        productos = productos.filter(codigo_pos__in=codigos)
+        resumenes = resumenes.filter(codigo_pos__in=codigos)
+
+    totales = productos.values('codigo_pos').annotate(
+        ultimo_nombre=Max('nombre'),
+        total_renglones=Count('id'),
+        total_unidades=Sum('unidades'),
+        total_importe=Sum('importe'),
+        fecha_minima=Min('fecha'),
+        fecha_maxima=Max('fecha')
+    ).order_by()
+
+    nuevos = [
+        models.ResumenSinRegistro(
+            sucursal=sucursal,
+            codigo_pos=total['codigo_pos'],
+            nombre=total['ultimo_nombre'],
+            renglones=total['total_renglones'],
+            unidades=total['total_unidades'] or 0,
+            importe=total['total_importe'] or 0,
+            primera_fecha=total['fecha_minima'],
+            ultima_fecha=total['fecha_maxima']
+        )
+        for total in totales
+    ]
+
+    with transaction.atomic():
+        bloqueos.bloquear_sin_registro(sucursal.id)
+        resumenes.delete()
+        models.ResumenSinRegistro.objects.bulk_create(nuevos)
+
+    return len(nuevos)
+
+
+"""
+-----------------------------------------------------------------------
+Reatribuye los ProductosSinRegistro de la sucursal cuyo código POS ya
+tiene receta registrada.
+
+Los toma por lotes, los cruza contra la matriz de recetas de la sucursal
+vigente en su fecha y guarda sus Ventas (con la fecha y la huella del
+renglón original) y sus ConsumosRecetaVendida con 'bulk_create' (y los
+suma al ConsumoDiario). Luego borra los ProductosSinRegistro
+reatribuidos y recalcula el resumen de sus códigos. Todo en una sola
+transacción.
+
+Se omiten los renglones cuya caja no existe en la sucursal, que no
+tienen unidades o importe o cuyo código no está en la matriz de recetas.
+Mientras tanto la sucursal queda bloqueada para las cargas de ventas
+(ver 'ventas.bloqueos').
+
+Retorna los totales: {'ventas', 'consumos', 'codigos'}
+-----------------------------------------------------------------------
+"""
+def reatribuir(sucursal):
+
+    # Matrices de recetas por fecha (ver 'matriz_recetas.get_matriz')
+    matrices = {}
+    cajas = models.Caja.objects.filter(almacen__sucursal=sucursal).select_related('almacen').in_bulk()
+
+    pendientes = models.ProductoSinRegistro.objects.filter(
+        sucursal=sucursal,
+        codigo_pos__in=models.Receta.objects.filter(sucursal=sucursal).values('codigo_pos'),
+        caja__in=models.Caja.objects.filter(almacen__sucursal=sucursal).values('id'),
+        unidades__isnull=False,
+        importe__isnull=False
+    ).order_by('id')
+
+    totales = {'ventas': 0, 'consumos': 0, 'codigos': 0}
+    codigos = set()
+
+    with transaction.atomic():
+
+        # Las Ventas son de varias fechas: esperamos a que terminen las cargas de la sucursal
+        bloqueos.bloquear_sucursal(sucursal.id)
+
+        ultimo_id = 0
+        while True:
+            lote = list(pendientes.filter(id__gt=ultimo_id)[:TAMANO_LOTE_REATRIBUIR])
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+
+            # Cada renglón se reatribuye con la matriz vigente en su fecha
+            por_fecha = {}
+            for producto in lote:
+                por_fecha.setdefault(producto.fecha, []).append(producto)
+
+            ventas = []
+            consumos = []
+            reatribuidos = []
+            for fecha, productos in por_fecha.items():
+                if fecha not in matrices:
+                    matrices[fecha] = matriz_recetas.get_matriz(sucursal, fecha)
+                matriz = matrices[fecha]
+
+                # Un código que no está en la matriz (-1) sigue pendiente
+                filas = matriz.buscar_filas([producto.codigo_pos for producto in productos])
+                encontrados = [(fila, producto) for fila, producto in zip(filas.tolist(), productos) if fila >= 0]
+                if not encontrados:
+                    continue
+
+                ventas_fecha = [
+                    models.Venta(
+                        receta=matriz.recetas[fila],
+                        sucursal=sucursal,
+                        fecha=producto.fecha,
+                        unidades=producto.unidades,
+                        importe=producto.importe,
+                        caja=cajas[producto.caja],
+                        huella=producto.huella
+                    )
+                    for fila, producto in encontrados
+                ]
+                ventas_fecha = ventas_consumos.guardar_ventas(ventas_fecha)
+
+                renglones, columnas, volumenes = matriz.explotar([fila for fila, producto in encontrados], [venta.unidades for venta in ventas_fecha])
+
+                consumos.extend(
+                    models.ConsumoRecetaVendida(
+                        ingrediente=matriz.ingredientes[columna],
+                        receta=ventas_fecha[renglon].receta,
+                        venta=ventas_fecha[renglon],
+                        fecha=ventas_fecha[renglon].fecha,
+                        volumen=volumen
+                    )
+                    for renglon, columna, volumen in zip(renglones.tolist(), columnas.tolist(), volumenes.tolist())
+                )
+                ventas.extend(ventas_fecha)
+                reatribuidos.extend(producto for fila, producto in encontrados)
+
+            models.ConsumoRecetaVendida.objects.bulk_create(consumos)
+            consumo_diario.acumular(consumos)
+
+            models.ProductoSinRegistro.objects.filter(id__in=[producto.id for producto in reatribuidos]).delete()
+
+            codigos.update(producto.codigo_pos for producto in reatribuidos)
+            totales['ventas'] += len(ventas)
+            totales['consumos'] += len(consumos)
+
+        if codigos:
+            recalcular(sucursal, codigos)
+
+    totales['codigos'] = len(codigos)
+
+    return totales
@@ -0,0 +1,109 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.utils.six import StringIO
+from ventas import benchmark
+from ventas.parsers import motor
+from ventas.parsers.especificaciones import ESPECIFICACIONES
+from core import models
+
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+        # Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+
+        # Recetas
+        self.codigos = ['AYD024', 'AYD011']
+        for codigo_pos in self.codigos:
+            receta = models.Receta.objects.create(codigo_pos=codigo_pos, nombre=codigo_pos, sucursal=self.magno_brasserie)
+            models.IngredienteReceta.objects.create(receta=receta, ingrediente=self.licor_43, volumen=45)
+
+        self.directorio = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+    def test_generar_reportes(self):
+        """ Testear que el motor lee los reportes sintéticos de cada formato """
+
+        df_renglones = benchmark.renglones_prueba(self.codigos, 300)
+        esperados = df_renglones.loc[~df_renglones['excluido']]
+
+        for formato in benchmark.FORMATOS:
+            ruta = benchmark.generar_reporte(formato, self.codigos, 300, self.directorio)
+            especificacion = dict(ESPECIFICACIONES[formato], barra=None)
+
+            df_ventas = pd.concat(motor.parsear_bloques(ruta, self.magno_brasserie, especificacion, 100))
+
+            self.assertEqual(len(df_ventas), len(esperados), formato)
+            self.assertEqual(df_ventas['codigo_pos'].tolist(), esperados['codigo_pos'].tolist(), formato)
+            self.assertEqual(int(df_ventas['importe'].sum()), int(esperados['importe'].sum()), formato)
+
+
+    def test_medir_reporte(self):
+        """ Testear que el benchmark mide cada etapa sin guardar nada """
+
+        resultados = benchmark.correr(self.magno_brasserie, self.codigos, ['PECOS', 'KINKIN'], [500], self.directorio, 200)
+
+        self.assertEqual([resultado['formato'] for resultado in resultados['resultados']], ['PECOS', 'KINKIN'])
+        for resultado in resultados['resultados']:
+            self.assertEqual(set(resultado['etapas']), {'parseo', 'consumos', 'registro', 'total'})
+            self.assertGreater(resultado['etapas']['parseo']['renglones_segundo'], 0)
+            self.assertGreater(resultado['memoria_pico_mb'], 0)
+            # Cada receta lleva un ingrediente: un consumo por renglón con receta
+            self.assertEqual(resultado['consumos'], resultado['renglones_ventas'] - self.sin_registro(resultado))
+
+        self.assertEqual(models.Venta.objects.count(), 0)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+    def sin_registro(self, resultado):
+        """ Renglones del reporte sintético que no tienen receta """
+
+        df_renglones = benchmark.renglones_prueba(self.codigos, resultado['renglones'])
+        df_renglones = df_renglones.loc[~df_renglones['excluido']]
+
+        return int((~df_renglones['codigo_pos'].isin(self.codigos)).sum())
+
+
+    def test_command_benchmark_ingesta_ventas(self):
+        """ Testear el comando que guarda los resultados del benchmark en JSON """
+
+        salida = os.path.join(self.directorio, 'resultados.json')
+        out = StringIO()
+        call_command('benchmark_ingesta_ventas', str(self.magno_brasserie.id), '--formatos', 'MAGNO-BRASSERIE', '--renglones', '200', '--sin-registro', '--salida', salida, stdout=out)
+
+        with open(salida) as f:
+            resultados = json.load(f)
+
+        self.assertIn('MAGNO-BRASSERIE - RENGLONES: 200 - PARSEO:', out.getvalue())
+        self.assertEqual(len(resultados['resultados']), 1)
+        self.assertNotIn('registro', resultados['resultados'][0]['etapas'])
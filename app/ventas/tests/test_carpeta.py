@@ -0,0 +1,158 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.utils.six import StringIO
+from unittest.mock import patch
+
+import datetime
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+from core import models
+from ventas import bloqueos
+from ventas import carpeta
+from ventas import ingesta
+from ventas import ventas_consumos
+
+
+MEDIA_ROOT_TESTS = tempfile.mkdtemp()
+
+PATH_REPORTE_DEMO = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_demo.csv')
+
+
+"""
+------------------------------------------------------------
+TESTS PARA LOS BLOQUEOS POR SUCURSAL Y LA INGESTA DE UNA
+CARPETA DE REPORTES
+------------------------------------------------------------
+"""
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TESTS)
+class CarpetaTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TESTS, ignore_errors=True)
+
+
+    def setUp(self):
+
+        # Cliente
+        self.foodstack = models.Cliente.objects.create(nombre='FOODSTACK TECHNOLOGY')
+        # Sucursal
+        self.demo = models.Sucursal.objects.create(nombre='DEMO', cliente=self.foodstack)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA DEMO', numero=1, sucursal=self.demo)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA DEMO', almacen=self.barra_1)
+
+        # Categoría
+        self.categoria_mezcal = models.Categoria.objects.create(nombre='MEZCAL')
+        # Ingrediente
+        self.mezcal = models.Ingrediente.objects.create(
+            codigo='MEZC001',
+            nombre='MEZCAL DEMO',
+            categoria=self.categoria_mezcal,
+            factor_peso=0.95
+        )
+        # Receta
+        self.copa_mezcal = models.Receta.objects.create(codigo_pos='CMEZC999', nombre='COPA MEZCAL DEMO', sucursal=self.demo)
+        models.IngredienteReceta.objects.create(receta=self.copa_mezcal, ingrediente=self.mezcal, volumen=60)
+
+        # Carpeta con una subcarpeta por sucursal
+        self.carpeta = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.carpeta, 'demo'))
+        os.makedirs(os.path.join(self.carpeta, 'SIN-SUCURSAL'))
+        shutil.copy(PATH_REPORTE_DEMO, os.path.join(self.carpeta, 'demo', 'ventas_demo.csv'))
+
+        self.fecha = datetime.date(2019, 10, 14)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+
+    def test_registrar_bloquea_sucursal(self):
+        """ Testear que el registro de ventas bloquea la sucursal dentro de su transacción """
+
+        df_ventas = pd.DataFrame({
+            'sucursal_id': [self.demo.id],
+            'caja_id': [self.caja_1.id],
+            'codigo_pos': ['CMEZC999'],
+            'nombre': ['COPA MEZCAL DEMO'],
+            'unidades': [1],
+            'importe': [100]
+        })
+
+        with patch('ventas.bloqueos.bloquear_sucursal', wraps=bloqueos.bloquear_sucursal) as bloquear_sucursal:
+            ventas_consumos.registrar(df_ventas, self.demo, self.fecha)
+            ventas_consumos.registrar_por_bloques([df_ventas], self.demo, self.fecha)
+
+        self.assertEqual([llamada[0] for llamada in bloquear_sucursal.call_args_list], [(self.demo.id, self.fecha), (self.demo.id, self.fecha)])
+        self.assertEqual(models.Venta.objects.count(), 1)
+
+
+    def test_procesar_bloquea_sucursal(self):
+        """ Testear que el reporte se procesa con la fecha de la sucursal bloqueada """
+
+        reporte = carpeta.encolar_archivo(os.path.join(self.carpeta, 'demo', 'ventas_demo.csv'), self.demo, self.fecha)
+
+        with patch('ventas.bloqueos.bloqueo_sucursal', wraps=bloqueos.bloqueo_sucursal) as bloqueo_sucursal:
+            ingesta.procesar(ingesta.tomar_siguiente(ids=[reporte.id]))
+
+        bloqueo_sucursal.assert_called_once_with(self.demo.id, self.fecha)
+        self.assertEqual(models.Venta.objects.count(), 4)
+
+
+    def test_clave_fecha(self):
+        """ Testear que cada fecha de la sucursal tiene su propio candado """
+
+        clave = bloqueos.clave_fecha(self.demo.id, self.fecha)
+
+        self.assertEqual(clave, bloqueos.clave_fecha(self.demo.id, self.fecha))
+        self.assertNotEqual(clave, bloqueos.clave_fecha(self.demo.id, self.fecha + datetime.timedelta(days=1)))
+        self.assertTrue(-2 ** 31 <= clave < 2 ** 31)
+
+
+    def test_archivos_carpeta(self):
+        """ Testear que los archivos se agrupan por el slug de su subcarpeta """
+
+        archivos, desconocidas = carpeta.archivos_carpeta(self.carpeta)
+
+        self.assertEqual(archivos, {self.demo: [os.path.join(self.carpeta, 'demo', 'ventas_demo.csv')]})
+        self.assertEqual(desconocidas, ['SIN-SUCURSAL'])
+
+
+    def test_tomar_siguiente_ids(self):
+        """ Testear que solo se toman los reportes pedidos """
+
+        reporte = carpeta.encolar_archivo(os.path.join(self.carpeta, 'demo', 'ventas_demo.csv'), self.demo, self.fecha)
+
+        self.assertIsNone(ingesta.tomar_siguiente(ids=[reporte.id + 1]))
+        self.assertEqual(ingesta.tomar_siguiente(ids=[reporte.id]).estado, models.ReporteVentas.PROCESANDO)
+
+
+    def test_command_ingerir_carpeta_ventas(self):
+        """ Testear que el comando procesa la carpeta y mueve cada archivo según su resultado """
+
+        # Un reporte defectuoso
+        with open(os.path.join(self.carpeta, 'demo', 'ventas_defectuoso.csv'), 'w') as f:
+            f.write('Este no es un reporte\n')
+
+        out = StringIO()
+        call_command('ingerir_carpeta_ventas', self.carpeta, '--procesos', '1', '--fecha', '2019-10-14', stdout=out)
+
+        self.assertIn('SIN-SUCURSAL - NO ES UNA SUCURSAL', out.getvalue())
+        self.assertIn('ARCHIVO: ventas_demo.csv - ESTADO: TERMINADO - RENGLONES: 4 - VENTAS: 4', out.getvalue())
+        self.assertEqual(os.listdir(os.path.join(self.carpeta, 'demo', 'procesados')), ['ventas_demo.csv'])
+        self.assertEqual(os.listdir(os.path.join(self.carpeta, 'demo', 'errores')), ['ventas_defectuoso.csv'])
+        self.assertEqual(set(models.Venta.objects.values_list('fecha', flat=True)), {self.fecha})
+
+        # El mismo archivo otra vez no se registra dos veces
+        shutil.copy(PATH_REPORTE_DEMO, os.path.join(self.carpeta, 'demo', 'ventas_demo.csv'))
+        call_command('ingerir_carpeta_ventas', self.carpeta, '--procesos', '1', stdout=StringIO())
+
+        self.assertEqual(models.Venta.objects.count(), 4)
+        self.assertEqual(models.ReporteVentas.objects.filter(estado=models.ReporteVentas.TERMINADO).count(), 1)
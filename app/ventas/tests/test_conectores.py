@@ -0,0 +1,170 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.utils.six import StringIO
+from unittest.mock import patch, Mock
+
+import datetime
+import os
+import shutil
+import tempfile
+
+from core import models
+from ventas import conectores
+
+
+MEDIA_ROOT_TESTS = tempfile.mkdtemp()
+
+
+def reporte_demo(unidades):
+    """ Retorna el contenido de un reporte de ventas de la sucursal DEMO """
+
+    return 'codigo_pos,nombre,unidades,importe\nCMEZC999,COPA MEZCAL DEMO,{},100\n'.format(unidades).encode()
+
+
+"""
+------------------------------------------------------------
+TESTS PARA LOS CONECTORES DE REPORTES DE VENTAS
+------------------------------------------------------------
+"""
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TESTS)
+class ConectoresTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TESTS, ignore_errors=True)
+
+
+    def setUp(self):
+
+        # Cliente
+        self.foodstack = models.Cliente.objects.create(nombre='FOODSTACK TECHNOLOGY')
+        # Sucursal
+        self.demo = models.Sucursal.objects.create(nombre='DEMO', cliente=self.foodstack)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA DEMO', numero=1, sucursal=self.demo)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA DEMO', almacen=self.barra_1)
+
+        # Categoría
+        self.categoria_mezcal = models.Categoria.objects.create(nombre='MEZCAL')
+        # Ingrediente
+        self.mezcal = models.Ingrediente.objects.create(
+            codigo='MEZC001',
+            nombre='MEZCAL DEMO',
+            categoria=self.categoria_mezcal,
+            factor_peso=0.95
+        )
+        # Receta
+        self.copa_mezcal = models.Receta.objects.create(codigo_pos='CMEZC999', nombre='COPA MEZCAL DEMO', sucursal=self.demo)
+        models.IngredienteReceta.objects.create(receta=self.copa_mezcal, ingrediente=self.mezcal, volumen=60)
+
+        self.fecha_1 = datetime.date(2019, 10, 14)
+        self.fecha_2 = datetime.date(2019, 10, 15)
+        self.fecha_3 = datetime.date(2019, 10, 16)
+
+        # Carpeta de la que descarga el conector
+        self.carpeta = tempfile.mkdtemp()
+        self.conector = models.ConectorVentas.objects.create(
+            sucursal=self.demo,
+            tipo=models.ConectorVentas.CARPETA,
+            ubicacion=os.path.join(self.carpeta, 'ventas_{fecha:%Y%m%d}.csv'),
+            fecha_inicial=self.fecha_1
+        )
+
+
+    def tearDown(self):
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+
+    def publicar(self, fecha, contenido):
+        """ Deja en la carpeta el reporte de un día """
+
+        with open(os.path.join(self.carpeta, 'ventas_{:%Y%m%d}.csv'.format(fecha)), 'wb') as f:
+            f.write(contenido)
+
+
+    def test_sincronizar_carpeta(self):
+        """ Testear que se registran los días publicados y la marca de agua avanza """
+
+        self.publicar(self.fecha_1, reporte_demo(1))
+        self.publicar(self.fecha_2, reporte_demo(2))
+
+        resultado = conectores.sincronizar(self.conector, hasta=self.fecha_3)
+
+        self.assertEqual(resultado, {'fechas': 2, 'ventas': 2, 'error': ''})
+        self.assertEqual(models.ConectorVentas.objects.get(id=self.conector.id).ultima_fecha, self.fecha_2)
+        self.assertEqual(
+            list(models.Venta.objects.order_by('fecha').values_list('fecha', 'unidades')),
+            [(self.fecha_1, 1), (self.fecha_2, 2)]
+        )
+
+
+    def test_sincronizar_incremental(self):
+        """ Testear que una nueva sincronización solo descarga los días posteriores a la marca """
+
+        self.publicar(self.fecha_1, reporte_demo(1))
+        conectores.sincronizar(self.conector, hasta=self.fecha_3)
+
+        # Solo se descarga el día nuevo
+        self.publicar(self.fecha_2, reporte_demo(2))
+        descargar = Mock(wraps=conectores.descargar_carpeta)
+        with patch.dict(conectores.DESCARGAS, {models.ConectorVentas.CARPETA: descargar}):
+            resultado = conectores.sincronizar(self.conector, hasta=self.fecha_2)
+
+        self.assertEqual(resultado['fechas'], 1)
+        self.assertEqual([llamada[0][1] for llamada in descargar.call_args_list], [self.fecha_2])
+        self.assertEqual(models.Venta.objects.count(), 2)
+        self.assertEqual(models.ReporteVentas.objects.count(), 2)
+
+
+    def test_sincronizar_error(self):
+        """ Testear que un reporte con error detiene la sincronización sin mover la marca """
+
+        self.publicar(self.fecha_1, b'Este no es un reporte')
+        self.publicar(self.fecha_2, reporte_demo(2))
+
+        resultado = conectores.sincronizar(self.conector, hasta=self.fecha_2)
+
+        self.conector.refresh_from_db()
+        self.assertEqual(resultado['fechas'], 0)
+        self.assertIsNone(self.conector.ultima_fecha)
+        self.assertNotEqual(self.conector.ultimo_error, '')
+        self.assertEqual(models.Venta.objects.count(), 0)
+
+
+    @patch('ventas.conectores.requests.get')
+    def test_sincronizar_http(self, mock_get):
+        """ Testear el conector HTTP: un 404 significa que el día no está publicado """
+
+        def respuesta(url, headers, timeout):
+            if url.endswith('2019-10-14'):
+                return Mock(status_code=200, content=reporte_demo(3))
+            return Mock(status_code=404)
+
+        mock_get.side_effect = respuesta
+        conector = models.ConectorVentas.objects.create(
+            sucursal=self.demo,
+            tipo=models.ConectorVentas.HTTP,
+            ubicacion='https://pos.example.com/ventas/{fecha:%Y-%m-%d}',
+            token='secreto',
+            fecha_inicial=self.fecha_1
+        )
+
+        resultado = conectores.sincronizar(conector, hasta=self.fecha_3)
+
+        self.assertEqual(resultado, {'fechas': 1, 'ventas': 1, 'error': ''})
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args[1]['headers'], {'Authorization': 'Bearer secreto'})
+        self.assertEqual(models.Venta.objects.get().unidades, 3)
+
+
+    def test_command_sincronizar_conectores_ventas(self):
+        """ Testear el comando que sincroniza los conectores activos """
+
+        self.publicar(self.fecha_1, reporte_demo(1))
+        out = StringIO()
+        call_command('sincronizar_conectores_ventas', '--hasta', '2019-10-16', stdout=out)
+
+        self.assertIn('DEMO - CARPETA - FECHAS: 1 - VENTAS: 1 - ULTIMA FECHA: 2019-10-14', out.getvalue())
@@ -0,0 +1,202 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+from unittest.mock import patch
+from ventas import ventas_consumos
+from ventas import consumo_diario
+from ventas import sin_registro
+from core import models
+
+import datetime
+import pandas as pd
+
+
+class ConsumoDiarioTests(TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        # Almacenes
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        self.barra_2 = models.Almacen.objects.create(nombre='BARRA 2', numero=2, sucursal=self.magno_brasserie)
+        # Cajas
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+        self.caja_2 = models.Caja.objects.create(numero=2, nombre='CAJA 2', almacen=self.barra_2)
+
+        # Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+        self.aperol = models.Ingrediente.objects.create(
+            codigo='LICO002',
+            nombre='APEROL',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+
+        # Recetas
+        self.carajillo = models.Receta.objects.create(codigo_pos='00050', nombre='CARAJILLO', sucursal=self.magno_brasserie)
+        self.licor_43_derecho = models.Receta.objects.create(codigo_pos='00081', nombre='LICOR 43 DERECHO', sucursal=self.magno_brasserie)
+        models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.licor_43, volumen=45)
+        models.IngredienteReceta.objects.create(receta=self.licor_43_derecho, ingrediente=self.licor_43, volumen=60)
+
+        self.fecha_1 = datetime.date(2019, 10, 14)
+        self.fecha_2 = datetime.date(2019, 10, 15)
+
+
+    def df_reporte(self, unidades=1):
+        """ Retorna un reporte de ventas de dos barras """
+
+        return pd.DataFrame({
+            'sucursal_id': [self.magno_brasserie.id] * 4,
+            'caja_id': [self.caja_1.id, self.caja_1.id, self.caja_2.id, self.caja_1.id],
+            'codigo_pos': ['00050', '00081', '00050', '00457'],
+            'nombre': ['CARAJILLO', 'LICOR 43', 'CARAJILLO', 'APEROL SPRITZ'],
+            'unidades': [unidades] * 4,
+            'importe': [100] * 4
+        })
+
+
+    def diarios(self):
+        """ Retorna el consumo diario como {(almacen, fecha): (volumen, unidades, importe)} """
+
+        return {
+            (diario.almacen_id, diario.fecha): (diario.volumen, diario.unidades, diario.importe)
+            for diario in models.ConsumoDiario.objects.filter(ingrediente=self.licor_43)
+        }
+
+
+    def test_acumular(self):
+        """ Testear que la carga de ventas suma sus consumos al consumo diario de cada barra """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie, self.fecha_2)
+
+        self.assertEqual(self.diarios(), {
+            (self.barra_1.id, self.fecha_1): (105, 2, 200),
+            (self.barra_2.id, self.fecha_1): (45, 1, 100),
+            (self.barra_1.id, self.fecha_2): (210, 4, 200),
+            (self.barra_2.id, self.fecha_2): (90, 2, 100),
+        })
+
+
+    def test_acumular_mismo_dia(self):
+        """ Testear que dos reportes del mismo día se suman al mismo renglón """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        df_reporte = self.df_reporte()
+        df_reporte['codigo_pos'] = ['00081', '00081', '00081', '00081']
+        ventas_consumos.registrar(df_reporte, self.magno_brasserie, self.fecha_1)
+
+        # El primer '00081' de la CAJA 1 ya estaba registrado: se suman los otros dos
+        self.assertEqual(self.diarios()[(self.barra_1.id, self.fecha_1)], (105 + 120, 4, 400))
+        self.assertEqual(models.ConsumoDiario.objects.count(), 2)
+
+
+    @override_settings(VENTAS_DUPLICADOS='actualizar')
+    def test_acumular_actualizar(self):
+        """ Testear que un reporte corregido reemplaza sus consumos en el consumo diario """
+
+        ventas_consumos.registrar(self.df_reporte(unidades=1), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=3), self.magno_brasserie, self.fecha_1)
+
+        self.assertEqual(self.diarios(), {
+            (self.barra_1.id, self.fecha_1): (315, 6, 200),
+            (self.barra_2.id, self.fecha_1): (135, 3, 100),
+        })
+
+
+    def test_recalcular(self):
+        """ Testear que reconstruir el consumo diario da lo mismo que acumularlo en la carga """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie, self.fecha_2)
+        acumulado = self.diarios()
+
+        models.ConsumoDiario.objects.all().delete()
+        renglones = consumo_diario.recalcular(self.magno_brasserie)
+
+        self.assertEqual(renglones, 4)
+        self.assertEqual(self.diarios(), acumulado)
+
+
+    def test_recalcular_fechas(self):
+        """ Testear que reconstruir un rango de fechas no toca los demás días """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_2)
+        models.ConsumoDiario.objects.update(volumen=0)
+
+        consumo_diario.recalcular(self.magno_brasserie, self.fecha_2, self.fecha_2)
+
+        self.assertEqual(self.diarios()[(self.barra_1.id, self.fecha_1)][0], 0)
+        self.assertEqual(self.diarios()[(self.barra_1.id, self.fecha_2)][0], 105)
+
+
+    def test_reatribuir(self):
+        """ Testear que los productos sin registro reatribuidos se suman al consumo diario """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+
+        spritz = models.Receta.objects.create(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+        models.IngredienteReceta.objects.create(receta=spritz, ingrediente=self.aperol, volumen=90)
+        sin_registro.reatribuir(self.magno_brasserie)
+
+        diario = models.ConsumoDiario.objects.get(ingrediente=self.aperol)
+        self.assertEqual((diario.almacen_id, diario.fecha, diario.volumen), (self.barra_1.id, self.fecha_1, 90))
+
+
+    def test_command_reconstruir_consumo_diario(self):
+        """ Testear el comando que reconstruye el consumo diario """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        models.ConsumoDiario.objects.all().delete()
+
+        out = StringIO()
+        call_command('reconstruir_consumo_diario', '--sucursal', str(self.magno_brasserie.id), '--desde', '2019-10-14', '--hasta', '2019-10-14', stdout=out)
+
+        self.assertIn('CONSUMOS DIARIOS: 2', out.getvalue())
+        self.assertEqual(models.ConsumoDiario.objects.count(), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_consumo_diario', '--desde', '14/10/2019', stdout=StringIO())
+
+
+class ConsumoDiarioEliminarVentasTests(TransactionTestCase):
+    """ La reconstrucción corre al confirmar la transacción, así que estos tests no pueden envolverse en una """
+
+    setUp = ConsumoDiarioTests.setUp
+    df_reporte = ConsumoDiarioTests.df_reporte
+    diarios = ConsumoDiarioTests.diarios
+
+
+    def test_eliminar_ventas(self):
+        """ Testear que al eliminar ventas se reconstruye una sola vez el consumo diario de su fecha """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie, self.fecha_2)
+
+        with patch('ventas.consumo_diario.recalcular', wraps=consumo_diario.recalcular) as recalcular:
+            models.Venta.objects.filter(fecha=self.fecha_1, caja=self.caja_1).delete()
+
+        recalcular.assert_called_once_with(self.magno_brasserie.id, self.fecha_1, self.fecha_1)
+
+        # Una sola venta, como desde el admin
+        models.Venta.objects.get(fecha=self.fecha_2, caja=self.caja_2).delete()
+
+        self.assertEqual(self.diarios(), {
+            (self.barra_2.id, self.fecha_1): (45, 1, 100),
+            (self.barra_1.id, self.fecha_2): (210, 4, 200),
+        })
@@ -0,0 +1,227 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from core import models
+from ventas import historico
+
+
+MEDIA_ROOT_TESTS = tempfile.mkdtemp()
+
+
+def contenido_demo():
+    """ Retorna el contenido del reporte de ventas de la sucursal DEMO """
+
+    path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_demo.csv')
+    with open(path_reporte_ventas, 'rb') as f:
+        return f.read()
+
+
+def zip_historico(archivos):
+    """ Retorna el contenido de un .zip con los archivos {nombre: contenido} """
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archivo_zip:
+        for nombre, contenido in archivos.items():
+            archivo_zip.writestr(nombre, contenido)
+
+    return buffer.getvalue()
+
+
+"""
+------------------------------------------------------------
+TESTS PARA LA CARGA DEL HISTÓRICO DE VENTAS
+------------------------------------------------------------
+"""
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TESTS)
+class HistoricoTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TESTS, ignore_errors=True)
+
+
+    def setUp(self):
+
+        self.client = Client()
+
+        # Usuario
+        self.usuario = get_user_model().objects.create_superuser(email='admin@foodstack.mx', password='password123')
+        self.client.force_login(user=self.usuario)
+
+        # Cliente
+        self.foodstack = models.Cliente.objects.create(nombre='FOODSTACK TECHNOLOGY')
+        # Sucursal
+        self.demo = models.Sucursal.objects.create(nombre='DEMO', cliente=self.foodstack)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA DEMO', numero=1, sucursal=self.demo)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA DEMO', almacen=self.barra_1)
+
+        # Categoría
+        self.categoria_mezcal = models.Categoria.objects.create(nombre='MEZCAL')
+        # Ingrediente
+        self.mezcal = models.Ingrediente.objects.create(
+            codigo='MEZC001',
+            nombre='MEZCAL DEMO',
+            categoria=self.categoria_mezcal,
+            factor_peso=0.95
+        )
+        # Receta
+        self.copa_mezcal = models.Receta.objects.create(
+            codigo_pos='CMEZC999',
+            nombre='COPA MEZCAL DEMO',
+            sucursal=self.demo
+        )
+        self.ir_mezcal = models.IngredienteReceta.objects.create(receta=self.copa_mezcal, ingrediente=self.mezcal, volumen=60)
+
+        # Carpeta con el histórico
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+
+
+    def test_fecha_archivo(self):
+        """ Testear que la fecha se toma del nombre del archivo """
+
+        self.assertEqual(historico.fecha_archivo('ventas_2019-10-14.csv'), datetime.date(2019, 10, 14))
+        self.assertEqual(historico.fecha_archivo('historico/20191015.xlsx'), datetime.date(2019, 10, 15))
+        self.assertEqual(historico.fecha_archivo('ventas_2019_10_16.csv'), datetime.date(2019, 10, 16))
+        self.assertEqual(historico.fecha_archivo('ventas_2019-13-40.csv'), None)
+        self.assertEqual(historico.fecha_archivo('ventas.csv'), None)
+
+
+    def test_cargar_historico_carpeta(self):
+        """ Testear que cada día de una carpeta se registra con su fecha """
+
+        for nombre in ['ventas_2019-10-14.csv', 'ventas_2019-10-15.csv', 'leeme.txt']:
+            with open(os.path.join(self.carpeta, nombre), 'wb') as f:
+                f.write(contenido_demo())
+
+        dias = []
+        resumen = historico.cargar_historico(self.demo, self.carpeta, al_terminar_dia=dias.append)
+
+        self.assertEqual(resumen['dias'], 2)
+        self.assertEqual(resumen['dias_con_error'], 0)
+        self.assertEqual(resumen['sin_fecha'], ['leeme.txt'])
+        self.assertEqual(resumen['ventas'], 8)
+        self.assertEqual(resumen['consumos'], 8)
+        self.assertEqual([dia['fecha'] for dia in dias], [datetime.date(2019, 10, 14), datetime.date(2019, 10, 15)])
+        self.assertEqual(models.Venta.objects.filter(fecha=datetime.date(2019, 10, 14)).count(), 4)
+        self.assertEqual(models.Venta.objects.filter(fecha=datetime.date(2019, 10, 15)).count(), 4)
+
+
+    def test_cargar_historico_dia_con_error(self):
+        """ Testear que un día con error no impide registrar los demás """
+
+        path_zip = os.path.join(self.carpeta, 'historico.zip')
+        with open(path_zip, 'wb') as f:
+            f.write(zip_historico({
+                'ventas_2019-10-14.csv': contenido_demo(),
+                'ventas_2019-10-15.csv': b'Este es un archivo CSV',
+            }))
+
+        resumen = historico.cargar_historico(self.demo, path_zip)
+
+        self.assertEqual(resumen['dias'], 2)
+        self.assertEqual(resumen['dias_con_error'], 1)
+        self.assertEqual(resumen['errores'][0]['fecha'], datetime.date(2019, 10, 15))
+        self.assertEqual(resumen['ventas'], 4)
+        self.assertEqual(models.Venta.objects.filter(fecha=datetime.date(2019, 10, 15)).count(), 0)
+
+
+    def test_cargar_historico_repetido(self):
+        """ Testear que volver a cargar el mismo histórico no duplica las ventas """
+
+        with open(os.path.join(self.carpeta, 'ventas_2019-10-14.csv'), 'wb') as f:
+            f.write(contenido_demo())
+
+        historico.cargar_historico(self.demo, self.carpeta)
+        resumen = historico.cargar_historico(self.demo, self.carpeta)
+
+        self.assertEqual(resumen['ventas'], 0)
+        self.assertEqual(resumen['duplicados'], 4)
+        self.assertEqual(models.Venta.objects.count(), 4)
+
+
+    def test_command_cargar_historico_ventas(self):
+        """ Testear que el comando muestra el avance por día y el resumen """
+
+        path_zip = os.path.join(self.carpeta, 'historico.zip')
+        with open(path_zip, 'wb') as f:
+            f.write(zip_historico({
+                'ventas_2019-10-14.csv': contenido_demo(),
+                'ventas_2019-10-15.csv': contenido_demo(),
+            }))
+
+        out = StringIO()
+        call_command('cargar_historico_ventas', self.demo.id, path_zip, '--procesos', '1', stdout=out)
+
+        self.assertIn('2019-10-14 - RENGLONES: 4 - VENTAS: 4', out.getvalue())
+        self.assertIn('DIAS: 2 - CON ERROR: 0 - VENTAS: 8 - CONSUMOS: 8', out.getvalue())
+        self.assertEqual(models.Venta.objects.count(), 8)
+
+
+    def test_command_sucursal_inexistente(self):
+        """ Testear que el comando falla si la sucursal no existe """
+
+        with self.assertRaises(CommandError):
+            call_command('cargar_historico_ventas', 999, self.carpeta, stdout=StringIO())
+
+
+    def test_post_historico_encola(self):
+        """ Testear que el endpoint encola un ReporteVentas por día con su fecha """
+
+        contenido_zip = zip_historico({
+            'ventas_2019-10-14.csv': contenido_demo(),
+            'ventas_2019-10-15.csv': contenido_demo() + b'\nCMEZC999,COPA MEZCAL DEMO,2,200',
+            'leeme.txt': b'Historico',
+        })
+        url = reverse('ventas:upload_historico', kwargs={'nombre_sucursal': self.demo.slug})
+
+        res = self.client.post(url, {'historico_zip': SimpleUploadedFile('historico.zip', contenido_zip)})
+
+        self.assertEqual(res.status_code, 202)
+        json_response = res.json()
+        self.assertEqual(len(json_response['reportes']), 2)
+        self.assertEqual(json_response['duplicados'], [])
+        self.assertEqual(json_response['sin_fecha'], ['leeme.txt'])
+
+        fechas = models.ReporteVentas.objects.order_by('fecha').values_list('fecha', flat=True)
+        self.assertEqual(list(fechas), [datetime.date(2019, 10, 14), datetime.date(2019, 10, 15)])
+        self.assertEqual(models.Venta.objects.count(), 0)
+
+
+    def test_post_historico_zip_invalido(self):
+        """ Testear que el endpoint rechaza un archivo que no es .zip """
+
+        url = reverse('ventas:upload_historico', kwargs={'nombre_sucursal': self.demo.slug})
+
+        res = self.client.post(url, {'historico_zip': SimpleUploadedFile('historico.zip', b'Este no es un zip')})
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(models.ReporteVentas.objects.count(), 0)
+
+
+    def test_post_historico_otra_sucursal(self):
+        """ Testear que un usuario no puede cargar el histórico de otra sucursal """
+
+        usuario = get_user_model().objects.create_user(email='user@foodstack.mx', password='password123')
+        self.client.force_login(user=usuario)
+        url = reverse('ventas:upload_historico', kwargs={'nombre_sucursal': self.demo.slug})
+
+        res = self.client.post(url, {'historico_zip': SimpleUploadedFile('historico.zip', zip_historico({}))})
+
+        self.assertEqual(res.status_code, 403)
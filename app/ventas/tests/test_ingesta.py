@@ -0,0 +1,318 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils.six import StringIO
+from django.utils import timezone
+from unittest.mock import patch
+
+import datetime
+import os
+import shutil
+import tempfile
+
+from core import models
+from ventas import ingesta
+
+
+MEDIA_ROOT_TESTS = tempfile.mkdtemp()
+
+
+def archivo_demo():
+    """ Retorna el reporte de ventas de la sucursal DEMO listo para subir """
+
+    path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_demo.csv')
+    with open(path_reporte_ventas, 'rb') as f:
+        return SimpleUploadedFile('ventas_demo.csv', f.read())
+
+
+"""
+------------------------------------------------------------
+TESTS PARA LA INGESTA ASÍNCRONA DE REPORTES DE VENTAS
+------------------------------------------------------------
+"""
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TESTS)
+class IngestaTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TESTS, ignore_errors=True)
+
+
+    def setUp(self):
+
+        self.client = Client()
+
+        # Usuario
+        self.usuario = get_user_model().objects.create_superuser(email='admin@foodstack.mx', password='password123')
+        self.client.force_login(user=self.usuario)
+
+        # Cliente
+        self.foodstack = models.Cliente.objects.create(nombre='FOODSTACK TECHNOLOGY')
+        # Sucursal
+        self.demo = models.Sucursal.objects.create(nombre='DEMO', cliente=self.foodstack)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA DEMO', numero=1, sucursal=self.demo)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA DEMO', almacen=self.barra_1)
+
+        # Categoría
+        self.categoria_mezcal = models.Categoria.objects.create(nombre='MEZCAL')
+        # Ingrediente
+        self.mezcal = models.Ingrediente.objects.create(
+            codigo='MEZC001',
+            nombre='MEZCAL DEMO',
+            categoria=self.categoria_mezcal,
+            factor_peso=0.95
+        )
+        # Receta
+        self.copa_mezcal = models.Receta.objects.create(
+            codigo_pos='CMEZC999',
+            nombre='COPA MEZCAL DEMO',
+            sucursal=self.demo
+        )
+        self.ir_mezcal = models.IngredienteReceta.objects.create(receta=self.copa_mezcal, ingrediente=self.mezcal, volumen=60)
+
+
+    def test_encolar(self):
+        """ Testear que el reporte se guarda PENDIENTE con la fecha de ayer """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        ayer = datetime.date.today() - datetime.timedelta(days=1)
+        self.assertEqual(reporte.estado, models.ReporteVentas.PENDIENTE)
+        self.assertEqual(reporte.fecha, ayer)
+        self.assertEqual(reporte.nombre_archivo, 'ventas_demo.csv')
+        self.assertTrue(os.path.exists(reporte.archivo.path))
+
+
+    def test_procesar_ok(self):
+        """ Testear que el worker registra las ventas del reporte y sus totales """
+
+        ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        reporte = ingesta.tomar_siguiente()
+        self.assertEqual(reporte.estado, models.ReporteVentas.PROCESANDO)
+
+        reporte = ingesta.procesar(reporte)
+
+        self.assertEqual(reporte.estado, models.ReporteVentas.TERMINADO)
+        self.assertEqual(reporte.renglones_procesados, 4)
+        self.assertEqual(reporte.ventas_registradas, 4)
+        self.assertEqual(reporte.consumos_registrados, 4)
+        self.assertEqual(reporte.productos_no_registrados, 0)
+        self.assertEqual(models.Venta.objects.filter(fecha=reporte.fecha).count(), 4)
+        self.assertEqual(ingesta.tomar_siguiente(), None)
+
+
+    @override_settings(VENTAS_TAMANO_BLOQUE=3)
+    def test_procesar_reanuda(self):
+        """ Testear que un reporte interrumpido continúa después del último bloque guardado """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        # Simulamos que un intento anterior guardó el primer bloque y se interrumpió
+        models.ReporteVentas.objects.filter(id=reporte.id).update(
+            estado=models.ReporteVentas.PROCESANDO,
+            timestamp_inicio=timezone.now(),
+            bloques_procesados=1,
+            renglones_procesados=3,
+            ventas_registradas=3
+        )
+
+        # Un reporte que empezó hace poco puede seguir en manos de otro worker
+        self.assertEqual(ingesta.reencolar_interrumpidos(), 0)
+
+        models.ReporteVentas.objects.filter(id=reporte.id).update(timestamp_inicio=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(ingesta.reencolar_interrumpidos(), 1)
+
+        reporte = ingesta.procesar(ingesta.tomar_siguiente())
+
+        self.assertEqual(reporte.estado, models.ReporteVentas.TERMINADO)
+        self.assertEqual(reporte.bloques_procesados, 2)
+        self.assertEqual(reporte.renglones_procesados, 4)
+        self.assertEqual(reporte.ventas_registradas, 4)
+        self.assertEqual(models.Venta.objects.count(), 1)
+
+
+    def test_reencolar_interrumpido_reciente(self):
+        """ Testear que con advisory locks se reencola un reporte recién interrumpido si ningún worker tiene su candado """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        models.ReporteVentas.objects.filter(id=reporte.id).update(
+            estado=models.ReporteVentas.PROCESANDO,
+            timestamp_inicio=timezone.now()
+        )
+
+        with patch('ventas.bloqueos.usa_advisory_locks', return_value=True):
+
+            # Otro worker lo sigue procesando
+            with patch('ventas.bloqueos.sucursal_ocupada', return_value=True) as sucursal_ocupada:
+                self.assertEqual(ingesta.reencolar_interrumpidos(), 0)
+            sucursal_ocupada.assert_called_once_with(self.demo.id, reporte.fecha)
+
+            # El worker que lo procesaba se reinició
+            with patch('ventas.bloqueos.sucursal_ocupada', return_value=False):
+                self.assertEqual(ingesta.reencolar_interrumpidos(), 1)
+
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.estado, models.ReporteVentas.PENDIENTE)
+
+
+    def test_command_reanuda_sin_pendientes(self):
+        """ Testear que el worker reencola los reportes interrumpidos cuando se queda sin pendientes """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        out = StringIO()
+
+        with patch('ventas.ingesta.reencolar_interrumpidos', side_effect=[0, 1, 0]) as reencolar:
+            # El reporte se interrumpe después de que el worker arrancó
+            with patch('ventas.ingesta.tomar_siguiente', side_effect=[None, reporte, None]), \
+                    patch('ventas.ingesta.procesar', return_value=reporte) as procesar:
+                call_command('procesar_reportes_ventas', '--una-vez', '--reanudar', stdout=out)
+
+        self.assertEqual(reencolar.call_count, 3)
+        procesar.assert_called_once_with(reporte)
+
+
+    def test_procesar_error(self):
+        """ Testear que un reporte defectuoso se marca con ERROR y no registra nada """
+
+        archivo_ventas = SimpleUploadedFile('ventas.csv', b'Este es un archivo CSV')
+        ingesta.encolar(archivo_ventas, self.demo, self.usuario)
+
+        reporte = ingesta.procesar(ingesta.tomar_siguiente())
+
+        self.assertEqual(reporte.estado, models.ReporteVentas.ERROR)
+        self.assertIn('ErrorReporte', reporte.errores)
+        self.assertEqual(models.Venta.objects.count(), 0)
+
+
+    def test_post_reporte_ventas_encola(self):
+        """ Testear que el upload solo encola el reporte y retorna su id """
+
+        url = reverse('ventas:upload_ventas', kwargs={'nombre_sucursal': self.demo.slug})
+
+        res = self.client.post(url, {'ventas_csv': archivo_demo()})
+
+        self.assertEqual(res.status_code, 202)
+        reporte = models.ReporteVentas.objects.get()
+        self.assertEqual(res.context['reporte_ventas'].id, reporte.id)
+        self.assertEqual(reporte.usuario, self.usuario)
+        self.assertEqual(models.Venta.objects.count(), 0)
+
+
+    def test_estado_reporte(self):
+        """ Testear que el endpoint de estado retorna el avance del reporte """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        ingesta.procesar(ingesta.tomar_siguiente())
+
+        url = reverse('ventas:estado_reporte', kwargs={'reporte_id': reporte.id})
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        json_response = res.json()
+        self.assertEqual(json_response['id'], reporte.id)
+        self.assertEqual(json_response['estado'], 'TERMINADO')
+        self.assertEqual(json_response['renglones_procesados'], 4)
+        self.assertEqual(json_response['ventas_registradas'], 4)
+        self.assertEqual(json_response['productos_no_registrados'], 0)
+        self.assertEqual(json_response['errores'], '')
+
+
+    def test_estado_reporte_otra_sucursal(self):
+        """ Testear que un usuario no puede consultar los reportes de otra sucursal """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        usuario = get_user_model().objects.create_user(email='user@foodstack.mx', password='password123')
+        self.client.force_login(user=usuario)
+
+        url = reverse('ventas:estado_reporte', kwargs={'reporte_id': reporte.id})
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 403)
+
+
+    def test_command_procesar_reportes_ventas(self):
+        """ Testear que el worker procesa los reportes pendientes y termina con '--una-vez' """
+
+        ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        archivo_ventas = SimpleUploadedFile('ventas_demo_2.csv', b'codigo_pos,nombre,unidades,importe\nCMEZC998,COPA MEZCAL NUEVO,1,120\n')
+        ingesta.encolar(archivo_ventas, self.demo, self.usuario)
+
+        out = StringIO()
+        call_command('procesar_reportes_ventas', '--una-vez', stdout=out)
+
+        self.assertEqual(models.ReporteVentas.objects.filter(estado=models.ReporteVentas.TERMINADO).count(), 2)
+        self.assertEqual(models.Venta.objects.count(), 4)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 1)
+        self.assertIn('VENTAS: 4', out.getvalue())
+
+
+    def test_encolar_archivo_duplicado(self):
+        """ Testear que el mismo archivo no se encola dos veces para la misma sucursal """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        reporte_2, creado_2 = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        self.assertTrue(creado)
+        self.assertFalse(creado_2)
+        self.assertEqual(reporte_2.id, reporte.id)
+        self.assertEqual(models.ReporteVentas.objects.count(), 1)
+
+        # Si el reporte anterior terminó con error, el archivo se puede volver a subir
+        models.ReporteVentas.objects.filter(id=reporte.id).update(estado=models.ReporteVentas.ERROR)
+        reporte_3, creado_3 = ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+
+        self.assertTrue(creado_3)
+        self.assertNotEqual(reporte_3.id, reporte.id)
+
+
+    def test_encolar_archivo_otra_fecha(self):
+        """ Testear que el mismo archivo se encola para cada fecha de un histórico """
+
+        reporte, creado = ingesta.encolar(archivo_demo(), self.demo, self.usuario, datetime.date(2019, 10, 14))
+        reporte_2, creado_2 = ingesta.encolar(archivo_demo(), self.demo, self.usuario, datetime.date(2019, 10, 15))
+        reporte_3, creado_3 = ingesta.encolar(archivo_demo(), self.demo, self.usuario, datetime.date(2019, 10, 15))
+
+        self.assertTrue(creado)
+        self.assertTrue(creado_2)
+        self.assertFalse(creado_3)
+        self.assertEqual(reporte_3.id, reporte_2.id)
+        self.assertEqual(models.ReporteVentas.objects.count(), 2)
+
+
+    def test_post_reporte_ventas_duplicado(self):
+        """ Testear que subir otra vez el mismo archivo muestra el reporte existente """
+
+        url = reverse('ventas:upload_ventas', kwargs={'nombre_sucursal': self.demo.slug})
+
+        self.client.post(url, {'ventas_csv': archivo_demo()})
+        res = self.client.post(url, {'ventas_csv': archivo_demo()})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.context['duplicado'])
+        self.assertEqual(models.ReporteVentas.objects.count(), 1)
+
+
+    def test_procesar_renglones_duplicados(self):
+        """ Testear que los renglones de un reporte que ya estaban registrados se omiten """
+
+        ingesta.encolar(archivo_demo(), self.demo, self.usuario)
+        ingesta.procesar(ingesta.tomar_siguiente())
+
+        # Un reporte nuevo del mismo día con los 4 renglones anteriores y uno más
+        contenido = archivo_demo().read() + b'\nCMEZC999,COPA MEZCAL DEMO,2,200'
+        ingesta.encolar(SimpleUploadedFile('ventas_demo_corregido.csv', contenido), self.demo, self.usuario)
+        reporte = ingesta.procesar(ingesta.tomar_siguiente())
+
+        self.assertEqual(reporte.estado, models.ReporteVentas.TERMINADO)
+        self.assertEqual(reporte.renglones_procesados, 5)
+        self.assertEqual(reporte.renglones_duplicados, 4)
+        self.assertEqual(reporte.ventas_registradas, 1)
+        self.assertEqual(models.Venta.objects.count(), 5)
@@ -0,0 +1,153 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.utils import timezone
+
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+from core import models
+
+import pandas as pd
+
+
+class MatrizRecetasTests(TestCase):
+
+    def setUp(self):
+
+        cache.clear()
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+
+        #Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+        self.categoria_tequila = models.Categoria.objects.create(nombre='TEQUILA')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+        self.herradura_blanco = models.Ingrediente.objects.create(
+            codigo='TEQU001',
+            nombre='HERRADURA BLANCO',
+            categoria=self.categoria_tequila,
+            factor_peso=0.95
+        )
+
+        # Recetas
+        self.trago_licor_43 = models.Receta.objects.create(
+            codigo_pos='00081',
+            nombre='LICOR 43 DERECHO',
+            sucursal=self.magno_brasserie
+        )
+        self.carajillo = models.Receta.objects.create(
+            codigo_pos='00050',
+            nombre='CARAJILLO',
+            sucursal=self.magno_brasserie
+        )
+
+        # Ingredientes-Recetas
+        self.ir_licor_43 = models.IngredienteReceta.objects.create(receta=self.trago_licor_43, ingrediente=self.licor_43, volumen=60)
+        self.ir_carajillo_licor = models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.licor_43, volumen=45)
+        self.ir_carajillo_tequila = models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.herradura_blanco, volumen=15)
+
+
+    def test_explotar_ventas(self):
+        """ Testear que la matriz convierte unidades vendidas en ml por ingrediente """
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+
+        filas = matriz.buscar_filas(['00050', '00081', '99999'])
+        self.assertEqual(filas[2], -1)
+
+        renglon, columna, volumen = matriz.explotar(filas[:2], [2, 3])
+        consumos = sorted(zip(renglon.tolist(), matriz.ingredientes_ids[columna].tolist(), volumen.tolist()))
+
+        self.assertEqual(consumos, [
+            (0, self.licor_43.id, 90),
+            (0, self.herradura_blanco.id, 30),
+            (1, self.licor_43.id, 180),
+        ])
+
+        # Consumo total por ingrediente
+        totales = dict(zip(matriz.ingredientes_ids.tolist(), matriz.consumo_total(filas[:2], [2, 3]).tolist()))
+        self.assertEqual(totales, {self.licor_43.id: 270, self.herradura_blanco.id: 30})
+
+
+    def test_calcular_consumos_dataframe(self):
+        """ Testear el cálculo de consumos de un dataframe completo de ventas """
+
+        df_ventas = pd.DataFrame({
+            'codigo_pos': ['00457', '00050', '00081'],
+            'unidades': [4, 1, 2],
+        })
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        df_consumos = ventas_consumos.calcular_consumos(df_ventas, matriz)
+
+        self.assertEqual(df_consumos['renglon'].tolist(), [1, 1, 2])
+        self.assertEqual(df_consumos['volumen'].sum(), 45 + 15 + 120)
+
+
+    def test_matriz_cache(self):
+        """ Testear que la matriz se toma del cache con un solo query (el de su sello) """
+
+        matriz_recetas.get_matriz(self.magno_brasserie)
+
+        with CaptureQueriesContext(connection) as queries:
+            matriz_recetas.get_matriz(self.magno_brasserie)
+
+        self.assertEqual(len(queries), 1)
+
+
+    def test_matriz_sello(self):
+        """ Testear que la matriz se reconstruye con cambios que no pasan por las señales """
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fila = matriz.buscar_filas(['00081'])
+        self.assertEqual(matriz.consumo_total(fila, [1]).sum(), 60)
+
+        # Un 'update()' no manda señales (igual que un cambio hecho en otro proceso)
+        models.IngredienteReceta.objects.filter(id=self.ir_licor_43.id).update(volumen=45, timestamp_update=timezone.now())
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fila = matriz.buscar_filas(['00081'])
+        self.assertEqual(matriz.consumo_total(fila, [1]).sum(), 45)
+
+        # Un 'bulk_create' tampoco
+        models.Receta.objects.bulk_create([models.Receta(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)])
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        self.assertNotEqual(matriz.buscar_filas(['00457'])[0], -1)
+
+
+    def test_matriz_invalidada(self):
+        """ Testear que la matriz se reconstruye cuando cambia una receta """
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fila = matriz.buscar_filas(['00081'])
+        self.assertEqual(matriz.consumo_total(fila, [1]).sum(), 60)
+
+        # Modificamos el volumen de la receta
+        self.ir_licor_43.volumen = 45
+        self.ir_licor_43.save()
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fila = matriz.buscar_filas(['00081'])
+        self.assertEqual(matriz.consumo_total(fila, [1]).sum(), 45)
+
+        # Registramos una receta nueva
+        models.Receta.objects.create(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        self.assertNotEqual(matriz.buscar_filas(['00457'])[0], -1)
+
+        # Eliminamos un ingrediente de la receta
+        self.ir_carajillo_tequila.delete()
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fila = matriz.buscar_filas(['00050'])
+        self.assertEqual(matriz.consumo_total(fila, [1]).sum(), 45)
@@ -1,11 +1,20 @@
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
 
 from ventas.parsers import parser_magno_brasserie
 from ventas.parsers import parser_gambinos_saopaulo
 from ventas.parsers import parser_pecos
 from ventas.parsers import parser_kinkin
 from ventas.parsers import parser_demo
+from ventas.parsers import motor
+from ventas.parsers import registro
+from ventas.parsers import firmas
+from ventas.parsers.especificaciones import ESPECIFICACIONES, ALTERNOS
+from unittest.mock import patch
+from io import StringIO
 
 from core import models
 import os
@@ -310,6 +319,27 @@ class ParserPecosTests(TestCase):
         self.assertEqual(output_esperado, output_parser)
 
 
+    def test_mapeo_cajas_especificacion(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que un MapeoCaja con la columna default reparte las ventas
+        del reporte real de la sucursal con su especificación
+        ----------------------------------------------------------------------
+        """
+
+        barra_2 = models.Almacen.objects.create(nombre='BARRA 2', numero=2, sucursal=self.pecos)
+        caja_2 = models.Caja.objects.create(numero=2, nombre='CAJA 2', almacen=barra_2)
+        models.MapeoCaja.objects.create(sucursal=self.pecos, valor='brandy', caja=caja_2)
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_pecos.XLS')
+        output_parser = motor.parsear(path_reporte_ventas, self.pecos, ESPECIFICACIONES['PECOS'])
+
+        # Los tres primeros productos son del grupo BRANDY
+        df_ventas = output_parser['df_ventas'].head(4)
+        self.assertEqual(df_ventas['codigo_pos'].tolist(), ['14001', '14007', '14008', '43028'])
+        self.assertEqual(df_ventas['caja_id'].tolist(), [caja_2.id, caja_2.id, caja_2.id, self.caja_1.id])
+
+
 class ParserKinkinTests(TestCase):
 
     maxDiff = None
@@ -493,3 +523,436 @@ class ParserDemoTests(TestCase):
         # Comparamos el output esperado contra el real
         self.assertEqual(output_esperado, output_parser)
 
+
+class MotorParserTests(TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora = models.Cliente.objects.create(nombre='OPERADORA NUEVA')
+        # Sucursal
+        self.sucursal = models.Sucursal.objects.create(nombre='BAR NUEVO', cliente=self.operadora)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.sucursal)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+        # Especificación de un restaurante sin módulo de parser propio
+        self.especificacion = {
+            'lector': 'csv',
+            'opciones': {},
+            'columnas': {'Clave': 'codigo_pos', 'Producto': 'nombre', 'Grupo': 'categoria', 'Cantidad': 'unidades', 'Total': 'importe'},
+            'requeridos': ['codigo_pos'],
+            'excluir': {'codigo_pos': ['PF', 'BEB'], 'categoria': ['CERVEZAS']},
+            'numericos': {'unidades': 'redondear', 'importe': 'truncar'},
+            'descartar_ceros': ['unidades'],
+            'barra': 'BARRA 1',
+        }
+
+
+    def test_procesar_ok(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que la especificación filtra y limpia el reporte en una pasada
+        ----------------------------------------------------------------------
+        """
+
+        df_reporte = pd.DataFrame({
+            'Clave': ['TEQ001', 'PF001', 'BEB002', None, 'CVZ003', 'WHI004', 'MEZ005'],
+            'Producto': ['HERRADURA', 'ARRACHERA', 'LIMONADA', 'SIN CLAVE', 'CORONA', 'JW BLACK', 'MEZCAL'],
+            'Grupo': ['TEQUILA', 'COMIDA', 'BEBIDAS', 'OTROS', 'CERVEZAS', 'WHISKY', 'MEZCAL'],
+            'Cantidad': [2.6, 1, 1, 1, 4, 0.2, 1],
+            'Total': ['$1,950.75', '$300', '$40', '$10', '$200', '$10.00', '90.9'],
+        })
+
+        df_ventas = motor.procesar(df_reporte, self.especificacion, self.sucursal.id, self.caja_1.id)
+        output = json.loads(df_ventas.to_json(orient='records'))
+
+        output_esperado = [
+            {
+                'sucursal_id': self.sucursal.id,
+                'caja_id': self.caja_1.id,
+                'codigo_pos': 'TEQ001',
+                'nombre': 'HERRADURA',
+                'unidades': 3,
+                'importe': 1950
+            },
+            {
+                'sucursal_id': self.sucursal.id,
+                'caja_id': self.caja_1.id,
+                'codigo_pos': 'MEZ005',
+                'nombre': 'MEZCAL',
+                'unidades': 1,
+                'importe': 90
+            },
+        ]
+
+        self.assertEqual(output_esperado, output)
+        self.assertEqual(list(df_ventas.columns), motor.COLUMNAS_VENTAS)
+
+
+    def test_convertir_entero_error(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que un importe vacío arroja un error
+        ----------------------------------------------------------------------
+        """
+
+        columna = pd.Series(['$100.00', None], name='importe')
+
+        with self.assertRaises(ValueError):
+            motor.convertir_entero(columna, 'truncar')
+
+
+    def test_get_parser_especificacion(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que una sucursal sin módulo propio usa su especificación
+        ----------------------------------------------------------------------
+        """
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_demo.csv')
+        especificacion = dict(ESPECIFICACIONES['DEMO'], barra='BARRA 1')
+
+        with patch.dict(ESPECIFICACIONES, {self.sucursal.slug: especificacion}):
+            registro.cargar_registro()
+            parser_sucursal = registro.get_parser(self.sucursal)
+            output_parser = parser_sucursal(path_reporte_ventas, self.sucursal)
+        registro.cargar_registro()
+
+        self.assertEqual(output_parser['procesado'], True)
+        self.assertEqual(len(output_parser['df_ventas']), 4)
+        self.assertEqual(output_parser['df_ventas'].iloc[0]['caja_id'], self.caja_1.id)
+
+
+    def test_get_parser_modulo(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que una sucursal con módulo propio usa el parser del módulo
+        ----------------------------------------------------------------------
+        """
+
+        sucursal = models.Sucursal.objects.create(nombre='MAGNO BRASSERIE', cliente=self.operadora)
+
+        self.assertEqual(registro.get_parser(sucursal), parser_magno_brasserie.parser)
+        self.assertEqual(registro.ORIGENES['MAGNO-BRASSERIE'], 'modulo')
+
+
+    def test_get_parser_no_existe(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que una sucursal sin módulo ni especificación arroja un error
+        ----------------------------------------------------------------------
+        """
+
+        with self.assertRaises(registro.ParserNoEncontrado):
+            registro.get_parser(self.sucursal)
+
+
+    def test_registro_modulo_invalido(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que un módulo de parser sin la función 'parser(archivo,
+        sucursal)' se detecta al cargar el registro
+        ----------------------------------------------------------------------
+        """
+
+        with patch.object(parser_demo, 'parser', lambda ventas_csv: None):
+            with self.assertRaises(ImproperlyConfigured):
+                registro.cargar_registro()
+
+        with patch.object(parser_demo, 'parser', None):
+            with self.assertRaises(ImproperlyConfigured):
+                registro.cargar_registro()
+
+        registro.cargar_registro()
+
+
+    def test_registro_especificacion_invalida(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que una especificación incompleta se detecta al cargar el
+        registro
+        ----------------------------------------------------------------------
+        """
+
+        especificacion = dict(self.especificacion, lector='pdf')
+
+        with patch.dict(ESPECIFICACIONES, {'BAR-NUEVO': especificacion}):
+            with self.assertRaises(ImproperlyConfigured):
+                registro.cargar_registro()
+
+        del especificacion['lector']
+        with patch.dict(ESPECIFICACIONES, {'BAR-NUEVO': especificacion}):
+            with self.assertRaises(ImproperlyConfigured):
+                registro.cargar_registro()
+
+        registro.cargar_registro()
+
+
+    def test_command_revisar_parsers(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que el comando lista las sucursales sin parser
+        ----------------------------------------------------------------------
+        """
+
+        models.Sucursal.objects.create(nombre='PECOS', cliente=self.operadora)
+
+        out = StringIO()
+        call_command('revisar_parsers', stdout=out)
+
+        self.assertIn('PECOS - MODULO', out.getvalue())
+        self.assertIn('SIN PARSER: BAR-NUEVO ({})'.format(self.sucursal.id), out.getvalue())
+        self.assertNotIn('SIN PARSER: PECOS', out.getvalue())
+        self.assertIn('SUCURSALES SIN PARSER: 1', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('revisar_parsers', '--estricto', stdout=StringIO())
+
+
+    def test_leer_bloques_csv(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que el pie del reporte se descarta aunque quede partido entre
+        dos bloques
+        ----------------------------------------------------------------------
+        """
+
+        especificacion = dict(self.especificacion, opciones={'skipfooter': 2}, excluir={}, descartar_ceros=[])
+        reporte = 'Clave,Producto,Grupo,Cantidad,Total\n'
+        reporte += ''.join('C{0},PRODUCTO {0},GRUPO,1,$10\n'.format(i) for i in range(5))
+        reporte += ',TOTAL,,5,$50\n,FIN,,,\n'
+
+        bloques = list(motor.leer_bloques(StringIO(reporte), especificacion, 3))
+
+        self.assertEqual([len(bloque) for bloque in bloques], [1, 3, 1])
+        df_ventas = pd.concat([motor.procesar(bloque, especificacion, self.sucursal.id, self.caja_1.id) for bloque in bloques])
+        self.assertEqual(df_ventas['codigo_pos'].tolist(), ['C0', 'C1', 'C2', 'C3', 'C4'])
+        self.assertEqual(df_ventas['importe'].sum(), 50)
+
+
+    def test_parsear_bloques_xlsx(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que leer un .xlsx por bloques da el mismo resultado que leerlo
+        completo
+        ----------------------------------------------------------------------
+        """
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_gambinos_saopaulo.xlsx')
+        especificacion = ESPECIFICACIONES['GAMBINOS-SAOPAULO']
+
+        df_completo = motor.parsear(path_reporte_ventas, self.sucursal, especificacion)['df_ventas']
+        bloques = list(motor.parsear_bloques(path_reporte_ventas, self.sucursal, especificacion, 10))
+
+        self.assertGreater(len(bloques), 1)
+        self.assertTrue(df_completo.equals(pd.concat(bloques)))
+
+
+    def test_leer_bloques_xls(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que leer un .xls por bloques da las mismas columnas que
+        'pd.read_excel', sin el encabezado ni el pie del reporte
+        ----------------------------------------------------------------------
+        """
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_magno_brasserie.xls')
+        especificacion = ESPECIFICACIONES['MAGNO-BRASSERIE']
+        columnas = list(especificacion['columnas'])
+
+        df_esperado = pd.read_excel(path_reporte_ventas, **especificacion['opciones']).loc[:, columnas]
+        bloques = list(motor.leer_bloques(path_reporte_ventas, especificacion, 10))
+
+        self.assertEqual(list(bloques[0].columns), columnas)
+        self.assertTrue(df_esperado.reset_index(drop=True).equals(pd.concat(bloques).reset_index(drop=True)))
+
+
+    def test_leer_bloques_excel_pie_vacio(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que los renglones vacíos del pie cuentan para 'skipfooter',
+        igual que en 'pd.read_excel'
+        ----------------------------------------------------------------------
+        """
+
+        renglones = iter([
+            ('REPORTE', None, None),
+            ('Clave', 'Cantidad', 'Total'),
+            ('C1', 1, 10),
+            (None, None, None),
+            ('C2', 2, 20),
+            (None, None, None),
+            ('TOTAL', None, 30),
+        ])
+        opciones = {'header': 1, 'skipfooter': 2, 'dtype': {'Clave': str}}
+
+        df_reporte = pd.concat(motor.leer_bloques_excel(renglones, opciones, ['Clave', 'Total'], 1))
+
+        self.assertEqual(df_reporte['Clave'].tolist(), ['C1', 'C2'])
+        self.assertEqual(df_reporte['Total'].tolist(), [10, 20])
+
+
+    def test_parsear_bloques_error(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que un reporte defectuoso arroja ErrorReporte
+        ----------------------------------------------------------------------
+        """
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'reporte_defectuoso.csv')
+
+        with self.assertRaises(motor.ErrorReporte):
+            list(motor.parsear_bloques(path_reporte_ventas, self.sucursal, self.especificacion, 10))
+
+
+    def test_procesar_mapeo_cajas(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que los renglones se reparten entre las cajas según la
+        terminal y, si no coincide, según la categoría
+        ----------------------------------------------------------------------
+        """
+
+        especificacion = dict(self.especificacion, columnas=dict(self.especificacion['columnas'], Terminal='terminal'), excluir={})
+        df_reporte = pd.DataFrame({
+            'Clave': ['TEQ001', 'WHI002', 'MEZ003', 'VOD004', 'RON005'],
+            'Producto': ['HERRADURA', 'JW BLACK', 'MEZCAL', 'ABSOLUT', 'BACARDI'],
+            'Grupo': ['TEQUILA', 'WHISKY', 'MEZCAL', 'VODKA', 'TERRAZA'],
+            'Terminal': [1.0, 2.0, ' t2 ', None, None],
+            'Cantidad': [1, 1, 1, 1, 1],
+            'Total': [100, 100, 100, 100, 100],
+        })
+        mapeo_cajas = [('terminal', {'1': 11, '2': 22, 'T2': 22}), ('categoria', {'TERRAZA': 33})]
+
+        df_ventas = motor.procesar(df_reporte, especificacion, self.sucursal.id, self.caja_1.id, mapeo_cajas)
+
+        self.assertEqual(df_ventas['caja_id'].tolist(), [11, 22, 22, self.caja_1.id, 33])
+        self.assertEqual(list(df_ventas.columns), motor.COLUMNAS_VENTAS)
+
+
+    def test_parsear_mapeo_cajas(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que 'parsear' toma los mapeos de cajas de la sucursal e ignora
+        los que apuntan a cajas de otra sucursal
+        ----------------------------------------------------------------------
+        """
+
+        barra_2 = models.Almacen.objects.create(nombre='BARRA 2', numero=2, sucursal=self.sucursal)
+        caja_2 = models.Caja.objects.create(numero=2, nombre='CAJA 2', almacen=barra_2)
+        otra_sucursal = models.Sucursal.objects.create(nombre='OTRO BAR', cliente=self.operadora)
+        otra_barra = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=otra_sucursal)
+        otra_caja = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=otra_barra)
+
+        models.MapeoCaja.objects.create(sucursal=self.sucursal, columna='terminal', valor='2', caja=caja_2)
+        models.MapeoCaja.objects.create(sucursal=self.sucursal, columna='terminal', valor='3', caja=otra_caja)
+
+        especificacion = dict(self.especificacion, columnas=dict(self.especificacion['columnas'], Caja='terminal'))
+        reporte = 'Clave,Producto,Grupo,Caja,Cantidad,Total\nTEQ001,HERRADURA,TEQUILA,1,1,$100\nTEQ001,HERRADURA,TEQUILA,2,1,$100\nWHI002,JW BLACK,WHISKY,3,1,$100\n'
+
+        output_parser = motor.parsear(StringIO(reporte), self.sucursal, especificacion)
+
+        self.assertEqual(output_parser['procesado'], True)
+        self.assertEqual(output_parser['df_ventas']['caja_id'].tolist(), [self.caja_1.id, caja_2.id, self.caja_1.id])
+
+
+class FirmasTests(TestCase):
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+
+    def path_reporte(self, nombre_archivo):
+        return os.path.join(os.path.dirname(os.path.realpath(__file__)), nombre_archivo)
+
+
+    def test_tipo_archivo(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que el tipo de archivo se reconoce por sus primeros bytes y no
+        por su extensión
+        ----------------------------------------------------------------------
+        """
+
+        tipos = {
+            'ventas_magno_brasserie.xls': 'xls',
+            'ventas_pecos.XLS': 'xlsx',
+            'ventas_gambinos_saopaulo.xlsx': 'xlsx',
+            'ventas_kinkin.csv': 'csv',
+        }
+
+        for nombre_archivo, tipo in tipos.items():
+            inicio = firmas.leer_inicio(self.path_reporte(nombre_archivo), 8)
+            self.assertEqual(firmas.tipo_archivo(inicio), tipo)
+
+
+    def test_detectar(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que cada reporte de prueba se reconoce con la especificación
+        de su sucursal
+        ----------------------------------------------------------------------
+        """
+
+        reportes = {
+            'ventas_magno_brasserie.xls': ESPECIFICACIONES['MAGNO-BRASSERIE'],
+            'ventas_magno_brasserie.csv': ALTERNOS['MAGNO-BRASSERIE'][0],
+            'ventas_gambinos_saopaulo.xlsx': ESPECIFICACIONES['GAMBINOS-SAOPAULO'],
+            'ventas_pecos.XLS': ESPECIFICACIONES['PECOS'],
+            'ventas_kinkin.csv': ESPECIFICACIONES['KINKIN'],
+            'ventas_demo.csv': ESPECIFICACIONES['DEMO'],
+        }
+        especificaciones = list(ESPECIFICACIONES.values()) + ALTERNOS['MAGNO-BRASSERIE']
+
+        for nombre_archivo, especificacion in reportes.items():
+            self.assertIs(firmas.detectar(self.path_reporte(nombre_archivo), especificaciones), especificacion)
+
+        self.assertIsNone(firmas.detectar(self.path_reporte('reporte_defectuoso.csv'), especificaciones))
+
+
+    def test_detectar_no_mueve_archivo(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que al reconocer el formato el archivo queda en su posición
+        ----------------------------------------------------------------------
+        """
+
+        with open(self.path_reporte('ventas_gambinos_saopaulo.xlsx'), 'rb') as archivo:
+            firmas.detectar(archivo, [ESPECIFICACIONES['GAMBINOS-SAOPAULO']])
+            self.assertEqual(archivo.tell(), 0)
+
+        with open(self.path_reporte('ventas_magno_brasserie.csv'), 'rb') as archivo:
+            firmas.detectar(archivo, ALTERNOS['MAGNO-BRASSERIE'])
+            self.assertEqual(archivo.tell(), 0)
+
+
+    def test_get_parser_archivo_alterno(self):
+        """
+        ----------------------------------------------------------------------
+        Testear que un reporte en el formato alterno de la sucursal se procesa
+        con su especificación y el formato principal con su módulo
+        ----------------------------------------------------------------------
+        """
+
+        path_csv = self.path_reporte('ventas_magno_brasserie.csv')
+        path_xls = self.path_reporte('ventas_magno_brasserie.xls')
+
+        output_parser = registro.get_parser_archivo(path_csv, self.magno_brasserie)(path_csv, self.magno_brasserie)
+
+        self.assertEqual(output_parser['procesado'], True)
+        self.assertEqual(output_parser['df_ventas']['codigo_pos'].tolist(), ['00050', '00126', '00167', '00081'])
+        self.assertEqual(output_parser['df_ventas']['importe'].tolist(), [285, 112, 340, 170])
+        self.assertEqual(registro.get_parser_archivo(path_xls, self.magno_brasserie), parser_magno_brasserie.parser)
+
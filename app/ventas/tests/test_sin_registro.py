@@ -0,0 +1,183 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+from unittest.mock import patch
+from ventas import matriz_recetas
+from ventas import ventas_consumos
+from ventas import sin_registro
+from core import models
+
+import datetime
+import pandas as pd
+
+
+class SinRegistroTests(TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+        # Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+        self.aperol = models.Ingrediente.objects.create(
+            codigo='LICO002',
+            nombre='APEROL',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+
+        # Recetas
+        self.carajillo = models.Receta.objects.create(
+            codigo_pos='00050',
+            nombre='CARAJILLO',
+            sucursal=self.magno_brasserie
+        )
+        self.ir_carajillo = models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.licor_43, volumen=45)
+
+        self.fecha_1 = datetime.date(2019, 10, 14)
+        self.fecha_2 = datetime.date(2019, 10, 15)
+
+
+    def df_reporte(self, unidades=1):
+        """ Retorna un reporte de ventas con dos renglones sin receta registrada """
+
+        return pd.DataFrame({
+            'sucursal_id': [self.magno_brasserie.id] * 3,
+            'caja_id': [self.caja_1.id] * 3,
+            'codigo_pos': ['00050', '00457', '00457'],
+            'nombre': ['CARAJILLO', 'APEROL SPRITZ', 'APEROL SPRITZ'],
+            'unidades': [unidades] * 3,
+            'importe': [100] * 3
+        })
+
+
+    def test_acumular_resumen(self):
+        """ Testear que cada reporte suma sus productos sin registro al resumen de su código """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_2)
+        ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie, self.fecha_1)
+
+        resumen = models.ResumenSinRegistro.objects.get()
+
+        self.assertEqual(resumen.codigo_pos, '00457')
+        self.assertEqual(resumen.renglones, 4)
+        self.assertEqual(resumen.unidades, 6)
+        self.assertEqual(resumen.importe, 400)
+        self.assertEqual(resumen.primera_fecha, self.fecha_1)
+        self.assertEqual(resumen.ultima_fecha, self.fecha_2)
+        # Los renglones se guardan con la fecha de sus ventas
+        self.assertEqual(models.ProductoSinRegistro.objects.filter(fecha=self.fecha_1).count(), 2)
+
+
+    @override_settings(VENTAS_DUPLICADOS='actualizar')
+    def test_acumular_resumen_actualizar(self):
+        """ Testear que un reporte corregido reemplaza sus renglones en el resumen """
+
+        ventas_consumos.registrar(self.df_reporte(unidades=1), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=3), self.magno_brasserie, self.fecha_1)
+
+        resumen = models.ResumenSinRegistro.objects.get()
+
+        self.assertEqual(resumen.renglones, 2)
+        self.assertEqual(resumen.unidades, 6)
+
+
+    def test_recalcular(self):
+        """ Testear que el resumen se reconstruye con un GROUP BY de los productos sin registro """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        models.ResumenSinRegistro.objects.update(unidades=0, renglones=0)
+
+        total = sin_registro.recalcular(self.magno_brasserie)
+
+        resumen = models.ResumenSinRegistro.objects.get()
+        self.assertEqual(total, 1)
+        self.assertEqual(resumen.renglones, 2)
+        self.assertEqual(resumen.unidades, 2)
+        self.assertEqual(resumen.primera_fecha, self.fecha_1)
+
+
+    def test_reatribuir(self):
+        """ Testear que al registrar la receta de un código sus renglones pendientes se vuelven ventas """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie, self.fecha_2)
+
+        spritz = models.Receta.objects.create(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+        models.IngredienteReceta.objects.create(receta=spritz, ingrediente=self.aperol, volumen=90)
+
+        totales = sin_registro.reatribuir(self.magno_brasserie)
+
+        self.assertEqual(totales, {'ventas': 4, 'consumos': 4, 'codigos': 1})
+        self.assertEqual(models.Venta.objects.filter(receta=spritz, fecha=self.fecha_2).count(), 2)
+        self.assertEqual(sorted(models.ConsumoRecetaVendida.objects.filter(receta=spritz).values_list('volumen', flat=True)), [90, 90, 180, 180])
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
+        self.assertEqual(models.ResumenSinRegistro.objects.count(), 0)
+
+        # Las ventas conservan la huella del renglón: el mismo reporte otra vez es duplicado
+        resultado = ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        self.assertEqual(resultado['duplicados'], 3)
+
+
+    def test_reatribuir_sin_receta(self):
+        """ Testear que los códigos sin receta siguen pendientes """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+
+        totales = sin_registro.reatribuir(self.magno_brasserie)
+
+        self.assertEqual(totales, {'ventas': 0, 'consumos': 0, 'codigos': 0})
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 2)
+        self.assertEqual(models.ResumenSinRegistro.objects.get().renglones, 2)
+
+
+    def test_reatribuir_fuera_de_matriz(self):
+        """ Testear que un código que no está en la matriz de recetas sigue pendiente """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        ventas = models.Venta.objects.count()
+
+        # Una matriz construida antes de registrar la receta no tiene el código
+        matriz = matriz_recetas.construir_matriz(self.magno_brasserie.id)
+        models.Receta.objects.create(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+
+        with patch('ventas.matriz_recetas.get_matriz', return_value=matriz):
+            totales = sin_registro.reatribuir(self.magno_brasserie)
+
+        self.assertEqual(totales, {'ventas': 0, 'consumos': 0, 'codigos': 0})
+        self.assertEqual(models.Venta.objects.count(), ventas)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 2)
+
+
+    def test_command_reatribuir_sin_registro(self):
+        """ Testear el comando que reatribuye los productos sin registro """
+
+        ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie, self.fecha_1)
+        models.Receta.objects.create(codigo_pos='00457', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+
+        out = StringIO()
+        call_command('reatribuir_sin_registro', '--sucursal', str(self.magno_brasserie.id), '--recalcular', stdout=out)
+
+        self.assertIn('MAGNO-BRASSERIE - VENTAS: 2 - CONSUMOS: 0 - CODIGOS: 1', out.getvalue())
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
+
+        with self.assertRaises(CommandError):
+            call_command('reatribuir_sin_registro', '--sucursal', '0', stdout=StringIO())
@@ -2,9 +2,11 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from unittest.mock import patch
 
 import pandas as pd
+import os
 
 from core import models
 from ventas import views
@@ -83,6 +85,8 @@ TESTS PARA LOS TEMPLATES DE VENTAS
 ------------------------------------------------------------
 """
 
+# Estos tests cubren el registro de ventas dentro del request (sin encolar el reporte)
+@override_settings(VENTAS_INGESTA_ASINCRONA=False)
 class TemplateTests(TestCase):
 
     def setUp(self):
@@ -279,6 +283,44 @@ class TemplateTests(TestCase):
         self.assertEqual(res.context['mensaje_error'], 'Hubo un error al procesar el reporte de ventas.')
 
 
+    @override_settings(VENTAS_LIMITE_STREAMING=0, VENTAS_TAMANO_BLOQUE=10)
+    def test_post_reporte_ventas_por_bloques(self):
+        """ Testear que un reporte más grande que el límite se registra por bloques """
+
+        sucursal = self.magno_brasserie
+        url = reverse('ventas:upload_ventas', kwargs={'nombre_sucursal': sucursal.slug})
+
+        path_reporte_ventas = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_magno_brasserie.xls')
+        with open(path_reporte_ventas, 'rb') as f:
+            archivo_ventas = SimpleUploadedFile('ventas_magno_brasserie.xls', f.read())
+
+        res = self.client.post(url, {'ventas_csv': archivo_ventas}, follow=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context['resultado_parser']['procesado'], True)
+        # Ningún producto del reporte tiene receta en la sucursal de prueba
+        self.assertEqual(res.context['resumen']['ventas'], 0)
+        self.assertEqual(res.context['resumen']['productos_no_registrados'], 27)
+        self.assertGreater(res.context['resumen']['bloques'], 1)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 27)
+
+
+    @override_settings(VENTAS_LIMITE_STREAMING=0)
+    def test_post_reporte_ventas_por_bloques_error(self):
+        """ Testear que un reporte defectuoso procesado por bloques notifica el error """
+
+        sucursal = self.magno_brasserie
+        url = reverse('ventas:upload_ventas', kwargs={'nombre_sucursal': sucursal.slug})
+
+        archivo_ventas = SimpleUploadedFile('ventas.csv', b'Este es un archivo CSV')
+
+        res = self.client.post(url, {'ventas_csv': archivo_ventas}, follow=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context['mensaje_error'], 'Hubo un error al procesar el reporte de ventas.')
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
+
+
     def test_archivo_ventas_no_valido(self):
         """ Testear que el archivo de ventas no es del tipo permitido """
 
@@ -1,10 +1,18 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.core.management import call_command
+from django.utils.six import StringIO
 from ventas import ventas_consumos
+from ventas import carga_copy
+from ventas import matriz_recetas
 from core import models
 
+import datetime
 import json
 import os
 import pandas as pd
+from collections import Counter
 
 
 
@@ -184,7 +192,242 @@ class VentasConsumosTests(TestCase):
         self.assertEqual(productos_sin_registro, 1)
 
 
+    def test_consumos_receta_varios_ingredientes(self):
+        """ Testear que se registra un consumo por cada ingrediente de la receta """
 
+        # Agregamos un segundo ingrediente al carajillo
+        models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.herradura_blanco, volumen=15)
 
+        payload = {
+            'sucursal_id': [self.magno_brasserie.id, self.magno_brasserie.id],
+            'caja_id': [self.caja_1.id, self.caja_1.id],
+            'codigo_pos': ['00050', '00081'],
+            'nombre': ['CARAJILLO', 'LICOR 43'],
+            'unidades': [3, 2],
+            'importe': [285, 340]
+        }
+        df_test = pd.DataFrame(payload)
+
+        resultado = ventas_consumos.registrar(df_test, self.magno_brasserie)
+
+        # Cotejamos los volúmenes consumidos por la venta del carajillo
+        consumos_carajillo = models.ConsumoRecetaVendida.objects.filter(receta=self.carajillo)
+        volumenes = {consumo.ingrediente.id: consumo.volumen for consumo in consumos_carajillo}
+        self.assertEqual(volumenes, {self.licor_43.id: 135, self.herradura_blanco.id: 45})
+
+        # Cotejamos que el resultado conserva el formato del registro renglón por renglón
+        self.assertEqual(len(resultado['ventas_consumos']), 2)
+        self.assertEqual(len(resultado['ventas_consumos'][0]['consumos']), 2)
+        self.assertEqual(len(resultado['ventas_consumos'][1]['consumos']), 1)
+        self.assertIn('RECETA: CARAJILLO', resultado['ventas_consumos'][0]['venta'])
+        self.assertIn('VOLUMEN 120', resultado['ventas_consumos'][1]['consumos'][0])
+        self.assertEqual(resultado['productos_no_registrados'], [])
+
+
+    def test_registro_bulk_queries(self):
+        """ Testear que el número de queries no crece con el número de renglones del reporte """
+
+        if not connection.features.can_return_ids_from_bulk_insert:
+            self.skipTest('La base de datos no retorna ids en bulk_create')
+
+        def queries_registrar(renglones):
+            payload = {
+                'sucursal_id': [self.magno_brasserie.id] * renglones,
+                'caja_id': [self.caja_1.id] * renglones,
+                'codigo_pos': ['00050', '00126', '00167', '00081', '00457'] * (renglones // 5),
+                'nombre': ['CARAJILLO', 'CT HERRADURA BLANCO', 'CW JOHNNIE WALKER', 'LICOR 43', 'APEROL SPRITZ'] * (renglones // 5),
+                'unidades': [1] * renglones,
+                'importe': [100] * renglones
+            }
+            df_test = pd.DataFrame(payload)
+
+            # Cada carga se deshace al terminar para que las dos partan del mismo estado
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    resultado = ventas_consumos.registrar(df_test, self.magno_brasserie)
+
+                self.assertEqual(models.Venta.objects.count(), renglones * 4 // 5)
+                self.assertEqual(models.ConsumoRecetaVendida.objects.count(), renglones * 4 // 5)
+                self.assertEqual(models.ProductoSinRegistro.objects.count(), renglones // 5)
+                self.assertEqual(len(resultado['productos_no_registrados']), renglones // 5)
+                transaction.set_rollback(True)
+
+            return len(queries)
+
+        # La matriz de recetas se construye una sola vez y queda en cache
+        matriz_recetas.get_matriz(self.magno_brasserie)
+
+        self.assertEqual(queries_registrar(100), queries_registrar(500))
+
+
+    def test_registrar_por_bloques(self):
+        """ Testear que un reporte en bloques se registra completo y retorna los totales """
+
+        def bloque(codigos):
+            return pd.DataFrame({
+                'sucursal_id': [self.magno_brasserie.id] * len(codigos),
+                'caja_id': [self.caja_1.id] * len(codigos),
+                'codigo_pos': codigos,
+                'nombre': ['PRODUCTO'] * len(codigos),
+                'unidades': [2] * len(codigos),
+                'importe': [100] * len(codigos)
+            })
+
+        bloques_ventas = (bloque(codigos) for codigos in [['00050', '00126', '00457'], ['00167', '00081'], []])
+
+        resumen = ventas_consumos.registrar_por_bloques(bloques_ventas, self.magno_brasserie)
+
+        self.assertEqual(resumen, {
+            'bloques': 3,
+            'renglones': 5,
+            'ventas': 4,
+            'consumos': 4,
+            'productos_no_registrados': 1,
+            'duplicados': 0
+        })
+        self.assertEqual(models.Venta.objects.count(), 4)
+        self.assertEqual(models.ConsumoRecetaVendida.objects.get(receta=self.carajillo).volumen, 90)
+        self.assertEqual(models.ProductoSinRegistro.objects.get().codigo_pos, '00457')
+
+
+    def test_registrar_por_bloques_error(self):
+        """ Testear que si un bloque falla no se registra ningún bloque """
+
+        def bloques_ventas():
+            yield pd.DataFrame({
+                'sucursal_id': [self.magno_brasserie.id],
+                'caja_id': [self.caja_1.id],
+                'codigo_pos': ['00050'],
+                'nombre': ['CARAJILLO'],
+                'unidades': [1],
+                'importe': [100]
+            })
+            raise ValueError('Reporte defectuoso')
+
+        with self.assertRaises(ValueError):
+            ventas_consumos.registrar_por_bloques(bloques_ventas(), self.magno_brasserie)
+
+        self.assertEqual(models.Venta.objects.count(), 0)
+        self.assertEqual(models.ConsumoRecetaVendida.objects.count(), 0)
+
+
+    def df_reporte(self, unidades=1):
+        """ Retorna un reporte de ventas con un renglón repetido """
+
+        return pd.DataFrame({
+            'sucursal_id': [self.magno_brasserie.id] * 4,
+            'caja_id': [self.caja_1.id] * 4,
+            'codigo_pos': ['00050', '00126', '00050', '00457'],
+            'nombre': ['CARAJILLO', 'CT HERRADURA BLANCO', 'CARAJILLO', 'APEROL SPRITZ'],
+            'unidades': [unidades] * 4,
+            'importe': [100] * 4
+        })
+
+
+    def test_registrar_reporte_duplicado(self):
+        """ Testear que registrar el mismo reporte dos veces no duplica ventas ni consumos """
+
+        resultado = ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie)
+        self.assertEqual(resultado['duplicados'], 0)
+        # Los renglones repetidos dentro del mismo reporte sí se registran
+        self.assertEqual(models.Venta.objects.filter(receta=self.carajillo).count(), 2)
+
+        resultado = ventas_consumos.registrar(self.df_reporte(), self.magno_brasserie)
+
+        self.assertEqual(resultado['duplicados'], 4)
+        self.assertEqual(resultado['ventas_consumos'], [])
+        self.assertEqual(models.Venta.objects.count(), 3)
+        self.assertEqual(models.ConsumoRecetaVendida.objects.count(), 3)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 1)
+
+
+    @override_settings(VENTAS_DUPLICADOS='actualizar')
+    def test_registrar_reporte_duplicado_actualizar(self):
+        """ Testear que un reporte corregido reemplaza los renglones registrados """
+
+        ventas_consumos.registrar(self.df_reporte(unidades=1), self.magno_brasserie)
+        resultado = ventas_consumos.registrar(self.df_reporte(unidades=2), self.magno_brasserie)
+
+        self.assertEqual(resultado['duplicados'], 4)
+        self.assertEqual(models.Venta.objects.count(), 3)
+        self.assertEqual(set(models.Venta.objects.values_list('unidades', flat=True)), {2})
+        self.assertEqual(models.ConsumoRecetaVendida.objects.get(receta=self.trago_herradura_blanco).volumen, 120)
+        self.assertEqual(models.ProductoSinRegistro.objects.get().unidades, 2)
+
+
+    def test_huellas_no_dependen_del_bloque(self):
+        """ Testear que las huellas de un reporte son las mismas al registrarlo por bloques """
+
+        df_reporte = self.df_reporte()
+        ventas_consumos.registrar(df_reporte, self.magno_brasserie)
+        huellas = set(models.Venta.objects.values_list('huella', flat=True))
+
+        # Registramos el mismo reporte en bloques de un renglón: todo es duplicado
+        bloques_ventas = (df_reporte.iloc[i:i + 1] for i in range(len(df_reporte)))
+        resumen = ventas_consumos.registrar_por_bloques(bloques_ventas, self.magno_brasserie)
+
+        self.assertEqual(len(huellas), 3)
+        self.assertEqual(resumen['duplicados'], 4)
+        self.assertEqual(resumen['ventas'], 0)
+
+
+
+    def test_registrar_varias_cajas(self):
+        """ Testear que cada venta se registra en la caja (y el almacén) de su renglón """
+
+        barra_2 = models.Almacen.objects.create(nombre='BARRA 2', numero=2, sucursal=self.magno_brasserie)
+        caja_2 = models.Caja.objects.create(numero=2, nombre='CAJA 2', almacen=barra_2)
+
+        df_reporte = self.df_reporte()
+        df_reporte['caja_id'] = [self.caja_1.id, caja_2.id, caja_2.id, self.caja_1.id]
+
+        ventas_consumos.registrar(df_reporte, self.magno_brasserie)
+
+        self.assertEqual(models.Venta.objects.filter(caja__almacen=self.barra_1).count(), 1)
+        self.assertEqual(models.Venta.objects.filter(caja__almacen=barra_2).count(), 2)
+        self.assertEqual(models.ConsumoRecetaVendida.objects.filter(venta__caja__almacen=barra_2).count(), 2)
+
+
+    def test_cargar_bloque(self):
+        """ Testear que la carga de un bloque (COPY en PostgreSQL, bulk_create en SQLite) retorna sus totales """
+
+        matriz = matriz_recetas.get_matriz(self.magno_brasserie)
+        fecha = datetime.date(2019, 10, 14)
+
+        totales = ventas_consumos.cargar_bloque(self.df_reporte(unidades=2), self.magno_brasserie, matriz, fecha, {}, Counter())
+
+        self.assertEqual(totales, {'ventas': 3, 'consumos': 3, 'productos_no_registrados': 1, 'duplicados': 0})
+        self.assertEqual(models.Venta.objects.filter(fecha=fecha).count(), 3)
+        self.assertEqual(sorted(models.ConsumoRecetaVendida.objects.values_list('volumen', flat=True)), [90, 90, 120])
+        self.assertEqual(models.ProductoSinRegistro.objects.get().codigo_pos, '00457')
+
+        # El mismo bloque otra vez: todos sus renglones son duplicados
+        totales = ventas_consumos.cargar_bloque(self.df_reporte(unidades=2), self.magno_brasserie, matriz, fecha, {}, Counter())
+
+        self.assertEqual(totales, {'ventas': 0, 'consumos': 0, 'productos_no_registrados': 0, 'duplicados': 4})
+        self.assertEqual(models.Venta.objects.count(), 3)
+
+
+    def test_renglones_csv(self):
+        """ Testear que los renglones del COPY se escriben en CSV con los None vacíos """
+
+        buffer = carga_copy.renglones_csv([(1, 2, '00050', 'CARAJILLO, DOBLE', 1, 100, 'abc'), (None, 2, '00457', 'APEROL', 1, 100, 'def')])
+
+        self.assertEqual(buffer.read(), '1,2,00050,"CARAJILLO, DOBLE",1,100,abc\n,2,00457,APEROL,1,100,def\n')
+
+
+    def test_command_benchmark_carga_ventas(self):
+        """ Testear que el benchmark mide la carga y no guarda ninguna venta """
+
+        out = StringIO()
+        call_command('benchmark_carga_ventas', self.magno_brasserie.id, '--renglones', '50', '--bloque', '20', stdout=out)
 
+        self.assertIn('BULK_CREATE - RENGLONES: 50', out.getvalue())
+        # COPY se mide en PostgreSQL aunque VENTAS_CARGA_COPY esté desactivado
+        if connection.vendor != 'postgresql':
+            self.assertIn('COPY - NO DISPONIBLE', out.getvalue())
+        else:
+            self.assertIn('COPY - RENGLONES: 50', out.getvalue())
+        self.assertEqual(models.Venta.objects.count(), 0)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
 
@@ -0,0 +1,215 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+from ventas import sin_registro
+from ventas import ventas_consumos
+from ventas import versiones_recetas
+from core import models
+
+import datetime
+import pandas as pd
+from decimal import Decimal
+
+
+class VersionesRecetasTests(TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+        # Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+        self.cafe = models.Ingrediente.objects.create(
+            codigo='LICO002',
+            nombre='LICOR DE CAFE',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+
+        # Recetas
+        self.carajillo = models.Receta.objects.create(codigo_pos='00050', nombre='CARAJILLO', sucursal=self.magno_brasserie)
+        models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.licor_43, volumen=45)
+
+        self.fecha_1 = datetime.date(2019, 10, 14)
+        self.fecha_2 = datetime.date(2019, 10, 15)
+        self.fecha_3 = datetime.date(2019, 10, 16)
+
+        # Ventas de tres días: 1, 2 y 3 carajillos
+        for unidades, fecha in enumerate([self.fecha_1, self.fecha_2, self.fecha_3], 1):
+            df_ventas = pd.DataFrame({
+                'sucursal_id': [self.magno_brasserie.id],
+                'caja_id': [self.caja_1.id],
+                'codigo_pos': ['00050'],
+                'nombre': ['CARAJILLO'],
+                'unidades': [unidades],
+                'importe': [100 * unidades]
+            })
+            ventas_consumos.registrar(df_ventas, self.magno_brasserie, fecha)
+
+
+    def volumenes(self, ingrediente):
+        """ Retorna {fecha: volumen} de los consumos del ingrediente """
+
+        return dict(models.ConsumoRecetaVendida.objects.filter(ingrediente=ingrediente).values_list('fecha', 'volumen'))
+
+
+    def test_registrar_version(self):
+        """ Testear que la versión más reciente actualiza la receta actual """
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_2)
+        self.assertEqual(models.IngredienteReceta.objects.get(receta=self.carajillo).volumen, 30)
+
+        # Una versión anterior no cambia la receta actual
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 60, self.fecha_1)
+        self.assertEqual(models.IngredienteReceta.objects.get(receta=self.carajillo).volumen, 30)
+        # La primera versión guardó el volumen original para las ventas anteriores
+        self.assertEqual(
+            list(models.VersionIngredienteReceta.objects.order_by('fecha_inicial').values_list('fecha_inicial', 'volumen')),
+            [(versiones_recetas.FECHA_ORIGEN, 45), (self.fecha_1, 60), (self.fecha_2, 30)]
+        )
+
+
+    def test_tramos_volumen(self):
+        """ Testear los tramos de volumen de cada ingrediente en un rango de fechas """
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 60, self.fecha_1)
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_3)
+
+        tramos = versiones_recetas.tramos_volumen(self.carajillo, self.fecha_1, self.fecha_3)
+
+        self.assertEqual(tramos, {self.licor_43.id: [(self.fecha_1, self.fecha_2, 60), (self.fecha_3, self.fecha_3, 30)]})
+
+
+    def test_recalcular_consumos(self):
+        """ Testear que los consumos se reescriben con el volumen vigente en la fecha de cada venta """
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_2)
+
+        totales = versiones_recetas.recalcular_consumos(self.carajillo, self.fecha_1, self.fecha_3)
+
+        self.assertEqual(totales, {'actualizados': 3, 'creados': 0, 'eliminados': 0, 'mermas': 0})
+        # Antes de la versión vale el volumen original de la receta
+        self.assertEqual(self.volumenes(self.licor_43), {self.fecha_1: 45, self.fecha_2: 60, self.fecha_3: 90})
+        self.assertEqual(models.ConsumoDiario.objects.get(fecha=self.fecha_3).volumen, 90)
+
+
+    def test_recalcular_consumos_version_anterior(self):
+        """ Testear que una versión anterior conserva el volumen de las ventas previas a la corrección """
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 45, self.fecha_1)
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_3)
+
+        versiones_recetas.recalcular_consumos(self.carajillo, self.fecha_1, self.fecha_3)
+
+        self.assertEqual(self.volumenes(self.licor_43), {self.fecha_1: 45, self.fecha_2: 90, self.fecha_3: 90})
+
+
+    def test_recalcular_consumos_agregar_quitar(self):
+        """ Testear que un ingrediente agregado crea consumos y uno quitado los elimina """
+
+        versiones_recetas.registrar_version(self.carajillo, self.cafe, 15, self.fecha_1)
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 45, self.fecha_1)
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 0, self.fecha_3)
+
+        totales = versiones_recetas.recalcular_consumos(self.carajillo, self.fecha_1, self.fecha_3)
+
+        self.assertEqual(totales['creados'], 3)
+        self.assertEqual(totales['eliminados'], 1)
+        self.assertEqual(self.volumenes(self.cafe), {self.fecha_1: 15, self.fecha_2: 30, self.fecha_3: 45})
+        self.assertEqual(self.volumenes(self.licor_43), {self.fecha_1: 45, self.fecha_2: 90})
+        self.assertFalse(models.IngredienteReceta.objects.filter(receta=self.carajillo, ingrediente=self.licor_43).exists())
+        self.assertFalse(models.ConsumoDiario.objects.filter(ingrediente=self.licor_43, fecha=self.fecha_3).exists())
+
+
+    def test_recalcular_consumos_mermas(self):
+        """ Testear que las mermas del periodo se actualizan con el consumo corregido """
+
+        merma = models.MermaIngrediente.objects.create(
+            ingrediente=self.licor_43,
+            almacen=self.barra_1,
+            fecha_inicial=self.fecha_1,
+            fecha_final=self.fecha_3,
+            consumo_ventas=270,
+            consumo_real=180
+        )
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_1)
+        totales = versiones_recetas.recalcular_consumos(self.carajillo, self.fecha_2, self.fecha_3)
+
+        merma.refresh_from_db()
+        self.assertEqual(totales['mermas'], 1)
+        self.assertEqual(merma.consumo_ventas, Decimal('195'))
+        self.assertEqual(merma.merma, Decimal('15'))
+
+
+    def test_registrar_ventas_fecha_anterior(self):
+        """ Testear que las ventas de una fecha anterior a una corrección se cargan con el volumen de esa fecha """
+
+        versiones_recetas.registrar_version(self.carajillo, self.licor_43, 30, self.fecha_2)
+        fecha_0 = datetime.date(2019, 10, 13)
+
+        df_ventas = pd.DataFrame({
+            'sucursal_id': [self.magno_brasserie.id],
+            'caja_id': [self.caja_1.id],
+            'codigo_pos': ['00050'],
+            'nombre': ['CARAJILLO'],
+            'unidades': [2],
+            'importe': [200]
+        })
+        ventas_consumos.registrar(df_ventas, self.magno_brasserie, fecha_0)
+
+        # Un renglón sin registro de una fecha anterior se reatribuye con el mismo volumen
+        models.ProductoSinRegistro.objects.create(
+            sucursal=self.magno_brasserie,
+            codigo_pos='00050',
+            caja=self.caja_1.id,
+            nombre='CARAJILLO',
+            fecha=self.fecha_1,
+            unidades=1,
+            importe=100
+        )
+        sin_registro.reatribuir(self.magno_brasserie)
+
+        self.assertEqual(
+            sorted(models.ConsumoRecetaVendida.objects.filter(fecha__lte=self.fecha_1).values_list('fecha', 'volumen')),
+            [(fecha_0, 90), (self.fecha_1, 45), (self.fecha_1, 45)]
+        )
+
+        # Las ventas de fechas posteriores a la corrección usan la receta actual
+        ventas_consumos.registrar(df_ventas, self.magno_brasserie, datetime.date(2019, 10, 17))
+        self.assertEqual(self.volumenes(self.licor_43)[datetime.date(2019, 10, 17)], 60)
+
+
+    def test_command_recalcular_consumos_receta(self):
+        """ Testear el comando que corrige un volumen y recalcula los consumos """
+
+        out = StringIO()
+        call_command('recalcular_consumos_receta', str(self.carajillo.id), '--desde', '2019-10-15', '--ingrediente', str(self.licor_43.id), '--volumen', '30', stdout=out)
+
+        self.assertIn('00050 - 2019-10-15 A 2019-10-16 - ACTUALIZADOS: 2', out.getvalue())
+        self.assertEqual(self.volumenes(self.licor_43), {self.fecha_1: 45, self.fecha_2: 60, self.fecha_3: 90})
+
+        # Recalcular después todo el historial no cambia las ventas anteriores a la corrección
+        call_command('recalcular_consumos_receta', str(self.carajillo.id), stdout=StringIO())
+        self.assertEqual(self.volumenes(self.licor_43), {self.fecha_1: 45, self.fecha_2: 60, self.fecha_3: 90})
+
+        with self.assertRaises(CommandError):
+            call_command('recalcular_consumos_receta', str(self.carajillo.id), '--volumen', '30', stdout=StringIO())
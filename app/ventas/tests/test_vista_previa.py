@@ -0,0 +1,146 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from ventas import matriz_recetas
+from ventas import vista_previa
+from core import models
+
+import os
+import pandas as pd
+
+
+PATH_REPORTE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ventas_magno_brasserie.xls')
+
+
+class VistaPreviaTests(TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.client = Client()
+
+        # Usuario de la sucursal
+        self.usuario = get_user_model().objects.create_user(email='test@foodstack.mx', password='password123')
+        self.client.force_login(user=self.usuario)
+
+        # Cliente
+        self.operadora_magno = models.Cliente.objects.create(nombre='MAGNO BRASSERIE')
+        # Sucursal
+        self.magno_brasserie = models.Sucursal.objects.create(nombre='MAGNO-BRASSERIE', cliente=self.operadora_magno)
+        self.usuario.sucursales.add(self.magno_brasserie)
+        # Almacen
+        self.barra_1 = models.Almacen.objects.create(nombre='BARRA 1', numero=1, sucursal=self.magno_brasserie)
+        # Caja
+        self.caja_1 = models.Caja.objects.create(numero=1, nombre='CAJA 1', almacen=self.barra_1)
+
+        # Categorías
+        self.categoria_licor = models.Categoria.objects.create(nombre='LICOR')
+
+        # Ingredientes
+        self.licor_43 = models.Ingrediente.objects.create(
+            codigo='LICO001',
+            nombre='LICOR 43',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+        self.aperol = models.Ingrediente.objects.create(
+            codigo='LICO002',
+            nombre='APEROL',
+            categoria=self.categoria_licor,
+            factor_peso=1.05
+        )
+
+        # Recetas con los códigos del reporte de prueba
+        self.carajillo = models.Receta.objects.create(codigo_pos='AYD024', nombre='CARAJILLO', sucursal=self.magno_brasserie)
+        self.aperol_spritz = models.Receta.objects.create(codigo_pos='AYD011', nombre='APEROL SPRITZ', sucursal=self.magno_brasserie)
+        models.IngredienteReceta.objects.create(receta=self.carajillo, ingrediente=self.licor_43, volumen=45)
+        models.IngredienteReceta.objects.create(receta=self.aperol_spritz, ingrediente=self.aperol, volumen=90)
+
+
+    def archivo_ventas(self):
+
+        with open(PATH_REPORTE, 'rb') as f:
+            return SimpleUploadedFile('ventas_magno_brasserie.xls', f.read())
+
+
+    def test_resumir(self):
+        """ Testear el resumen de un reporte en bloques contra la matriz de recetas """
+
+        def bloque(codigos, unidades):
+            return pd.DataFrame({
+                'sucursal_id': [self.magno_brasserie.id] * len(codigos),
+                'caja_id': [self.caja_1.id] * len(codigos),
+                'codigo_pos': codigos,
+                'nombre': ['PRODUCTO {}'.format(codigo) for codigo in codigos],
+                'unidades': unidades,
+                'importe': [100] * len(codigos)
+            })
+
+        bloques_ventas = [bloque(['AYD024', '00457'], [2, 1]), pd.DataFrame(), bloque(['AYD011', '00457', 'AYD024'], [1, 3, 1])]
+
+        resumen = vista_previa.resumir(bloques_ventas, matriz_recetas.get_matriz(self.magno_brasserie))
+
+        self.assertEqual(resumen, {
+            'renglones': 5,
+            'renglones_registrados': 3,
+            'renglones_sin_registro': 2,
+            'unidades': 8,
+            'importe': 500,
+            'sin_registro': [{'codigo_pos': '00457', 'nombre': 'PRODUCTO 00457', 'renglones': 2, 'unidades': 4, 'importe': 200}],
+            'consumos': [
+                {'ingrediente_id': self.aperol.id, 'codigo': 'LICO002', 'nombre': 'APEROL', 'volumen': 90},
+                {'ingrediente_id': self.licor_43.id, 'codigo': 'LICO001', 'nombre': 'LICOR 43', 'volumen': 135},
+            ]
+        })
+
+
+    def test_vista_previa_api(self):
+        """ Testear que la vista previa retorna el resumen del reporte sin guardar nada """
+
+        url = reverse('ventas:vista_previa', kwargs={'nombre_sucursal': self.magno_brasserie.slug})
+
+        res = self.client.post(url, {'ventas_csv': self.archivo_ventas()})
+        resumen = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(resumen['renglones'], 27)
+        self.assertEqual(resumen['renglones_registrados'], 2)
+        self.assertEqual(len(resumen['sin_registro']), 25)
+        self.assertEqual({consumo['codigo']: consumo['volumen'] for consumo in resumen['consumos']}, {'LICO001': 7 * 45, 'LICO002': 5 * 90})
+        self.assertEqual(models.Venta.objects.count(), 0)
+        self.assertEqual(models.ProductoSinRegistro.objects.count(), 0)
+        self.assertEqual(models.ReporteVentas.objects.count(), 0)
+
+
+    def test_vista_previa_api_errores(self):
+        """ Testear las respuestas de error de la vista previa """
+
+        url = reverse('ventas:vista_previa', kwargs={'nombre_sucursal': self.magno_brasserie.slug})
+
+        # Sin archivo
+        self.assertEqual(self.client.post(url).status_code, 400)
+
+        # Reporte defectuoso
+        res = self.client.post(url, {'ventas_csv': SimpleUploadedFile('ventas.xls', b'Este no es un reporte')})
+        self.assertEqual(res.status_code, 400)
+
+        # Usuario de otra sucursal
+        self.usuario.sucursales.remove(self.magno_brasserie)
+        res = self.client.post(url, {'ventas_csv': self.archivo_ventas()})
+        self.assertEqual(res.status_code, 403)
+
+
+    def test_vista_previa_upload(self):
+        """ Testear el modo vista previa de la página para subir el reporte de ventas """
+
+        url = reverse('ventas:upload_ventas', kwargs={'nombre_sucursal': self.magno_brasserie.slug})
+
+        res = self.client.post(url, {'ventas_csv': self.archivo_ventas(), 'vista_previa': '1'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTemplateUsed(res, 'ventas/vista_previa.html')
+        self.assertEqual(res.context['resumen']['renglones_sin_registro'], 25)
+        self.assertEqual(models.Venta.objects.count(), 0)
+        self.assertEqual(models.ReporteVentas.objects.count(), 0)
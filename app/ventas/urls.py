@@ -8,5 +8,8 @@ app_name = 'ventas'
 urlpatterns = [
     path('upload/', views.upload, name='upload'),
     path('upload/<slug:nombre_sucursal>/', views.upload_reporte_ventas, name='upload_ventas'),
-    path('upload-class/<slug:nombre_sucursal>/', views.UploadVentas.as_view(), name='upload_file')
+    path('upload-class/<slug:nombre_sucursal>/', views.UploadVentas.as_view(), name='upload_file'),
+    path('reportes/<int:reporte_id>/estado/', views.estado_reporte_ventas, name='estado_reporte'),
+    path('historico/<slug:nombre_sucursal>/', views.upload_historico_ventas, name='upload_historico'),
+    path('vista-previa/<slug:nombre_sucursal>/', views.vista_previa_ventas, name='vista_previa')
 ]
\ No newline at end of file
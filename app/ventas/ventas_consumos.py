@@ -1,103 +1,342 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
+from django.db import connection, transaction
 
+from collections import Counter
+import hashlib
+import numpy as np
 import pandas as pd
 import datetime
 from core import models
+from ventas import bloqueos
+from ventas import carga_copy
+from ventas import consumo_diario
+from ventas import matriz_recetas
+from ventas import sin_registro
 
 
-# def registrar(df_ventas, sucursal):
-#     df_ventas = df_ventas
-#     sucursal = sucursal
+# Huellas por query al buscar renglones ya registrados
+TAMANO_LOTE_HUELLAS = 500
 
-#     return True
 
+"""
+-----------------------------------------------------------------------
+Guarda una lista de Ventas y les asigna su id.
 
-def registrar(df_ventas, sucursal):
+En PostgreSQL 'bulk_create' retorna los ids de los registros creados;
+en otras bases de datos (SQLite en los tests) guardamos una por una.
+-----------------------------------------------------------------------
+"""
+def guardar_ventas(ventas):
+
+    if connection.features.can_return_ids_from_bulk_insert:
+        return models.Venta.objects.bulk_create(ventas)
+
+    for venta in ventas:
+        venta.save()
+
+    return ventas
+
+
+"""
+-----------------------------------------------------------------------
+Calcula la huella de cada renglón de un dataframe de ventas: un SHA-1 de
+(sucursal, caja, fecha, codigo_pos, ocurrencia).
+
+'ocurrencia' distingue los renglones repetidos del mismo producto en la
+misma caja (el 1º, el 2º...). Es un Counter que se comparte entre los
+bloques de un mismo reporte para que la huella no dependa del tamaño del
+bloque. Subir el mismo reporte otra vez genera las mismas huellas.
+-----------------------------------------------------------------------
+"""
+def huellas_renglones(df_ventas, fecha, ocurrencias):
+
+    huellas = []
+    for sucursal_id, caja_id, codigo_pos in zip(df_ventas['sucursal_id'], df_ventas['caja_id'], df_ventas['codigo_pos']):
+        clave = '{}|{}|{}|{}'.format(sucursal_id, caja_id, fecha, codigo_pos)
+        ocurrencia = ocurrencias[clave]
+        ocurrencias[clave] = ocurrencia + 1
+        huellas.append(hashlib.sha1('{}|{}'.format(clave, ocurrencia).encode('utf-8')).hexdigest())
+
+    return huellas
+
+
+"""
+-----------------------------------------------------------------------
+Retorna las huellas que ya están registradas en la sucursal, como Venta o
+como ProductoSinRegistro, con un query 'huella__in' por cada modelo (en
+lotes para no rebasar el límite de parámetros de la base de datos)
+-----------------------------------------------------------------------
+"""
+def huellas_registradas(sucursal, huellas):
+
+    registradas = set()
+
+    for i in range(0, len(huellas), TAMANO_LOTE_HUELLAS):
+        lote = huellas[i:i + TAMANO_LOTE_HUELLAS]
+        registradas.update(models.Venta.objects.filter(sucursal=sucursal, huella__in=lote).values_list('huella', flat=True))
+        registradas.update(models.ProductoSinRegistro.objects.filter(sucursal=sucursal, huella__in=lote).values_list('huella', flat=True))
+
+    return registradas
+
+
+"""
+-----------------------------------------------------------------------
+Calcula el consumo de ingredientes de un dataframe de ventas con un solo
+producto contra la matriz de recetas de la sucursal.
+
+Retorna un dataframe con un renglón por consumo y las columnas:
+- 'renglon': posición del renglón de venta en 'df_ventas'
+- 'ingrediente_id'
+- 'volumen': ml consumidos
+
+Los renglones sin receta registrada no generan consumo.
+-----------------------------------------------------------------------
+"""
+def calcular_consumos(df_ventas, matriz):
+
+    filas = matriz.buscar_filas(df_ventas['codigo_pos'])
+    registradas = np.flatnonzero(filas >= 0)
+    unidades = df_ventas['unidades'].to_numpy(dtype=np.int64)
+
+    renglon, columna, volumen = matriz.explotar(filas[registradas], unidades[registradas])
+
+    return pd.DataFrame({
+        'renglon': registradas[renglon],
+        'ingrediente_id': matriz.ingredientes_ids[columna],
+        'volumen': volumen
+    })
+
+
+"""
+-----------------------------------------------------------------------
+Registra las ventas y el consumo de ingredientes de un dataframe de
+ventas contra la matriz de recetas de la sucursal.
+
+No abre una transacción propia: la abren 'registrar' y
+'registrar_por_bloques'. 'cajas' ({id: Caja}) y 'ocurrencias' (ver
+'huellas_renglones') se reutilizan entre los bloques de un reporte.
+
+Los renglones que ya estaban registrados (misma huella) se omiten o se
+reemplazan según 'settings.VENTAS_DUPLICADOS' ('omitir' o 'actualizar').
+
+Retorna (ventas, consumos_venta, productos_no_registrados, duplicados),
+donde 'consumos_venta' tiene la lista de consumos de cada venta y
+'duplicados' el número de renglones que ya estaban registrados.
+-----------------------------------------------------------------------
+"""
+def registrar_bloque(df_ventas, sucursal, matriz, fecha, cajas, ocurrencias):
 
-    total_ventas_consumos = []
-    ayer = datetime.date.today() - datetime.timedelta(days=1)
     productos_no_registrados = []
 
-    for (sucursal_id, caja_id, codigo_pos, nombre, unidades, importe) in df_ventas.itertuples(index=False, name=None):
+    # Buscamos con un solo query los renglones que ya estaban registrados
+    huellas = huellas_renglones(df_ventas, fecha, ocurrencias)
+    registradas = huellas_registradas(sucursal, huellas)
+    duplicados = len(registradas)
 
-        # Checamos si existe la receta en la base de datos
-        try:
-            receta = models.Receta.objects.get(codigo_pos=codigo_pos, sucursal=sucursal)
+    if registradas and settings.VENTAS_DUPLICADOS == 'actualizar':
+        # Reemplazamos los renglones registrados (sus consumos se borran en cascada)
+        registradas = list(registradas)
+        models.Venta.objects.filter(sucursal=sucursal, huella__in=registradas).delete()
+        consumo_diario.recalcular(sucursal, fecha, fecha)
+        reemplazados = models.ProductoSinRegistro.objects.filter(sucursal=sucursal, huella__in=registradas)
+        codigos = set(reemplazados.values_list('codigo_pos', flat=True))
+        reemplazados.delete()
+        # Descontamos del resumen los productos sin registro reemplazados
+        if codigos:
+            sin_registro.recalcular(sucursal, codigos)
+
+    elif registradas:
+        nuevos = np.array([huella not in registradas for huella in huellas], dtype=bool)
+        df_ventas = df_ventas.loc[nuevos]
+        huellas = [huella for huella in huellas if huella not in registradas]
+
+    filas = matriz.buscar_filas(df_ventas['codigo_pos']) if len(df_ventas) > 0 else np.array([], dtype=np.int64)
+
+    # Cargamos con un solo query las cajas del bloque que aún no tenemos
+    cajas_ids = set(df_ventas['caja_id'].tolist()) - set(cajas) if len(df_ventas) > 0 else set()
+    if cajas_ids:
+        cajas.update(models.Caja.objects.select_related('almacen').in_bulk(cajas_ids))
 
-        # Si la receta no existe
-        except ObjectDoesNotExist:
-            #sin_registro = [sucursal.slug, codigo_pos, nombre]
-            sin_registro = models.ProductoSinRegistro.objects.create(
-                #sucursal=sucursal.slug,
+    ventas = []
+    filas_ventas = []
+    for fila, huella, (sucursal_id, caja_id, codigo_pos, nombre, unidades, importe) in zip(filas, huellas, df_ventas.itertuples(index=False, name=None)):
+
+        # Si la receta no existe, la guardamos como ProductoSinRegistro
+        if fila < 0:
+            producto = models.ProductoSinRegistro(
                 sucursal=sucursal,
                 codigo_pos=codigo_pos,
                 caja=caja_id,
                 nombre=nombre,
+                fecha=fecha,
                 unidades=unidades,
-                importe=importe
-                )
-            productos_no_registrados.append(sin_registro)
+                importe=importe,
+                huella=huella
+            )
+            productos_no_registrados.append(producto)
+            continue
 
+        # Si la caja no existe, notificamos el error igual que 'Caja.objects.get'
+        try:
+            caja = cajas[caja_id]
+        except KeyError:
+            raise models.Caja.DoesNotExist('La caja con el id "{}" no existe.'.format(caja_id))
 
-        else:
+        ventas.append(models.Venta(
+            receta=matriz.recetas[fila],
+            sucursal=sucursal,
+            fecha=fecha,
+            unidades=unidades,
+            importe=importe,
+            caja=caja,
+            huella=huella
+        ))
+        filas_ventas.append(fila)
 
-            """
-            -----------------------------------------------------------
-            Registrar la venta de la receta
-            -----------------------------------------------------------
-            """
-            receta = models.Receta.objects.get(codigo_pos=codigo_pos, sucursal=sucursal)
-            caja = models.Caja.objects.get(id=caja_id)
+    """
+    -----------------------------------------------------------
+    Registrar las ventas de las recetas
+    -----------------------------------------------------------
+    """
+    ventas = guardar_ventas(ventas)
 
-            venta = models.Venta.objects.create(
-                receta=receta,
-                sucursal=sucursal,
-                fecha=ayer,
-                unidades=unidades,
-                importe=importe,
-                caja=caja
-            )
+    """
+    -----------------------------------------------------------
+    Registrar el consumo de ingredientes generado por las ventas
+    -----------------------------------------------------------
+    """
+    # Multiplicamos las unidades vendidas por los ml de cada ingrediente de su receta
+    renglones, columnas, volumenes = matriz.explotar(filas_ventas, [venta.unidades for venta in ventas])
+
+    consumos = []
+    consumos_venta = [[] for venta in ventas]
+    for (renglon, columna, volumen_total) in zip(renglones.tolist(), columnas.tolist(), volumenes.tolist()):
+        venta = ventas[renglon]
+        consumo = models.ConsumoRecetaVendida(
+            ingrediente=matriz.ingredientes[columna],
+            receta=venta.receta,
+            venta=venta,
+            fecha=fecha,
+            volumen=volumen_total
+        )
+        consumos.append(consumo)
+        consumos_venta[renglon].append(consumo)
 
+    models.ConsumoRecetaVendida.objects.bulk_create(consumos)
+    consumo_diario.acumular(consumos)
 
-            """
-            -----------------------------------------------------------
-            Registrar el consumo de ingredientes generado por la venta
-            -----------------------------------------------------------
-            """
-            # Seleccionamos los ingredientes de la receta
-            ingredientes_receta = receta.ingredientes.all()
+    # Guardamos los productos sin registro y los sumamos a su resumen
+    models.ProductoSinRegistro.objects.bulk_create(productos_no_registrados)
+    sin_registro.acumular(sucursal, productos_no_registrados)
+
+    return ventas, consumos_venta, productos_no_registrados, duplicados
+
+
+"""
+-----------------------------------------------------------------------
+Registra un bloque de ventas y retorna solo sus totales:
+{'ventas', 'consumos', 'productos_no_registrados', 'duplicados'}
+
+En PostgreSQL usa 'COPY' (ver 'ventas.carga_copy'); en las demás bases
+de datos, 'registrar_bloque'. La carga con COPY calcula los consumos con
+la receta actual, así que las ventas de una fecha con recetas
+corregidas después (una matriz con 'fecha') también van por
+'registrar_bloque'. Igual que 'registrar_bloque', no abre una
+transacción propia.
+-----------------------------------------------------------------------
+"""
+def cargar_bloque(df_ventas, sucursal, matriz, fecha, cajas, ocurrencias):
+
+    if carga_copy.disponible() and matriz.fecha is None:
+        huellas = huellas_renglones(df_ventas, fecha, ocurrencias)
+        return carga_copy.registrar_bloque(df_ventas, sucursal, matriz, fecha, huellas, cajas)
+
+    ventas, consumos_venta, productos_no_registrados, duplicados = registrar_bloque(df_ventas, sucursal, matriz, fecha, cajas, ocurrencias)
+
+    return {
+        'ventas': len(ventas),
+        'consumos': sum(len(consumos) for consumos in consumos_venta),
+        'productos_no_registrados': len(productos_no_registrados),
+        'duplicados': duplicados,
+    }
+
+
+"""
+-----------------------------------------------------------------------
+Registra las ventas y el consumo de ingredientes de un reporte de ventas
+ya parseado.
+
+En lugar de consultar la base de datos renglón por renglón, tomamos la
+matriz de recetas de la sucursal (del cache), la cruzamos en memoria
+contra todo el dataframe y guardamos Ventas, ConsumosRecetaVendida y
+ProductosSinRegistro con unos cuantos 'bulk_create' dentro de una sola
+transacción, con la fecha de la sucursal bloqueada para otras cargas.
+
+Las ventas se registran con 'fecha' (por default, la fecha de ayer).
+-----------------------------------------------------------------------
+"""
+def registrar(df_ventas, sucursal, fecha=None):
+
+    total_ventas_consumos = []
+    if fecha is None:
+        fecha = datetime.date.today() - datetime.timedelta(days=1)
 
-            # Tomamos el volumen consumido por ingrediente y lo multiplicamos por las unidades vendidas
-            for item in ingredientes_receta:
-                consumos = []
-                ingrediente = item
-                it = models.IngredienteReceta.objects.get(receta=receta, ingrediente=ingrediente)
-                volumen = it.volumen
-                volumen_total = volumen * unidades
+    # Tomamos la matriz de recetas de la sucursal vigente en la fecha de las ventas
+    matriz = matriz_recetas.get_matriz(sucursal, fecha)
 
-                # Guardamos el consumo en la base de datos
-                consumo = models.ConsumoRecetaVendida.objects.create(
-                    ingrediente=ingrediente,
-                    receta=receta,
-                    venta=venta,
-                    fecha=ayer,
-                    volumen=volumen_total
-                )
+    with transaction.atomic():
+        bloqueos.bloquear_sucursal(sucursal.id, fecha)
+        ventas, consumos_venta, productos_no_registrados, duplicados = registrar_bloque(df_ventas, sucursal, matriz, fecha, {}, Counter())
 
-                #consumos.append(consumo)
-                consumos.append(str(consumo))
+    # Construimos el mismo resultado que el registro renglón por renglón
+    for venta, consumos_registrados in zip(ventas, consumos_venta):
+        total_ventas_consumos.append({'venta': str(venta), 'consumos': [str(consumo) for consumo in consumos_registrados]})
 
-            #total_ventas_consumos.append({'venta': venta, 'consumos': consumos})
-            total_ventas_consumos.append({'venta': str(venta), 'consumos': consumos})
-            
-    return {'ventas_consumos': total_ventas_consumos, 'productos_no_registrados': productos_no_registrados}
-        
+    return {'ventas_consumos': total_ventas_consumos, 'productos_no_registrados': productos_no_registrados, 'duplicados': duplicados}
 
 
+"""
+-----------------------------------------------------------------------
+Registra un reporte de ventas que llega en bloques (un generador de
+dataframes como 'motor.parsear_bloques').
 
+Cada bloque se parsea, se cruza contra la matriz de recetas y se guarda
+antes de leer el siguiente, así que la memoria depende del tamaño del
+bloque y no del tamaño del reporte. Todo el reporte se guarda en una
+sola transacción: si un bloque falla, no se registra nada.
+Mientras tanto la fecha de la sucursal queda bloqueada para otras
+cargas (ver 'ventas.bloqueos'); las de otras fechas corren en paralelo.
 
+Como los objetos de cada bloque se descartan, solo retornamos los
+totales registrados. Igual que en 'registrar', 'fecha' es por default
+la fecha de ayer.
+-----------------------------------------------------------------------
+"""
+def registrar_por_bloques(bloques_ventas, sucursal, fecha=None):
 
+    if fecha is None:
+        fecha = datetime.date.today() - datetime.timedelta(days=1)
+    matriz = matriz_recetas.get_matriz(sucursal, fecha)
+    cajas = {}
+    ocurrencias = Counter()
 
+    resumen = {
+        'bloques': 0,
+        'renglones': 0,
+        'ventas': 0,
+        'consumos': 0,
+        'productos_no_registrados': 0,
+        'duplicados': 0
+    }
 
+    with transaction.atomic():
+        bloqueos.bloquear_sucursal(sucursal.id, fecha)
+        for df_ventas in bloques_ventas:
+            totales = cargar_bloque(df_ventas, sucursal, matriz, fecha, cajas, ocurrencias)
 
+            resumen['bloques'] += 1
+            resumen['renglones'] += len(df_ventas)
+            for campo, total in totales.items():
+                resumen[campo] += total
 
+    return resumen
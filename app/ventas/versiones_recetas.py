@@ -0,0 +1,211 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, ExpressionWrapper, IntegerField
+
+import datetime
+from core import models
+from ventas import consumo_diario
+
+
+"""
+-----------------------------------------------------------------------
+VERSIONES DE RECETAS Y RECÁLCULO DE CONSUMOS
+
+Cuando se corrige el volumen de un ingrediente en una receta, los
+ConsumosRecetaVendida ya registrados quedan con el volumen anterior. Se
+registra una VersionIngredienteReceta con la fecha desde la que vale el
+volumen correcto y se recalculan los consumos de la receta en un rango
+de fechas con unos cuantos UPDATE, INSERT y DELETE por ingrediente (no
+uno por venta). Después se reconstruye el ConsumoDiario del rango y se
+actualizan las MermasIngrediente que lo tocan.
+-----------------------------------------------------------------------
+"""
+
+# Fecha de la versión que guarda el volumen original de un ingrediente antes de su primera corrección
+FECHA_ORIGEN = datetime.date(1900, 1, 1)
+
+
+"""
+-----------------------------------------------------------------------
+Registra el volumen de un ingrediente en una receta a partir de
+'fecha_inicial'. Si es la versión más reciente, también actualiza el
+IngredienteReceta (la receta actual con la que se cargan las ventas):
+lo crea, le cambia el volumen o, si el volumen es 0, lo elimina.
+
+La primera versión de un ingrediente guarda antes el volumen que tenía
+la receta (0 si no lo llevaba) como versión desde FECHA_ORIGEN, para que
+las ventas anteriores a la corrección conserven su volumen.
+-----------------------------------------------------------------------
+"""
+def registrar_version(receta, ingrediente, volumen, fecha_inicial):
+
+    with transaction.atomic():
+
+        sin_versiones = not models.VersionIngredienteReceta.objects.filter(receta=receta, ingrediente=ingrediente).exists()
+        if sin_versiones and fecha_inicial > FECHA_ORIGEN:
+            volumen_original = models.IngredienteReceta.objects.filter(receta=receta, ingrediente=ingrediente).values_list('volumen', flat=True).first()
+            models.VersionIngredienteReceta.objects.create(
+                receta=receta,
+                ingrediente=ingrediente,
+                volumen=volumen_original or 0,
+                fecha_inicial=FECHA_ORIGEN
+            )
+
+        version, creada = models.VersionIngredienteReceta.objects.update_or_create(
+            receta=receta,
+            ingrediente=ingrediente,
+            fecha_inicial=fecha_inicial,
+            defaults={'volumen': volumen}
+        )
+
+        posteriores = models.VersionIngredienteReceta.objects.filter(receta=receta, ingrediente=ingrediente, fecha_inicial__gt=fecha_inicial)
+
+        if not posteriores.exists():
+            if volumen > 0:
+                models.IngredienteReceta.objects.update_or_create(receta=receta, ingrediente=ingrediente, defaults={'volumen': volumen})
+            else:
+                # Usamos delete() de cada instancia para que se invalide la matriz de recetas
+                for ingrediente_receta in models.IngredienteReceta.objects.filter(receta=receta, ingrediente=ingrediente):
+                    ingrediente_receta.delete()
+
+    return version
+
+
+"""
+-----------------------------------------------------------------------
+Retorna los tramos de volumen de cada ingrediente de la receta entre
+dos fechas: {ingrediente_id: [(desde, hasta, volumen), ...]}
+
+Incluye los ingredientes de la receta actual, los de sus versiones y
+los que ya tienen consumos en el rango (para poder quitarlos). Los
+ingredientes sin versiones nunca se han corregido y usan el volumen de
+la receta actual.
+-----------------------------------------------------------------------
+"""
+def tramos_volumen(receta, fecha_inicial, fecha_final):
+
+    actuales = dict(models.IngredienteReceta.objects.filter(receta=receta).values_list('ingrediente_id', 'volumen'))
+
+    versiones = {}
+    for ingrediente_id, volumen, fecha in models.VersionIngredienteReceta.objects.filter(receta=receta, fecha_inicial__lte=fecha_final).order_by('fecha_inicial').values_list('ingrediente_id', 'volumen', 'fecha_inicial'):
+        versiones.setdefault(ingrediente_id, []).append((fecha, volumen))
+
+    con_consumos = models.ConsumoRecetaVendida.objects.filter(receta=receta, fecha__gte=fecha_inicial, fecha__lte=fecha_final).values_list('ingrediente_id', flat=True).distinct()
+
+    ingredientes = set(actuales) | set(versiones) | set(con_consumos)
+
+    tramos = {}
+    for ingrediente_id in ingredientes:
+
+        # Volumen al inicio del rango: la última versión que ya había empezado o, sin versiones, la receta actual
+        volumen = actuales.get(ingrediente_id, 0)
+        cambios = []
+        for fecha, volumen_version in versiones.get(ingrediente_id, []):
+            if fecha <= fecha_inicial:
+                volumen = volumen_version
+            else:
+                cambios.append((fecha, volumen_version))
+
+        desde = fecha_inicial
+        tramos_ingrediente = []
+        for fecha, volumen_version in cambios:
+            tramos_ingrediente.append((desde, fecha - datetime.timedelta(days=1), volumen))
+            desde, volumen = fecha, volumen_version
+        tramos_ingrediente.append((desde, fecha_final, volumen))
+
+        tramos[ingrediente_id] = tramos_ingrediente
+
+    return tramos
+
+
+"""
+-----------------------------------------------------------------------
+Vuelve a calcular el consumo de ventas de las MermasIngrediente de la
+sucursal cuyo periodo toca el rango de fechas, desde el ConsumoDiario.
+'save()' recalcula la merma y el porcentaje.
+-----------------------------------------------------------------------
+"""
+def actualizar_mermas(sucursal, ingredientes, fecha_inicial, fecha_final):
+
+    mermas = models.MermaIngrediente.objects.filter(
+        almacen__sucursal=sucursal,
+        ingrediente__in=ingredientes,
+        fecha_inicial__lte=fecha_final,
+        fecha_final__gte=fecha_inicial
+    )
+
+    for merma in mermas:
+        consumo_ventas = models.ConsumoDiario.objects.filter(
+            ingrediente=merma.ingrediente_id,
+            almacen=merma.almacen_id,
+            fecha__gte=merma.fecha_inicial,
+            fecha__lte=merma.fecha_final
+        ).aggregate(consumo_ventas=Sum('volumen'))['consumo_ventas']
+
+        merma.consumo_ventas = consumo_ventas
+        merma.save()
+
+    return len(mermas)
+
+
+"""
+-----------------------------------------------------------------------
+Recalcula los ConsumosRecetaVendida de una receta entre dos fechas con
+el volumen vigente de cada ingrediente en la fecha de cada venta.
+
+Por cada tramo de volumen de cada ingrediente:
+- UPDATE de los consumos existentes: volumen = unidades de la venta *
+  volumen del tramo (un solo query con un subquery a Venta)
+- INSERT con 'bulk_create' de los consumos de las ventas que no tenían
+  el ingrediente
+- DELETE de los consumos si el ingrediente no estaba en la receta
+
+Todo en una sola transacción. Retorna los totales: {'actualizados',
+'creados', 'eliminados', 'mermas'}
+-----------------------------------------------------------------------
+"""
+def recalcular_consumos(receta, fecha_inicial, fecha_final):
+
+    totales = {'actualizados': 0, 'creados': 0, 'eliminados': 0, 'mermas': 0}
+    unidades_venta = Subquery(models.Venta.objects.filter(id=OuterRef('venta_id')).values('unidades')[:1])
+
+    with transaction.atomic():
+
+        tramos = tramos_volumen(receta, fecha_inicial, fecha_final)
+
+        for ingrediente_id, tramos_ingrediente in tramos.items():
+            for desde, hasta, volumen in tramos_ingrediente:
+
+                consumos = models.ConsumoRecetaVendida.objects.filter(receta=receta, ingrediente_id=ingrediente_id, fecha__gte=desde, fecha__lte=hasta)
+
+                if volumen <= 0:
+                    eliminados, detalle = consumos.delete()
+                    totales['eliminados'] += eliminados
+                    continue
+
+                totales['actualizados'] += consumos.update(
+                    volumen=ExpressionWrapper(unidades_venta * volumen, output_field=IntegerField())
+                )
+
+                # Ventas del tramo que no tienen consumo del ingrediente
+                faltantes = models.Venta.objects.filter(receta=receta, fecha__gte=desde, fecha__lte=hasta)\
+                    .exclude(consumos_venta__ingrediente_id=ingrediente_id)\
+                    .values_list('id', 'unidades', 'fecha')
+
+                nuevos = [
+                    models.ConsumoRecetaVendida(
+                        ingrediente_id=ingrediente_id,
+                        receta=receta,
+                        venta_id=venta_id,
+                        fecha=fecha,
+                        volumen=unidades * volumen
+                    )
+                    for venta_id, unidades, fecha in faltantes
+                ]
+                models.ConsumoRecetaVendida.objects.bulk_create(nuevos, batch_size=1000)
+                totales['creados'] += len(nuevos)
+
+        if tramos:
+            consumo_diario.recalcular(receta.sucursal, fecha_inicial, fecha_final, ingredientes=list(tramos))
+            totales['mermas'] = actualizar_mermas(receta.sucursal, list(tramos), fecha_inicial, fecha_final)
+
+    return totales
@@ -1,14 +1,21 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.http import HttpResponseForbidden, HttpResponseRedirect, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views import View
+from django.conf import settings
 
-from importlib import import_module
-from core.models import Sucursal
+import zipfile
+
+from core.models import Sucursal, ReporteVentas
 from ventas import forms
 from ventas import parser_ventas
 from ventas import parsers
+from ventas.parsers import motor
+from ventas.parsers import registro
 from ventas import ventas_consumos
+from ventas import ingesta
+from ventas import historico
+from ventas import vista_previa
 
 
 def upload(request):
@@ -55,18 +62,72 @@ def upload_reporte_ventas(request, nombre_sucursal):
         # Creamos nuestra forma con los datos del POST request
         form = forms.VentasForm(request.POST, request.FILES)
 
+        """
+        ------------------------------------------------------
+        EN MODO VISTA PREVIA SOLO MOSTRAMOS EL RESUMEN DEL
+        REPORTE, SIN GUARDAR NADA
+        ------------------------------------------------------
+        """
+        if request.POST.get('vista_previa'):
+            try:
+                resumen = vista_previa.vista_previa(ventas_csv, sucursal)
+
+            except (motor.ErrorReporte, registro.ParserNoEncontrado):
+                mensaje_error = 'Hubo un error al procesar el reporte de ventas.'
+                return render(request, 'ventas/upload_ventas.html', {'sucursal': sucursal, 'mensaje_error': mensaje_error})
+
+            return render(request, 'ventas/vista_previa.html', {'sucursal': sucursal, 'resumen': resumen})
+
+        """
+        ------------------------------------------------------
+        SI LA INGESTA ES ASÍNCRONA, GUARDAMOS EL REPORTE Y LO
+        ENCOLAMOS PARA EL WORKER
+        ------------------------------------------------------
+        """
+        if settings.VENTAS_INGESTA_ASINCRONA:
+            reporte_ventas, creado = ingesta.encolar(ventas_csv, sucursal, request.user)
+
+            # Si el archivo ya se había subido, mostramos el reporte existente
+            if not creado:
+                return render(request, 'ventas/success.html', {'reporte_ventas': reporte_ventas, 'duplicado': True})
+
+            return render(request, 'ventas/success.html', {'reporte_ventas': reporte_ventas}, status=202)
+
+        """
+        ------------------------------------------------------
+        LOS REPORTES GRANDES SE PROCESAN POR BLOQUES
+        ------------------------------------------------------
+        """
+        especificacion = registro.detectar_especificacion(ventas_csv, sucursal)
+
+        if especificacion is not None and ventas_csv.size > settings.VENTAS_LIMITE_STREAMING:
+
+            bloques_ventas = motor.parsear_bloques(ventas_csv, sucursal, especificacion, settings.VENTAS_TAMANO_BLOQUE)
+
+            try:
+                resumen = ventas_consumos.registrar_por_bloques(bloques_ventas, sucursal)
+
+            # Si hay un error con el reporte de ventas, notificar al usuario
+            except motor.ErrorReporte:
+                mensaje_error = 'Hubo un error al procesar el reporte de ventas.'
+                return render(request, 'ventas/upload_ventas.html', {'mensaje_error': mensaje_error})
+
+            return render(request, 'ventas/success.html', {'resultado_parser': {'procesado': True}, 'resumen': resumen})
+
         """
         ------------------------------------------------------
         PARSEAMOS EL REPORTE DE VENTAS
         ------------------------------------------------------
         """
-        # Construimos el nombre del parser a importar y lo importamos dinámicamente
-        nombre_parser = 'parser_' + (sucursal.slug).replace('-', '_').lower()
-        parser_ventas = import_module('ventas.parsers.' + nombre_parser)
+        # Tomamos el parser del formato del reporte (el módulo o la especificación de la sucursal)
+        try:
+            parser_sucursal = registro.get_parser_archivo(ventas_csv, sucursal)
+        except registro.ParserNoEncontrado:
+            mensaje_error = 'La sucursal no tiene un parser de reportes de ventas.'
+            return render(request, 'ventas/upload_ventas.html', {'mensaje_error': mensaje_error})
 
         # Alimentamos el reporte de ventas al parser y lo corremos
-        #resultado_parser = parser_ventas.parser(ventas_csv, sucursal)
-        resultado_parser = parser_ventas.parser(ventas_csv, sucursal)
+        resultado_parser = parser_sucursal(ventas_csv, sucursal)
 
         # Si hay un error con el reporte de ventas, notificar al usuario
         if resultado_parser['procesado'] == False:
@@ -91,6 +152,87 @@ def upload_reporte_ventas(request, nombre_sucursal):
         return render (request, 'ventas/success.html', {'resultado_parser': resultado_parser})
 
 
+"""
+-----------------------------------------------------------------------------------
+VIEW QUE RETORNA EL ESTADO DE UN REPORTE DE VENTAS ENCOLADO: AVANCE, TOTALES
+REGISTRADOS Y ERRORES
+-----------------------------------------------------------------------------------
+"""
+@login_required
+def estado_reporte_ventas(request, reporte_id):
+
+    reporte_ventas = get_object_or_404(ReporteVentas.objects.select_related('sucursal'), id=reporte_id)
+
+    # Solo los usuarios de la sucursal pueden consultar sus reportes
+    usuario = request.user
+    if not usuario.is_superuser and not usuario.sucursales.filter(id=reporte_ventas.sucursal_id).exists():
+        return HttpResponseForbidden()
+
+    return JsonResponse(ingesta.estado_reporte(reporte_ventas))
+
+
+"""
+--------------------------------------------------------------------------
+Retorna la vista previa de un reporte de ventas en JSON: renglones con y
+sin receta, códigos POS sin registro y ml por ingrediente. No guarda
+nada en la base de datos.
+--------------------------------------------------------------------------
+"""
+@login_required
+def vista_previa_ventas(request, nombre_sucursal):
+
+    sucursal = get_object_or_404(Sucursal, slug=nombre_sucursal)
+
+    usuario = request.user
+    if not usuario.is_superuser and not usuario.sucursales.filter(id=sucursal.id).exists():
+        return HttpResponseForbidden()
+
+    if request.method != 'POST' or 'ventas_csv' not in request.FILES:
+        return JsonResponse({'mensaje_error': 'Se requiere el reporte de ventas en ventas_csv.'}, status=400)
+
+    try:
+        resumen = vista_previa.vista_previa(request.FILES['ventas_csv'], sucursal)
+
+    except registro.ParserNoEncontrado:
+        return JsonResponse({'mensaje_error': 'La sucursal no tiene un parser de reportes de ventas.'}, status=400)
+
+    except motor.ErrorReporte:
+        return JsonResponse({'mensaje_error': 'Hubo un error al procesar el reporte de ventas.'}, status=400)
+
+    return JsonResponse(resumen)
+
+
+"""
+--------------------------------------------------------------------------
+Encola el histórico de ventas de una sucursal: un .zip con un reporte por
+día y la fecha en el nombre de cada archivo ('ventas_2019-10-14.csv').
+Cada día se registra con su fecha como un ReporteVentas independiente.
+--------------------------------------------------------------------------
+"""
+@login_required
+def upload_historico_ventas(request, nombre_sucursal):
+
+    sucursal = get_object_or_404(Sucursal, slug=nombre_sucursal)
+
+    usuario = request.user
+    if not usuario.is_superuser and not usuario.sucursales.filter(id=sucursal.id).exists():
+        return HttpResponseForbidden()
+
+    if request.method != 'POST' or 'historico_zip' not in request.FILES:
+        return JsonResponse({'mensaje_error': 'Se requiere un archivo .zip en historico_zip.'}, status=400)
+
+    try:
+        reportes, duplicados, sin_fecha = historico.encolar_historico(request.FILES['historico_zip'], sucursal, usuario)
+    except zipfile.BadZipFile:
+        return JsonResponse({'mensaje_error': 'El archivo no es un .zip válido.'}, status=400)
+
+    return JsonResponse({
+        'reportes': [{'id': reporte.id, 'fecha': reporte.fecha, 'archivo': reporte.nombre_archivo} for reporte in reportes],
+        'duplicados': [{'id': reporte.id, 'fecha': reporte.fecha, 'archivo': reporte.nombre_archivo} for reporte in duplicados],
+        'sin_fecha': sin_fecha,
+    }, status=202)
+
+
 """
 --------------------------------------
 CLASS-BASED VIEW DE UPLOAD_VENTAS
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from ventas import ingesta
+from ventas import matriz_recetas
+
+
+"""
+-----------------------------------------------------------------------
+VISTA PREVIA DE UN REPORTE DE VENTAS
+
+Parsea el reporte y lo cruza en memoria contra la matriz de recetas de
+la sucursal (del cache) sin escribir nada en la base de datos: cuántos
+renglones corresponden a una receta, qué códigos POS no están
+registrados y cuántos ml se consumirían de cada ingrediente.
+-----------------------------------------------------------------------
+"""
+
+
+"""
+-----------------------------------------------------------------------
+Resume los bloques de un reporte de ventas contra la matriz de recetas.
+
+Retorna:
+{
+    'renglones', 'renglones_registrados', 'renglones_sin_registro',
+    'unidades', 'importe',
+    'sin_registro': [{'codigo_pos', 'nombre', 'renglones', 'unidades', 'importe'}],
+    'consumos': [{'ingrediente_id', 'codigo', 'nombre', 'volumen'}]
+}
+-----------------------------------------------------------------------
+"""
+def resumir(bloques_ventas, matriz):
+
+    resumen = {
+        'renglones': 0,
+        'renglones_registrados': 0,
+        'renglones_sin_registro': 0,
+        'unidades': 0,
+        'importe': 0,
+    }
+    volumenes = np.zeros(len(matriz.ingredientes), dtype=np.int64)
+    sin_registro = []
+
+    for df_ventas in bloques_ventas:
+        if len(df_ventas) == 0:
+            continue
+
+        filas = matriz.buscar_filas(df_ventas['codigo_pos'])
+        registrados = filas >= 0
+        unidades = df_ventas['unidades'].to_numpy(dtype=np.int64)
+
+        volumenes += matriz.consumo_total(filas[registrados], unidades[registrados])
+        sin_registro.append(df_ventas.loc[~registrados, ['codigo_pos', 'nombre', 'unidades', 'importe']])
+
+        resumen['renglones'] += len(df_ventas)
+        resumen['renglones_registrados'] += int(registrados.sum())
+        resumen['unidades'] += int(unidades.sum())
+        resumen['importe'] += int(df_ventas['importe'].sum())
+
+    resumen['renglones_sin_registro'] = resumen['renglones'] - resumen['renglones_registrados']
+
+    # Agrupamos los renglones sin receta por código POS
+    resumen['sin_registro'] = []
+    if sin_registro:
+        df_sin_registro = pd.concat(sin_registro)
+        grupos = df_sin_registro.groupby('codigo_pos', sort=True).agg(
+            nombre=('nombre', 'last'),
+            renglones=('unidades', 'size'),
+            unidades=('unidades', 'sum'),
+            importe=('importe', 'sum')
+        )
+        resumen['sin_registro'] = [
+            {'codigo_pos': codigo_pos, 'nombre': nombre, 'renglones': int(renglones), 'unidades': int(unidades), 'importe': int(importe)}
+            for codigo_pos, nombre, renglones, unidades, importe in grupos.itertuples(name=None)
+        ]
+
+    resumen['consumos'] = sorted([
+        {'ingrediente_id': ingrediente.id, 'codigo': ingrediente.codigo, 'nombre': ingrediente.nombre, 'volumen': int(volumen)}
+        for ingrediente, volumen in zip(matriz.ingredientes, volumenes.tolist())
+        if volumen > 0
+    ], key=lambda consumo: consumo['nombre'])
+
+    return resumen
+
+
+"""
+-----------------------------------------------------------------------
+Retorna la vista previa de un reporte de ventas de la sucursal. Usa el
+mismo parser que la carga (por bloques si el formato tiene
+especificación). Arroja 'motor.ErrorReporte' si el reporte tiene algún
+error y 'registro.ParserNoEncontrado' si la sucursal no tiene parser.
+-----------------------------------------------------------------------
+"""
+def vista_previa(archivo, sucursal):
+
+    matriz = matriz_recetas.get_matriz(sucursal)
+
+    return resumir(ingesta.bloques_reporte(archivo, sucursal), matriz)